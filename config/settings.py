@@ -42,11 +42,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'logbook.staticfiles.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'logbook.profiles.PilotProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'logbook.routers.ReplicaPinningMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -79,9 +82,36 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+    },
+    # Local stand-in for a read replica (a copy of db.sqlite3). Only read
+    # from when listed in LOGBOOK_READ_REPLICAS; the tests use it as a
+    # second, separate database.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db-replica.sqlite3',
+    },
+}
+
+# One cache shared by every worker process: the pilot profile cache is
+# invalidated through it and the heavy-view limits (logbook.limits) count
+# their slots in it. The database cache's table is created by migrate
+# (logbook migration 0013). Memcached or Redis work too and keep cache
+# reads out of the database; a per-process cache (LocMemCache) does not.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'logbook_cache',
     }
 }
 
+# Read replicas: add each one to DATABASES (with 'TEST': {'MIRROR': 'default'})
+# and list its alias here. Stats, audit, export, report and admin changelist
+# reads go to a replica; a user's reads stay on the primary for
+# LOGBOOK_REPLICA_STICKY_SECONDS after they write.
+DATABASE_ROUTERS = ['logbook.routers.ReplicaRouter']
+LOGBOOK_READ_REPLICAS = []
+LOGBOOK_REPLICA_STICKY_SECONDS = 15
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -118,14 +148,23 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = "static/"
-
-from pathlib import Path
-BASE_DIR = Path(__file__).resolve().parent.parent
+STATIC_ROOT = BASE_DIR / "staticfiles"
 
 STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
 
+# collectstatic writes content-hashed copies plus .gz/.br variants, which
+# logbook.staticfiles.StaticFilesMiddleware serves with immutable caching.
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "logbook.staticfiles.CompressedManifestStaticFilesStorage",
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -133,8 +172,30 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_URL = "login"
 LOGIN_REDIRECT_URL = "flight_list"
 
-from pathlib import Path
-BASE_DIR = Path(__file__).resolve().parent.parent
-
 MEDIA_URL = "media/"
 MEDIA_ROOT = BASE_DIR / "media"
+
+# Flights older than this move to the archive table (manage.py archive_flights).
+LOGBOOK_ARCHIVE_AFTER_DAYS = 2 * 365
+
+# Processes used to parse large flight imports (None: one per CPU core).
+LOGBOOK_IMPORT_WORKERS = None
+
+# Processes used to render logbook PDF pages (None: one per CPU core).
+LOGBOOK_PDF_WORKERS = None
+
+# Heavy views (audit, export, import, logbook PDF, reports) running at once,
+# per user and in total (None: no limit). Slots live in the cache, so with
+# several worker processes configure a shared CACHES backend. Requests over
+# the limit queue for LOGBOOK_HEAVY_QUEUE_SECONDS, then get a 429; a slot
+# held by a crashed worker frees itself after LOGBOOK_HEAVY_LEASE_SECONDS.
+LOGBOOK_HEAVY_PER_USER = 2
+LOGBOOK_HEAVY_TOTAL = 4
+LOGBOOK_HEAVY_QUEUE_SECONDS = 5
+LOGBOOK_HEAVY_LEASE_SECONDS = 300
+
+# Currency: takeoffs and landings needed within the last LOGBOOK_CURRENCY_DAYS
+# days. Evaluated for all pilots by `manage.py evaluate_currency` (run daily).
+LOGBOOK_CURRENCY_DAYS = 90
+LOGBOOK_CURRENCY_TAKEOFFS = 3
+LOGBOOK_CURRENCY_LANDINGS = 3
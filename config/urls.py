@@ -20,10 +20,18 @@ urlpatterns = [
     path("flights/<int:pk>/edit/", logbook_views.flight_edit, name="flight_edit"),
     path("flights/<int:pk>/delete/", logbook_views.flight_delete, name="flight_delete"),
     path("flights/export/", logbook_views.flight_export_csv, name="flight_export_csv"),
+    path("flights/logbook.pdf", logbook_views.flight_logbook_pdf, name="flight_logbook_pdf"),
+    path("flights/near/", logbook_views.flights_near, name="flights_near"),
+    path("flights/map/<int:z>/<int:x>/<int:y>.json", logbook_views.flight_map_tile, name="flight_map_tile"),
     path("flights/import/", logbook_views.flight_import_csv, name="flight_import"),
+    path("flights/sync/", logbook_views.flight_sync, name="flight_sync"),
+    path("flights/changes/", logbook_views.flight_changes, name="flight_changes"),
+
+    path("reports/pivot/", logbook_views.reports_pivot, name="reports_pivot"),
 
     path("profile/", logbook_views.profile_view, name="profile"),
     path("settings/", logbook_views.settings_view, name="settings"),
     path("audit/", logbook_views.audit_view, name="audit"),
+    path("audit/proof/", logbook_views.audit_proof, name="audit_proof"),
     path("logout/", auth_views.LogoutView.as_view(), name="logout"),
 ]
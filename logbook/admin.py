@@ -1,11 +1,133 @@
+from datetime import date
+
 from django.contrib import admin
-from .models import FlightLogEntry, PilotProfile
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Max, Min, Q, QuerySet
+from django.utils.functional import cached_property
+
+from . import export, search
+from .models import ArchivedFlight, ArchivedTotals, FlightLogEntry, PilotProfile, PilotStatus
+from .routers import using_replica
+
+
+def estimated_rows(model, using):
+    """The database's own row estimate for a table, or None if it has none."""
+    connection = connections[using]
+    table = model._meta.db_table
+    queries = {
+        "postgresql": "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+        "mysql": (
+            "SELECT table_rows FROM information_schema.tables"
+            " WHERE table_schema = DATABASE() AND table_name = %s"
+        ),
+        # Filled in by ANALYZE; the first number is the row count.
+        "sqlite": "SELECT stat FROM sqlite_stat1 WHERE tbl = %s",
+    }
+    if connection.vendor not in queries:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(queries[connection.vendor], [table])
+            rows = cursor.fetchall()
+    except DatabaseError:  # e.g. ANALYZE never ran on SQLite
+        return None
+    estimates = [int(str(row[0]).split()[0]) for row in rows if row[0] is not None]
+    estimate = max(estimates, default=-1)
+    return estimate if estimate >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that never counts a whole large table. Unfiltered lists use
+    the database's row estimate; filtered ones, and tables without one
+    (SQLite before `manage.py archive_flights` has run ANALYZE), count
+    at most COUNT_LIMIT rows. The changelist then shows the count as
+    capped, and deep pages are reached by narrowing the filters.
+    """
+    COUNT_LIMIT = 10_000
+    capped = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_rows(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.COUNT_LIMIT:
+                return estimate
+        count = queryset.order_by()[:self.COUNT_LIMIT].count()
+        self.capped = count == self.COUNT_LIMIT
+        return count
+
+
+class DrillDownQuerySet(QuerySet):
+    """
+    Queryset for date_hierarchy changelists. The stock hierarchy truncates
+    every row to list the years/months/days present; here each candidate
+    period is one index seek instead.
+    """
+    MAX_PERIODS = 400
+
+    def aggregate(self, *args, **kwargs):
+        # Some databases (SQLite) only use an index for a lone MIN()/MAX().
+        if not args and kwargs and all(type(a) in (Min, Max) for a in kwargs.values()):
+            result = {}
+            for name, aggregate in kwargs.items():
+                result.update(super().aggregate(**{name: aggregate}))
+            return result
+        return super().aggregate(*args, **kwargs)
+
+    def dates(self, field_name, kind, order="ASC"):
+        if kind not in ("year", "month", "day"):
+            return super().dates(field_name, kind, order)
+        bounds = self.aggregate(first=Min(field_name), last=Max(field_name))
+        if bounds["first"] is None:
+            return []
+        periods = _periods(bounds["first"], bounds["last"], kind)
+        if len(periods) > self.MAX_PERIODS:
+            return super().dates(field_name, kind, order)
+        found = [
+            start for start, end in periods
+            if self.filter(**{f"{field_name}__gte": start, f"{field_name}__lt": end}).exists()
+        ]
+        return found if order == "ASC" else found[::-1]
+
+
+def _periods(first, last, kind):
+    """[start, end) ranges of each year/month/day from `first` to `last`."""
+    if kind == "year":
+        return [(date(y, 1, 1), date(y + 1, 1, 1)) for y in range(first.year, last.year + 1)]
+    if kind == "month":
+        starts = []
+        month = first.year * 12 + first.month - 1
+        while month <= last.year * 12 + last.month - 1:
+            starts.append(date(month // 12, month % 12 + 1, 1))
+            month += 1
+        ends = starts[1:] + [date(month // 12, month % 12 + 1, 1)]
+        return list(zip(starts, ends))
+    days = [date.fromordinal(d) for d in range(first.toordinal(), last.toordinal() + 2)]
+    return list(zip(days, days[1:]))
+
+
+class ReplicaChangelistMixin:
+    """Serve changelist pages (GET only) from a read replica."""
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != "GET":
+            return super().changelist_view(request, extra_context)
+        with using_replica():
+            response = super().changelist_view(request, extra_context)
+            # TemplateResponse renders lazily; run the queries in here.
+            if hasattr(response, "render"):
+                response.render()
+        return response
 
 
 @admin.register(FlightLogEntry)
-class FlightLogEntryAdmin(admin.ModelAdmin):
+class FlightLogEntryAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
     list_display = (
         "date",
+        "user",
         "uav_type",
         "uav_model",
         "uav_reg",
@@ -18,18 +140,81 @@ class FlightLogEntryAdmin(admin.ModelAdmin):
         "mission_type",
         "pilot_role",
         "is_simulator",
-        "date",
     )
-    search_fields = (
-        "uav_model",
-        "uav_reg",
-        "departure",
-        "arrival",
-        "remarks",
+    list_select_related = ("user",)
+    date_hierarchy = "date"
+    search_fields = ("uav_reg", "uav_model", "departure", "arrival")
+    search_help_text = (
+        "Registration, model or site starting with the text entered, "
+        "or remarks containing its words."
     )
     ordering = ("-date", "-created_at")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ["export_csv"]
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return DrillDownQuerySet(queryset.model, queryset.query, queryset.db)
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        The whole term is one prefix, matched as index range scans
+        (value >= term < term + U+FFFF) on the indexed columns instead of
+        the default %term% scans. It is also tried upper- and title-case.
+        Remarks are matched word by word through the full-text index
+        (logbook.search).
+        """
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        match = Q()
+        for prefix in {term, term.upper(), term.title()}:
+            for field in self.search_fields:
+                match |= Q(**{f"{field}__gte": prefix, f"{field}__lt": prefix + "\uffff"})
+        remarks = search.remarks_match(queryset, term)
+        if remarks is not None:
+            match |= remarks
+        return queryset.filter(match), False
+
+    @admin.action(description="Export selected flights to CSV")
+    def export_csv(self, request, queryset):
+        return export.stream_csv(
+            queryset.select_related(None).order_by(*self.ordering).iterator(chunk_size=2000),
+            filename="uas_flights.csv",
+        )
 
 
 @admin.register(PilotProfile)
 class PilotProfileAdmin(admin.ModelAdmin):
-    list_display = ("user", "updated_at")
+    list_display = ("user", "medical_certificate_expires", "flight_crew_license_expires", "updated_at")
+
+
+@admin.register(PilotStatus)
+class PilotStatusAdmin(admin.ModelAdmin):
+    """Who is about to lapse, soonest first (manage.py evaluate_currency)."""
+    list_display = (
+        "user", "next_due", "next_due_item", "lapsed", "current_until",
+        "recent_takeoffs", "recent_landings", "evaluated_on",
+    )
+    list_filter = ("lapsed", "next_due_item")
+    list_select_related = ("user",)
+    ordering = ("next_due",)
+    search_fields = ("user__username",)
+    readonly_fields = [field.name for field in PilotStatus._meta.fields]
+
+
+@admin.register(ArchivedFlight)
+class ArchivedFlightAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
+    list_display = ("date", "user", "uav_type", "uav_reg", "departure", "arrival", "flight_time")
+    list_select_related = ("user",)
+    date_hierarchy = "date"
+    ordering = ("-date",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(ArchivedTotals)
+class ArchivedTotalsAdmin(admin.ModelAdmin):
+    list_display = ("user", "month", "flights", "flight_time")
+    list_select_related = ("user",)
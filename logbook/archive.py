@@ -0,0 +1,167 @@
+"""
+Hot/cold archival of old flights.
+
+`archive_before()` moves flights older than a cut-off date from
+FlightLogEntry into ArchivedFlight in batches, and folds them into
+per-pilot monthly ArchivedTotals. Day-to-day pages keep working on the
+small hot table; exports and audits that ask for old date ranges read
+both tables through the helpers below.
+"""
+import heapq
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from . import signals
+from .models import ArchivedFlight, ArchivedTotals, ChangeCounter, FlightLogEntry
+
+RECORD_FIELDS = tuple(
+    f.name for f in ArchivedFlight._meta.concrete_fields
+    if f.name not in ("id", "user", "archived_at")
+)
+
+TOTAL_FIELDS = (
+    "flight_time",
+    "takeoff_day",
+    "takeoff_night",
+    "landing_day",
+    "landing_night",
+)
+
+
+def default_cutoff():
+    days = getattr(settings, "LOGBOOK_ARCHIVE_AFTER_DAYS", 2 * 365)
+    return timezone.now().date() - timedelta(days=days)
+
+
+def archive_before(cutoff, batch_size=1000):
+    """Move flights dated before `cutoff` to the archive; return the count."""
+    moved = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                FlightLogEntry.objects
+                .filter(date__lt=cutoff)
+                .order_by("pk")[:batch_size]
+            )
+            if not batch:
+                break
+
+            ArchivedFlight.objects.bulk_create([
+                ArchivedFlight(
+                    id=f.pk,
+                    user_id=f.user_id,
+                    **{name: getattr(f, name) for name in RECORD_FIELDS},
+                )
+                for f in batch
+            ])
+
+            totals = defaultdict(lambda: defaultdict(int))
+            for f in batch:
+                month = totals[f.user_id, f.date.replace(day=1)]
+                month["flights"] += 1
+                for name in TOTAL_FIELDS:
+                    month[name] += getattr(f, name) or 0
+            for (user_id, month), values in totals.items():
+                ArchivedTotals.objects.get_or_create(user_id=user_id, month=month)
+                ArchivedTotals.objects.filter(user_id=user_id, month=month).update(
+                    **{name: F(name) + value for name, value in values.items()}
+                )
+
+            with signals.archiving():
+                FlightLogEntry.objects.filter(pk__in=[f.pk for f in batch]).delete()
+            moved += len(batch)
+
+    if moved:
+        # Nothing changed logically, but cached reports built from the hot
+        # table alone are now stale.
+        ChangeCounter.next_value()
+    return moved
+
+
+def analyze():
+    """
+    Refresh the planner statistics of both flight tables after a move.
+    The admin's row estimates come from them (sqlite_stat1 on SQLite,
+    which is empty until ANALYZE first runs).
+    """
+    statement = {"sqlite": "ANALYZE", "postgresql": "ANALYZE", "mysql": "ANALYZE TABLE"}
+    if connection.vendor not in statement:
+        return
+    with connection.cursor() as cursor:
+        for model in (FlightLogEntry, ArchivedFlight):
+            cursor.execute(f"{statement[connection.vendor]} {connection.ops.quote_name(model._meta.db_table)}")
+
+
+# ---- Reading across hot and cold storage ----
+
+def flights_between(user, start=None, end=None, descending=False):
+    """
+    Flights from both tables within [start, end], ordered by date.
+    A live flight can be older than archived ones (logged or imported
+    after the cut-off moved past its date), so the two ordered querysets
+    are merged rather than chained.
+    """
+    order = ("-date", "-created_at") if descending else ("date", "created_at")
+    hot = FlightLogEntry.objects.all()
+    cold = ArchivedFlight.objects.all()
+    if user is not None:
+        hot = hot.filter(user=user)
+        cold = cold.filter(user=user)
+    if start:
+        hot = hot.filter(date__gte=start)
+        cold = cold.filter(date__gte=start)
+    if end:
+        hot = hot.filter(date__lte=end)
+        cold = cold.filter(date__lte=end)
+
+    return heapq.merge(
+        cold.order_by(*order).iterator(chunk_size=2000),
+        hot.order_by(*order).iterator(chunk_size=2000),
+        key=lambda f: (f.date, f.created_at),
+        reverse=descending,
+    )
+
+
+def _first_of_next_month(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def archived_totals(user, start=None, end=None):
+    """
+    Totals of archived flights within [start, end] (dates or None).
+    Whole months come from ArchivedTotals; only the partial months at
+    the edges of the range are aggregated from ArchivedFlight rows.
+    """
+    months = ArchivedTotals.objects.filter(user=user)
+    rows = ArchivedFlight.objects.filter(user=user)
+    edges = Q(pk__in=[])
+
+    full_from = None
+    if start:
+        full_from = start if start.day == 1 else _first_of_next_month(start)
+        months = months.filter(month__gte=full_from)
+        edges |= Q(date__gte=start, date__lt=full_from)
+    if end:
+        # Months whose last day is on or before `end`.
+        full_until = (end + timedelta(days=1)).replace(day=1)
+        months = months.filter(month__lt=full_until)
+        edges |= Q(date__gte=max(full_until, start or full_until), date__lte=end)
+        if full_from and full_from >= full_until:
+            # The range sits inside a single month: no whole months.
+            months = months.none()
+            edges = Q(date__gte=start, date__lte=end)
+
+    totals = months.aggregate(
+        flights=Sum("flights", default=0),
+        **{name: Sum(name, default=0) for name in TOTAL_FIELDS},
+    )
+    edge_totals = rows.filter(edges).aggregate(
+        flights=Count("pk"),
+        **{name: Sum(name, default=0) for name in TOTAL_FIELDS},
+    )
+    return {name: totals[name] + edge_totals[name] for name in totals}
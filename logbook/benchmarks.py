@@ -0,0 +1,741 @@
+"""
+Local performance benchmarks, run with `manage.py benchmark <name>`.
+
+Each benchmark runs against a throw-away test database (the same one
+`manage.py test` would create), so the development database is never
+touched. Benchmarks register themselves with @benchmark and receive the
+management command (for output) and the parsed options.
+"""
+import random
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from django.db import connection
+
+from .models import FlightLogEntry
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+@contextmanager
+def scratch_database():
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def timed(func, repeat=3):
+    """Best wall-clock time of `repeat` runs, in seconds."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def seed_flights(user, count, batch_size=5000, seed=0, locations=False):
+    """
+    Bulk-insert `count` synthetic flights spread over five years. This
+    bypasses save() (no integrity tree, change sequence or map cells),
+    which is what we want when measuring read paths. With `locations`,
+    flights get coordinates near their (European) sites.
+    """
+    rng = random.Random(seed)
+    choices = (
+        [c for c, _ in FlightLogEntry.UavConfig.choices],
+        [c for c, _ in FlightLogEntry.EasaClass.choices] + [""],
+        [c for c, _ in FlightLogEntry.MissionType.choices] + [""],
+        [c for c, _ in FlightLogEntry.PilotRole.choices],
+    )
+    regs = [f"UAS-{i:04d}" for i in range(200)]
+    sites = [f"Site {i}" for i in range(500)]
+    places = random.Random(seed + 1)  # separate, so the flights are the same either way
+    coordinates = {site: (places.uniform(36, 60), places.uniform(-10, 30)) for site in sites}
+    first_day = date.today() - timedelta(days=5 * 365)
+
+    for offset in range(0, count, batch_size):
+        batch = []
+        for _ in range(min(batch_size, count - offset)):
+            day = first_day + timedelta(days=rng.randrange(5 * 365))
+            start = datetime.combine(day, datetime.min.time()) + timedelta(
+                minutes=rng.randrange(6 * 60, 20 * 60)
+            )
+            minutes = rng.randrange(5, 90)
+            batch.append(FlightLogEntry(
+                user=user,
+                date=day,
+                departure=rng.choice(sites),
+                arrival=rng.choice(sites),
+                off_block=start.time(),
+                on_block=(start + timedelta(minutes=minutes)).time(),
+                flight_time=minutes,
+                uav_type=rng.choice(choices[0]),
+                uav_reg=rng.choice(regs),
+                uav_easa_class=rng.choice(choices[1]),
+                mission_type=rng.choice(choices[2]),
+                pilot_role=rng.choice(choices[3]),
+                takeoff_day=1,
+                landing_day=1,
+            ))
+            if locations:
+                flight = batch[-1]
+                for name in ("departure", "arrival"):
+                    lat, lon = coordinates[getattr(flight, name)]
+                    setattr(flight, f"{name}_lat", lat + places.uniform(-0.01, 0.01))
+                    setattr(flight, f"{name}_lon", lon + places.uniform(-0.01, 0.01))
+        FlightLogEntry.objects.bulk_create(batch)
+
+
+@benchmark("pivot")
+def bench_pivot(command, options):
+    from django.contrib.auth import get_user_model
+    from django.core.cache import cache
+
+    from . import reports
+
+    user = get_user_model().objects.create_user("bench")
+    started = time.perf_counter()
+    seed_flights(user, options["rows"])
+    command.stdout.write(f"seeded {options['rows']} flights in {time.perf_counter() - started:.1f}s")
+
+    flights = FlightLogEntry.objects.filter(user=user)
+    for rows, columns in (
+        (["month"], ["uav_class"]),
+        (["month", "mission"], ["role"]),
+        (["year", "uav_class", "mission"], ["role"]),
+    ):
+        cold = timed(lambda: reports.pivot(flights, rows, columns), repeat=options["repeat"])
+        cache.clear()
+        reports.cached_pivot(user, flights, rows, columns)
+        warm = timed(lambda: reports.cached_pivot(user, flights, rows, columns), repeat=options["repeat"])
+        command.stdout.write(
+            f"{'+'.join(rows)} x {'+'.join(columns)}: "
+            f"query {cold * 1000:.0f} ms, cached {warm * 1000:.2f} ms"
+        )
+
+
+@benchmark("pages")
+def bench_pages(command, options):
+    """HTML bytes per page, and what a first vs. repeat view transfers."""
+    import re
+
+    from django.contrib.auth import get_user_model
+    from django.contrib.staticfiles import finders
+    from django.test import Client, override_settings
+
+    user = get_user_model().objects.create_user("bench")
+    seed_flights(user, min(options["rows"], 50))
+    client = Client()
+    client.force_login(user)
+
+    for url in ("/flights/", "/flights/new/", "/profile/", "/audit/"):
+        with override_settings(ALLOWED_HOSTS=["testserver"]):
+            response = client.get(url)
+        html = b"".join(response) if response.streaming else response.content
+        assets = 0
+        for name in re.findall(rb'(?:href|src)="/static/([^"]+)"', html):
+            found = finders.find(re.sub(r"\.[0-9a-f]{12}(\.[^.]+)$", r"\1", name.decode()))
+            if found:
+                with open(found, "rb") as f:
+                    assets += len(f.read())
+        command.stdout.write(
+            f"{url}: HTML {len(html)} B, first view +{assets} B of cacheable assets, "
+            f"repeat view {len(html)} B"
+        )
+
+
+@benchmark("admin")
+def bench_admin(command, options):
+    """Flight changelist latency, tuned admin vs. the stock configuration."""
+    from unittest import mock
+
+    from django.contrib import admin as django_admin
+    from django.contrib.auth import get_user_model
+    from django.core.paginator import Paginator
+    from django.db import connection
+    from django.test import Client, override_settings
+
+    from .admin import FlightLogEntryAdmin
+
+    user = get_user_model().objects.create_superuser("bench", password="bench")
+    started = time.perf_counter()
+    seed_flights(user, options["rows"])
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    command.stdout.write(f"seeded {options['rows']} flights in {time.perf_counter() - started:.1f}s")
+
+    client = Client()
+    client.force_login(user)
+    year = date.today().year - 2
+    url = "/admin/logbook/flightlogentry/"
+    cases = (
+        ("first page", ""),
+        ("page 50", "?p=50"),
+        ("search registration", "?q=UAS-012"),
+        ("year drill-down", f"?date__year={year}"),
+        ("month drill-down", f"?date__year={year}&date__month=6"),
+    )
+    stock = {
+        "list_display": ("date", "uav_type", "uav_model", "uav_reg", "departure", "arrival", "flight_time"),
+        "list_filter": ("uav_type", "mission_type", "pilot_role", "is_simulator", "date"),
+        "list_select_related": False,
+        "date_hierarchy": None,
+        "search_fields": ("uav_model", "uav_reg", "departure", "arrival", "remarks"),
+        "paginator": Paginator,
+        "show_full_result_count": True,
+        "get_search_results": django_admin.ModelAdmin.get_search_results,
+    }
+
+    def run(query):
+        response = client.get(url + query)
+        assert response.status_code == 200, response.status_code
+
+    with override_settings(ALLOWED_HOSTS=["testserver"]):
+        for label, query in cases:
+            tuned = timed(lambda: run(query), repeat=options["repeat"])
+            if "date__" in query:
+                baseline = "n/a"  # no date_hierarchy in the stock admin
+            else:
+                with mock.patch.multiple(FlightLogEntryAdmin, **stock):
+                    baseline = f"{timed(lambda: run(query), repeat=options['repeat']) * 1000:.0f} ms"
+            command.stdout.write(f"{label}: {tuned * 1000:.0f} ms (stock admin: {baseline})")
+
+
+@benchmark("conflicts")
+def bench_conflicts(command, options):
+    from collections import Counter
+
+    from django.contrib.auth import get_user_model
+
+    from . import conflicts
+
+    User = get_user_model()
+    pilots = [User.objects.create_user(f"bench{i}") for i in range(10)]
+    started = time.perf_counter()
+    for i, pilot in enumerate(pilots):
+        seed_flights(pilot, options["rows"] // len(pilots), seed=i)
+    command.stdout.write(f"seeded {options['rows']} flights in {time.perf_counter() - started:.1f}s")
+
+    counts = Counter()
+
+    def report():
+        counts.clear()
+        counts.update((c.kind, c.scope) for c in conflicts.find_all())
+
+    elapsed = timed(report, repeat=options["repeat"])
+    command.stdout.write(f"full report: {elapsed:.2f}s, {dict(counts)}")
+
+    flight = FlightLogEntry.objects.filter(user=pilots[0]).order_by("-pk").first()
+    elapsed = timed(lambda: conflicts.check([flight]), repeat=options["repeat"])
+    command.stdout.write(f"check one flight on save: {elapsed * 1000:.1f} ms")
+
+    # An import covers one pilot's consecutive flights.
+    batch = list(FlightLogEntry.objects.filter(user=pilots[0]).order_by("-date")[:500])
+    elapsed = timed(lambda: conflicts.check(batch), repeat=options["repeat"])
+    command.stdout.write(f"check a 500-flight import: {elapsed * 1000:.0f} ms")
+
+
+def _write_import_csv(path, rows, seed=0):
+    import csv
+
+    rng = random.Random(seed)
+    first_day = date.today() - timedelta(days=5 * 365)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([
+            "Date", "Departure", "Arrival", "Departure time", "Arrival time",
+            "UAV configuration", "UAV registration", "Pilot role",
+            "Takeoffs (day)", "Landings (day)", "Remarks",
+            "Departure latitude", "Departure longitude",
+        ])
+        for _ in range(rows):
+            start = rng.randrange(6 * 60, 20 * 60)
+            end = start + rng.randrange(5, 90)
+            writer.writerow([
+                first_day + timedelta(days=rng.randrange(5 * 365)),
+                f"Site {rng.randrange(500)}", f"Site {rng.randrange(500)}",
+                f"{start // 60:02d}:{start % 60:02d}", f"{end // 60:02d}:{end % 60:02d}",
+                rng.choice(["MULTI", "FIXED", "Helicopter"]), f"UAS-{rng.randrange(200):04d}",
+                "PIC", 1, 1, rng.choice(["", "Training", "Survey, north\nfield"]),
+                round(rng.uniform(36, 60), 5), round(rng.uniform(-9, 30), 5),
+            ])
+
+
+@benchmark("import")
+def bench_import(command, options):
+    """
+    CSV parse throughput on 1, 2, 4 and 8 workers, then full imports
+    (parse + batched writer) on as many workers, with the time spent in
+    the writer, and for comparison the rate of saving the rows one at a
+    time. Workers parse the next chunks while the writer saves, so a full
+    import takes about the longer of the two on enough CPUs.
+    """
+    import os
+    import tempfile
+
+    from django.contrib.auth import get_user_model
+    from django.db import transaction
+
+    from . import importer
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "flights.csv")
+        _write_import_csv(path, options["rows"])
+        size = os.path.getsize(path)
+        command.stdout.write(f"{options['rows']} rows, {size / 1e6:.1f} MB, {os.cpu_count()} CPUs")
+
+        baseline = None
+        for workers in (1, 2, 4, 8):
+            elapsed = timed(
+                lambda: sum(len(r) for r, _ in importer.parse_file(path, "csv", workers)),
+                repeat=options["repeat"],
+            )
+            baseline = baseline or elapsed
+            command.stdout.write(
+                f"parse on {workers} worker(s): {elapsed:.2f}s, "
+                f"{options['rows'] / elapsed:,.0f} rows/s, speedup {baseline / elapsed:.1f}x"
+            )
+
+        writing = []
+        save_records = importer.save_records
+
+        def timed_save(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return save_records(*args, **kwargs)
+            finally:
+                writing.append(time.perf_counter() - started)
+
+        User = get_user_model()
+        baseline = None
+        importer.save_records = timed_save
+        try:
+            for workers in (1, 2, 4, 8):
+                user = User.objects.create_user(f"bench{workers}")
+                writing.clear()
+                started = time.perf_counter()
+                created, _ = importer.import_file(user, path, "csv", workers)
+                elapsed = time.perf_counter() - started
+                baseline = baseline or elapsed
+                command.stdout.write(
+                    f"full import on {workers} worker(s): {len(created)} flights in {elapsed:.2f}s "
+                    f"(writer {sum(writing):.2f}s), {len(created) / elapsed:,.0f} rows/s, "
+                    f"speedup {baseline / elapsed:.1f}x"
+                )
+        finally:
+            importer.save_records = save_records
+
+        records = next(importer.parse_file(path, "csv", 1))[0][:2000]
+        user = User.objects.create_user("bench-rows")
+        started = time.perf_counter()
+        with transaction.atomic():
+            for record in records:
+                FlightLogEntry(user=user, **record).save()
+        command.stdout.write(
+            f"one save() per row: {len(records) / (time.perf_counter() - started):,.0f} rows/s"
+        )
+
+
+@benchmark("pdf")
+def bench_pdf(command, options):
+    """
+    Full logbook PDF for one pilot (use --rows 20000) on 1, 2 and 4
+    workers, with the peak memory of the rendering process.
+    """
+    import os
+    import tracemalloc
+
+    from django.contrib.auth import get_user_model
+
+    from . import pdf
+
+    user = get_user_model().objects.create_user("bench")
+    seed_flights(user, options["rows"])
+    pages = (options["rows"] + pdf.ROWS_PER_PAGE - 1) // pdf.ROWS_PER_PAGE
+    command.stdout.write(f"{options['rows']} flights, {pages} pages, {os.cpu_count()} CPUs")
+
+    for workers in (1, 2, 4):
+        size = 0
+
+        def render():
+            nonlocal size
+            size = sum(len(chunk) for chunk in pdf.logbook(user, workers=workers))
+
+        elapsed = timed(render, repeat=options["repeat"])
+        tracemalloc.start()
+        render()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        command.stdout.write(
+            f"{workers} worker(s): {elapsed:.2f}s, {pages / elapsed:,.0f} pages/s, "
+            f"{size / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB"
+        )
+
+
+@benchmark("spatial")
+def bench_spatial(command, options):
+    """
+    Box and radius queries with and without the spatial index, and map
+    tiles from the cell counts, over flights at 500 European sites.
+    """
+    from unittest import mock
+
+    from django.contrib.auth import get_user_model
+
+    from . import spatial
+
+    user = get_user_model().objects.create_user("bench")
+    started = time.perf_counter()
+    seed_flights(user, options["rows"], locations=True)
+    cells = spatial.rebuild_cells(user)
+    command.stdout.write(
+        f"seeded {options['rows']} flights and {cells} map cells "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+
+    site = FlightLogEntry.objects.filter(user=user).values_list(
+        "departure_lat", "departure_lon"
+    ).first()
+    lat, lon = site
+    flights = FlightLogEntry.objects.filter(user=user)
+    queries = {
+        "50 nearest within 5 km": lambda: len(spatial.near(flights, lat, lon, 5, limit=50)),
+        "20 x 20 km box": lambda: spatial.in_box(
+            flights, lat - 0.09, lon - 0.13, lat + 0.09, lon + 0.13
+        ).count(),
+    }
+    for name, query in queries.items():
+        found = query()
+        indexed = timed(query, repeat=options["repeat"])
+        with mock.patch.object(spatial, "_index_lookup", return_value=None):
+            plain = timed(query, repeat=options["repeat"])
+        command.stdout.write(
+            f"{name}: {found} flights, {indexed * 1000:.1f} ms indexed, "
+            f"{plain * 1000:.1f} ms without the index"
+        )
+
+    for z in (0, 4, 8, 12, 16):
+        x, y = spatial.cell(lat, lon, z)
+        tile = spatial.tile(user, z, x, y)
+        elapsed = timed(lambda: spatial.tile(user, z, x, y), repeat=options["repeat"])
+        command.stdout.write(
+            f"tile {z}/{x}/{y}: {len(tile['clusters'])} clusters, "
+            f"{tile['flights']} flights, {elapsed * 1000:.1f} ms"
+        )
+
+
+@benchmark("audit")
+def bench_audit(command, options):
+    """
+    Time to first byte, total time and peak memory of the streamed audit
+    page at a tenth of --rows and at --rows flights.
+    """
+    import tracemalloc
+
+    from django.contrib.auth import get_user_model
+    from django.test import Client, override_settings
+
+    user = get_user_model().objects.create_user("bench")
+    client = Client()
+    client.force_login(user)
+    seeded = 0
+    for rows in (options["rows"] // 10, options["rows"]):
+        seed_flights(user, rows - seeded, seed=seeded)
+        seeded = rows
+
+        def fetch():
+            nonlocal first, size
+            started = time.perf_counter()
+            with override_settings(ALLOWED_HOSTS=["testserver"]):
+                chunks = iter(client.get("/audit/"))
+                size = len(next(chunks))
+                first = time.perf_counter() - started
+                size += sum(len(chunk) for chunk in chunks)
+
+        first = size = 0
+        tracemalloc.start()
+        fetch()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        total = timed(fetch, repeat=options["repeat"])
+        command.stdout.write(
+            f"{rows} flights: first byte {first * 1000:.0f} ms, all {size / 1e6:.1f} MB "
+            f"in {total:.2f}s, peak memory {peak / 1e6:.1f} MB"
+        )
+
+
+# A fresh interpreter: point it at a database file, then time setup.
+_STARTUP_PRELUDE = """
+import os, sys, time
+started = time.perf_counter()
+os.environ["DJANGO_SETTINGS_MODULE"] = "config.settings"
+from django.conf import settings
+settings.DATABASES["default"]["NAME"] = sys.argv[1]
+"""
+
+_STARTUP_PREPARE = _STARTUP_PRELUDE + """
+import django
+django.setup()
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client
+from logbook.benchmarks import seed_flights
+call_command("migrate", verbosity=0)
+user = get_user_model().objects.create_user("bench")
+seed_flights(user, 50)
+client = Client()
+client.force_login(user)
+print(client.cookies[settings.SESSION_COOKIE_NAME].value)
+"""
+
+_STARTUP_PROBE = _STARTUP_PRELUDE + """
+import io, json
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+ready = time.perf_counter()
+sys.stderr.write("-- ready\\n")
+status = []
+body = b"".join(application({
+    "REQUEST_METHOD": "GET", "PATH_INFO": sys.argv[3], "QUERY_STRING": "",
+    "SERVER_NAME": "localhost", "SERVER_PORT": "80", "HTTP_HOST": "localhost",
+    "HTTP_COOKIE": settings.SESSION_COOKIE_NAME + "=" + sys.argv[2],
+    "wsgi.url_scheme": "http", "wsgi.input": io.BytesIO(), "wsgi.errors": sys.stderr,
+}, lambda s, headers, exc_info=None: status.append(s)))
+print(json.dumps({
+    "ready": ready - started, "first": time.perf_counter() - ready,
+    "status": status[0], "bytes": len(body),
+}))
+"""
+
+
+def _import_times(stderr):
+    """{module: (self µs, cumulative µs)} imported before and after "-- ready"."""
+    phases, phase = ({}, {}), 0
+    for line in stderr.splitlines():
+        if line == "-- ready":
+            phase = 1
+        elif line.startswith("import time:") and "|" in line:
+            own, total, name = (part.strip() for part in line[12:].split("|"))
+            if own.isdigit():
+                phases[phase][name] = (int(own), int(total))
+    return phases
+
+
+@benchmark("startup")
+def bench_startup(command, options):
+    """
+    Cold start of a fresh worker process (python -X importtime): time
+    until the WSGI application is ready, what it imported, and the time
+    to serve a first authenticated page.
+    """
+    import json
+    import os
+    import subprocess
+    import sys
+    import tempfile
+    from collections import Counter
+
+    from django.conf import settings
+
+    def python(*args):
+        result = subprocess.run(
+            [sys.executable, *args], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        )
+        return result.stdout, result.stderr
+
+    def group(name):
+        top = name.split(".")[0]
+        return top if top in ("django", "logbook", "config", "PIL") else "other"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "startup.sqlite3")
+        session = python("-c", _STARTUP_PREPARE, db)[0].strip()
+
+        for path in ("/flights/", "/audit/"):
+            best = None
+            for _ in range(options["repeat"]):
+                started = time.perf_counter()
+                out, err = python("-X", "importtime", "-c", _STARTUP_PROBE, db, session, path)
+                wall = time.perf_counter() - started
+                if best is None or wall < best[0]:
+                    best = (wall, json.loads(out), _import_times(err))
+            wall, timings, (startup, first) = best
+
+            command.stdout.write(
+                f"{path}: process {wall * 1000:.0f} ms, app ready after {timings['ready'] * 1000:.0f} ms, "
+                f"first request {timings['first'] * 1000:.0f} ms ({timings['status']}, {timings['bytes']} B)"
+            )
+            for label, modules in (("startup", startup), ("first request", first)):
+                by_group = Counter()
+                for name, (own, _) in modules.items():
+                    by_group[group(name)] += own
+                command.stdout.write(
+                    f"  {label} imports: {len(modules)} modules, "
+                    f"{sum(by_group.values()) / 1000:.0f} ms ("
+                    + ", ".join(f"{g} {t / 1000:.1f}" for g, t in by_group.most_common())
+                    + ")"
+                )
+            slowest = sorted(
+                ((total, name) for name, (_, total) in startup.items() if group(name) in ("logbook", "config")),
+                reverse=True,
+            )[:5]
+            command.stdout.write(
+                "  slowest project modules: "
+                + ", ".join(f"{name} {total / 1000:.1f} ms" for total, name in slowest)
+            )
+            loaded = [name for name in ("PIL", "csv", "multiprocessing", "tempfile") if name in startup]
+            command.stdout.write(f"  loaded at startup: {', '.join(loaded) or 'none of PIL, csv, multiprocessing, tempfile'}")
+
+
+@benchmark("limits")
+def bench_limits(command, options):
+    """
+    A burst of parallel heavy requests from one user: wall time, answers
+    and time queued (from Server-Timing) for the audit page with and
+    without the concurrency limits, and for identical cold pivot
+    reports, which are coalesced.
+    """
+    import re
+    import threading
+
+    from django.contrib.auth import get_user_model
+    from django.core.cache import cache
+    from django.db import connections
+    from django.test import Client, override_settings
+
+    burst = 8
+    user = get_user_model().objects.create_user("bench")
+    seed_flights(user, options["rows"])
+    clients = []
+    for _ in range(burst):
+        client = Client()
+        client.force_login(user)
+        clients.append(client)
+
+    def fire(path):
+        results = []
+
+        def fetch(client):
+            response = client.get(path)
+            body = b"".join(response) if response.streaming else response.content
+            queued = re.search(r"queue;dur=([\d.]+)", response.get("Server-Timing", ""))
+            results.append((response.status_code, float(queued[1]) if queued else 0.0, len(body)))
+            connections.close_all()
+
+        threads = [threading.Thread(target=fetch, args=(client,)) for client in clients]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started, results
+
+    def report(label, elapsed, results):
+        statuses = ", ".join(
+            f"{sum(1 for s, _, _ in results if s == status)}x {status}"
+            for status in sorted({s for s, _, _ in results})
+        )
+        queued = sorted(q for _, q, _ in results)
+        command.stdout.write(
+            f"{label}: {elapsed:.2f}s for {burst} requests ({statuses}), "
+            f"queued median {queued[len(queued) // 2]:.0f} ms, max {queued[-1]:.0f} ms"
+        )
+
+    # The burst's threads share one process, so an in-process cache will do;
+    # the in-memory scratch SQLite database locks under concurrent cache writes.
+    locmem = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    with override_settings(ALLOWED_HOSTS=["testserver"], CACHES=locmem):
+        for label, limits in (
+            ("audit, no limits", {"LOGBOOK_HEAVY_PER_USER": None, "LOGBOOK_HEAVY_TOTAL": None}),
+            ("audit, 2 per user", {"LOGBOOK_HEAVY_PER_USER": 2, "LOGBOOK_HEAVY_QUEUE_SECONDS": 60}),
+            ("audit, 2 per user, 1s queue", {"LOGBOOK_HEAVY_PER_USER": 2, "LOGBOOK_HEAVY_QUEUE_SECONDS": 1}),
+        ):
+            with override_settings(**limits):
+                report(label, *fire("/audit/"))
+
+        from . import reports
+
+        computed = []
+        pivot = reports.pivot
+
+        def counted(*args, **kwargs):
+            computed.append(1)
+            return pivot(*args, **kwargs)
+
+        reports.pivot = counted
+        try:
+            with override_settings(LOGBOOK_HEAVY_PER_USER=None, LOGBOOK_HEAVY_TOTAL=None):
+                cache.clear()
+                report("cold pivot report", *fire("/reports/pivot/?rows=month&cols=mission"))
+        finally:
+            reports.pivot = pivot
+        command.stdout.write(f"  pivot computed {len(computed)} time(s) for {burst} requests")
+
+
+@benchmark("currency")
+def bench_currency(command, options):
+    """
+    Batch currency evaluation for 1,000 pilots sharing --rows flights,
+    against working it out pilot by pilot as pages used to.
+    """
+    from django.contrib.auth import get_user_model
+    from django.db.models import F, Sum
+
+    from . import currency
+    from .models import PilotProfile, PilotStatus
+
+    pilots = 1000
+    User = get_user_model()
+    User.objects.bulk_create(User(username=f"pilot{i}") for i in range(pilots))
+    ids = sorted(User.objects.values_list("pk", flat=True))
+    rng = random.Random(0)
+    today = date.today()
+    PilotProfile.objects.bulk_create(
+        PilotProfile(
+            user_id=pk,
+            medical_certificate_expires=today + timedelta(days=rng.randrange(-30, 700)),
+            flight_crew_license_expires=today + timedelta(days=rng.randrange(-30, 1800)),
+        )
+        for pk in ids
+    )
+    seed_flights(User.objects.get(pk=ids[0]), options["rows"])
+    # The scratch database hands out consecutive ids, so this spreads the
+    # flights evenly over the pilots.
+    FlightLogEntry.objects.update(user_id=F("id") % pilots + ids[0])
+
+    batch = timed(lambda: currency.evaluate(today=today), repeat=options["repeat"])
+    lapsed = PilotStatus.objects.filter(lapsed=True).count()
+    soon = PilotStatus.objects.filter(lapsed=False, next_due__lte=today + timedelta(days=30)).count()
+    command.stdout.write(
+        f"{pilots} pilots, {options['rows']} flights: batch evaluation {batch:.2f}s "
+        f"({lapsed} not current, {soon} due within 30 days)"
+    )
+
+    def per_pilot():
+        since = today - timedelta(days=90)
+        for pk in ids:
+            FlightLogEntry.objects.filter(user_id=pk, date__gte=since, is_simulator=False).aggregate(
+                minutes=Sum("flight_time"), takeoffs=Sum("takeoff_day"), landings=Sum("landing_day"),
+            )
+
+    command.stdout.write(f"one query per pilot, recency only: {timed(per_pilot, repeat=1):.2f}s")
+
+    due = timed(lambda: list(
+        PilotStatus.objects.filter(lapsed=False, next_due__lte=today + timedelta(days=30))
+        .order_by("next_due")[:50]
+    ), repeat=options["repeat"])
+    command.stdout.write(f"50 next to lapse, from the status table: {due * 1000:.1f} ms")
@@ -0,0 +1,158 @@
+"""
+Overlapping and duplicate flights.
+
+A pilot can't fly two flights at once, and neither can an airframe.
+Each flight with block times becomes a [start, end) interval (a flight
+whose on-block is before its off-block ends the next day). Intervals are
+grouped per pilot and per airframe (`uav_reg`, simulator sessions
+excluded), sorted by start once and swept in order while remembering
+the flight that reaches furthest so far: a flight that starts before
+that end overlaps it. Checking a logbook is O(n log n) instead of
+comparing every pair, and every overlapping flight shows up in at least
+one reported pair.
+
+Start order is simply (date, off_block), so the full report lets the
+database sort and streams through it in one pass for both pilots and
+airframes; saves and imports only sweep the new flights together with
+their neighbours.
+"""
+import heapq
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from django.db.models import Q
+
+from .models import ArchivedFlight, FlightLogEntry
+
+PILOT = "pilot"
+AIRFRAME = "airframe"
+
+OVERLAP = "overlap"
+DUPLICATE = "duplicate"
+
+FIELDS = (
+    "pk", "user_id", "uav_reg", "is_simulator",
+    "date", "off_block", "on_block", "departure", "arrival",
+)
+
+# `first` and `second` are flight pks; `first` started earlier.
+Conflict = namedtuple("Conflict", "kind scope key first second")
+
+
+def interval(day, off_block, on_block):
+    """[start, end) of a flight, or None without block times."""
+    if not (day and off_block and on_block):
+        return None
+    start = datetime.combine(day, off_block)
+    end = datetime.combine(day, on_block)
+    if end < start:
+        end += timedelta(days=1)  # landed after midnight
+    return start, end
+
+
+def _keys(row):
+    yield PILOT, row[1]
+    if row[2] and not row[3]:
+        yield AIRFRAME, row[2]
+
+
+def _start(row):
+    return row[4], row[5]
+
+
+def sweep(rows):
+    """
+    Yield conflicts among `rows` (FIELDS tuples), which must already be
+    in start order, i.e. sorted by date and off_block.
+    """
+    reach = {}  # (scope, key) -> (end, start, row) of the flight ending last
+    for row in rows:
+        span = interval(row[4], row[5], row[6])
+        if span is None:
+            continue
+        start, end = span
+        for scope, key in _keys(row):
+            last = reach.get((scope, key))
+            # An airframe overlap between one pilot's own flights is
+            # already reported for the pilot.
+            if last is not None and start < last[0] and not (
+                scope == AIRFRAME and last[2][1] == row[1]
+            ):
+                same = span == (last[1], last[0]) and row[7:] == last[2][7:]
+                yield Conflict(DUPLICATE if same else OVERLAP, scope, key, last[2][0], row[0])
+            if last is None or end > last[0]:
+                reach[scope, key] = (end, start, row)
+
+
+# ---- Incremental checks ----
+
+def check(flights):
+    """
+    Conflicts involving any of the given (saved) flights, checked against
+    the rest of the live logbook around their dates.
+    """
+    new = [f for f in flights if interval(f.date, f.off_block, f.on_block)]
+    if not new:
+        return []
+
+    new_rows = [tuple(getattr(f, name) for name in FIELDS) for f in new]
+    new_pks = {row[0] for row in new_rows}
+    users = {f.user_id for f in new}
+    regs = {f.uav_reg for f in new if f.uav_reg and not f.is_simulator}
+    # Flights can cross midnight, so look at the day before and after too.
+    days = sorted({f.date + timedelta(days=d) for f in new for d in (-1, 0, 1)})
+
+    rows = list(new_rows)
+    for i in range(0, len(days), 500):
+        rows.extend(
+            FlightLogEntry.objects
+            .filter(date__in=days[i:i + 500], off_block__isnull=False, on_block__isnull=False)
+            .filter(Q(user_id__in=users) | Q(uav_reg__in=regs, is_simulator=False))
+            .exclude(pk__in=new_pks)
+            .values_list(*FIELDS)
+        )
+    rows.sort(key=_start)
+    return [c for c in sweep(rows) if c.first in new_pks or c.second in new_pks]
+
+
+def describe(conflict, flight):
+    """Warning text for `conflict`, seen from `flight` (one of its pair)."""
+    other_pk = conflict.second if conflict.first == flight.pk else conflict.first
+    other = (
+        FlightLogEntry.objects.filter(pk=other_pk)
+        .values_list("date", "off_block", "on_block", "departure", "arrival")
+        .first()
+    )
+    if other is None:
+        return ""
+    day, off_block, on_block, departure, arrival = other
+    when = f"{day} {off_block:%H:%M}–{on_block:%H:%M} {departure} → {arrival}"
+    if conflict.kind == DUPLICATE:
+        return f"This looks like a duplicate of the flight on {when}."
+    if conflict.scope == AIRFRAME:
+        return f"{conflict.key} is also logged on the flight on {when}."
+    return f"This flight overlaps your flight on {when}."
+
+
+# ---- Full report ----
+
+def _ordered(model, user):
+    queryset = model.objects.filter(off_block__isnull=False, on_block__isnull=False)
+    if user is not None:
+        queryset = queryset.filter(user=user)
+    return (
+        queryset.order_by("date", "off_block")
+        .values_list(*FIELDS)
+        .iterator(chunk_size=5000)
+    )
+
+
+def find_all(user=None):
+    """
+    Every conflict in the logbook (or one pilot's), archived flights
+    included, in the order the later flight of each pair started.
+    """
+    rows = heapq.merge(
+        _ordered(ArchivedFlight, user), _ordered(FlightLogEntry, user), key=_start,
+    )
+    return sweep(rows)
@@ -0,0 +1,11 @@
+from . import profiles
+
+
+def pilot_profile(request):
+    """Expose the logged-in pilot's profile (header avatar) to all templates."""
+    if not request.user.is_authenticated:
+        return {}
+    profile = getattr(request, "pilot_profile", None)
+    if profile is None:
+        profile = profiles.get_profile(request.user)
+    return {"pilot_profile": profile}
@@ -0,0 +1,131 @@
+"""
+Pilot currency and document expiry, evaluated in batches.
+
+evaluate() works out for every pilot (or a few) at once whether they
+are current - LOGBOOK_CURRENCY_TAKEOFFS takeoffs and
+LOGBOOK_CURRENCY_LANDINGS landings in the last LOGBOOK_CURRENCY_DAYS
+days, simulator sessions not counted - and when that and their medical
+certificate and licence run out. Results go to PilotStatus, indexed by
+the next date something falls due, so "who is about to lapse" lists and
+the audit page read one row instead of recomputing.
+
+However many pilots there are, a run reads the profiles' expiry dates
+once, scans the window's flights once (newest first, over the date
+index) and writes the statuses with batched upserts. Run it daily
+with `manage.py evaluate_currency` from cron; a pilot's own status is
+also refreshed when they change their expiry dates or log, change or
+delete a flight inside the window.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import FlightLogEntry, PilotProfile, PilotStatus
+
+BATCH_SIZE = 1000
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class _Recency:
+    __slots__ = ("minutes", "takeoffs", "landings", "takeoffs_met", "landings_met")
+
+    def __init__(self):
+        self.minutes = self.takeoffs = self.landings = 0
+        self.takeoffs_met = self.landings_met = None
+
+    def add(self, day, minutes, takeoffs, landings, need_takeoffs, need_landings):
+        """Count one flight; flights must come newest first."""
+        self.minutes += minutes or 0
+        self.takeoffs += takeoffs
+        self.landings += landings
+        # The day the requirement was last met: currency runs from there.
+        if self.takeoffs_met is None and self.takeoffs >= need_takeoffs:
+            self.takeoffs_met = day
+        if self.landings_met is None and self.landings >= need_landings:
+            self.landings_met = day
+
+
+def status(user_id, recency, medical_expires, license_expires, today, days):
+    """The PilotStatus for one pilot (unsaved)."""
+    current_until = None
+    if recency.takeoffs_met and recency.landings_met:
+        current_until = min(recency.takeoffs_met, recency.landings_met) + timedelta(days=days)
+
+    due = [
+        (when, item) for when, item in (
+            (current_until, PilotStatus.Item.RECENCY),
+            (medical_expires, PilotStatus.Item.MEDICAL),
+            (license_expires, PilotStatus.Item.LICENSE),
+        ) if when is not None
+    ]
+    next_due, next_item = min(due) if due else (None, "")
+    return PilotStatus(
+        user_id=user_id,
+        evaluated_on=today,
+        recent_minutes=recency.minutes,
+        recent_takeoffs=recency.takeoffs,
+        recent_landings=recency.landings,
+        current_until=current_until,
+        next_due=next_due,
+        next_due_item=next_item,
+        lapsed=current_until is None or any(when < today for when, _ in due),
+    )
+
+
+def in_window(day, today=None):
+    """Whether a flight on `day` counts towards recency today."""
+    today = today or timezone.localdate()
+    return today - timedelta(days=_setting("LOGBOOK_CURRENCY_DAYS", 90)) <= day <= today
+
+
+def evaluate(user_ids=None, today=None):
+    """
+    Evaluate and save the PilotStatus of every pilot with a profile, or
+    only `user_ids`. Returns the number of statuses written.
+    """
+    today = today or timezone.localdate()
+    days = _setting("LOGBOOK_CURRENCY_DAYS", 90)
+    need_takeoffs = _setting("LOGBOOK_CURRENCY_TAKEOFFS", 3)
+    need_landings = _setting("LOGBOOK_CURRENCY_LANDINGS", 3)
+
+    profiles = PilotProfile.objects.all()
+    flights = FlightLogEntry.objects.filter(
+        date__gte=today - timedelta(days=days), date__lte=today, is_simulator=False,
+    )
+    if user_ids is not None:
+        profiles = profiles.filter(user_id__in=user_ids)
+        flights = flights.filter(user_id__in=user_ids)
+
+    flights = flights.annotate(
+        takeoffs=F("takeoff_day") + F("takeoff_night"),
+        landings=F("landing_day") + F("landing_night"),
+    ).order_by("-date").values_list("user_id", "date", "flight_time", "takeoffs", "landings")
+
+    recency = {}
+    for user_id, day, minutes, takeoffs, landings in flights.iterator(chunk_size=5000):
+        if user_id not in recency:
+            recency[user_id] = _Recency()
+        recency[user_id].add(day, minutes, takeoffs, landings, need_takeoffs, need_landings)
+
+    statuses = [
+        status(user_id, recency.get(user_id) or _Recency(), medical, license, today, days)
+        for user_id, medical, license in profiles.values_list(
+            "user_id", "medical_certificate_expires", "flight_crew_license_expires",
+        ).iterator(chunk_size=5000)
+    ]
+    PilotStatus.objects.bulk_create(
+        statuses,
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=["user"],
+        update_fields=[
+            "evaluated_on", "recent_minutes", "recent_takeoffs", "recent_landings",
+            "current_until", "next_due", "next_due_item", "lapsed",
+        ],
+    )
+    return len(statuses)
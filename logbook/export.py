@@ -0,0 +1,84 @@
+"""
+CSV export of flights, shared by the export view and the admin action.
+
+Rows are written to the response as they are produced, so exporting a
+large logbook never holds the whole file (or all flights) in memory.
+"""
+from django.http import StreamingHttpResponse
+
+HEADER = [
+    "Date",
+    "Departure",
+    "Arrival",
+    "Departure time",
+    "Arrival time",
+    "UAV type",
+    "UAV registration",
+    "GCS type",
+    "GCS registration",
+    "Pilot role",
+    "Takeoffs (day)",
+    "Takeoffs (night)",
+    "Landings (day)",
+    "Landings (night)",
+    "Flight time (min)",
+    "Simulator?",
+    "Simulator type",
+    "Simulator time (min)",
+    "Remarks",
+    "Departure latitude",
+    "Departure longitude",
+    "Arrival latitude",
+    "Arrival longitude",
+]
+
+
+def csv_row(f):
+    return [
+        f.date,
+        f.departure,
+        f.arrival,
+        f.off_block,
+        f.on_block,
+        f.get_uav_type_display(),
+        f.uav_reg,
+        f.get_gcs_type_display() if f.gcs_type else "",
+        f.gcs_reg,
+        f.get_pilot_role_display(),
+        f.takeoff_day,
+        f.takeoff_night,
+        f.landing_day,
+        f.landing_night,
+        f.flight_time,
+        "Yes" if f.is_simulator else "No",
+        f.simulator_type,
+        f.simulator_time,
+        f.remarks,
+        f.departure_lat,
+        f.departure_lon,
+        f.arrival_lat,
+        f.arrival_lon,
+    ]
+
+
+class _Echo:
+    """File-like object for csv.writer that hands each line back."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(flights, filename="uas_logbook.csv"):
+    """Stream `flights` (any iterable of flight records) as a CSV download."""
+    import csv  # not at module level: the admin imports this module at startup
+
+    writer = csv.writer(_Echo())
+
+    def lines():
+        yield writer.writerow(HEADER)
+        for flight in flights:
+            yield writer.writerow(csv_row(flight))
+
+    response = StreamingHttpResponse(lines(), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
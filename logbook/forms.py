@@ -16,6 +16,12 @@ class FlightLogEntryForm(forms.ModelForm):
             "on_block",
             "pilot_role",
 
+            # Coordinates (optional)
+            "departure_lat",
+            "departure_lon",
+            "arrival_lat",
+            "arrival_lon",
+
             # UAV / GCS (simple)
             "uav_type",
             "uav_model",
@@ -45,6 +51,10 @@ class FlightLogEntryForm(forms.ModelForm):
             "date": forms.DateInput(attrs={"type": "date"}),
             "off_block": forms.TimeInput(attrs={"type": "time"}),
             "on_block": forms.TimeInput(attrs={"type": "time"}),
+            "departure_lat": forms.NumberInput(attrs={"step": "any", "min": -90, "max": 90}),
+            "departure_lon": forms.NumberInput(attrs={"step": "any", "min": -180, "max": 180}),
+            "arrival_lat": forms.NumberInput(attrs={"step": "any", "min": -90, "max": 90}),
+            "arrival_lon": forms.NumberInput(attrs={"step": "any", "min": -180, "max": 180}),
         }
 
 
@@ -56,8 +66,14 @@ class PilotProfileForm(forms.ModelForm):
             "medical_certificate",
             "flight_crew_license",
             "other_document",
+            "medical_certificate_expires",
+            "flight_crew_license_expires",
             "time_display_unit",
         ]
+        widgets = {
+            "medical_certificate_expires": forms.DateInput(attrs={"type": "date"}),
+            "flight_crew_license_expires": forms.DateInput(attrs={"type": "date"}),
+        }
 
 class PilotSettingsForm(forms.ModelForm):
     class Meta:
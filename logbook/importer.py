@@ -0,0 +1,397 @@
+"""
+Parallel import of flights from CSV and XLSX files.
+
+Large files are split into chunks that are parsed and validated in a
+process pool, while a single writer in the calling process saves the
+typed records in file order:
+
+- CSV files are cut into byte ranges that end on a line break outside
+  quotes (a remark may span several lines), so each worker reads only
+  its own part of the file.
+- XLSX files (needs the optional openpyxl package) are split into row
+  ranges. A worksheet can only be read from the top, so workers still
+  stream past earlier rows and XLSX gains less from extra workers.
+
+The writer saves a chunk at a time - one bulk insert, one range of
+change sequence numbers, one Merkle tree update and one count per map
+cell - while the pool parses the chunks after it.
+
+This module avoids Django imports at module level: pool workers only
+need the parsing half and may be started without Django set up.
+"""
+import csv
+import io
+import os
+import tempfile
+from datetime import date, time
+
+# Columns as written by our CSV export and older logbook apps.
+COLUMNS = {
+    "Date": "date",
+    "Departure": "departure",
+    "Arrival": "arrival",
+    "Departure time": "off_block",
+    "Arrival time": "on_block",
+    "UAV configuration": "uav_type",
+    "UAV type": "uav_type",
+    "UAV model": "uav_model",
+    "UAV registration": "uav_reg",
+    "GCS form factor": "gcs_type",
+    "GCS type": "gcs_type",
+    "GCS registration": "gcs_reg",
+    "EASA class": "uav_easa_class",
+    "Mission type": "mission_type",
+    "GCS software": "gcs_software",
+    "Pilot role": "pilot_role",
+    "Takeoffs (day)": "takeoff_day",
+    "Takeoffs (night)": "takeoff_night",
+    "Landings (day)": "landing_day",
+    "Landings (night)": "landing_night",
+    "Simulator?": "is_simulator",
+    "Simulator type": "simulator_type",
+    "Simulator time (min)": "simulator_time",
+    "Remarks": "remarks",
+    "Departure latitude": "departure_lat",
+    "Departure longitude": "departure_lon",
+    "Arrival latitude": "arrival_lat",
+    "Arrival longitude": "arrival_lon",
+}
+
+TEXT_FIELDS = (
+    "departure", "arrival", "uav_model", "uav_reg", "gcs_reg",
+    "gcs_software", "simulator_type", "remarks",
+)
+COUNT_FIELDS = ("takeoff_day", "takeoff_night", "landing_day", "landing_night")
+# (latitude, longitude) field pairs; a point needs both or neither.
+POINT_FIELDS = (("departure_lat", "departure_lon"), ("arrival_lat", "arrival_lon"))
+
+# PositiveIntegerField's upper bound on every database.
+MAX_COUNT = 2147483647
+
+# Files smaller than this are parsed in-process: starting workers costs more.
+PARALLEL_MIN_BYTES = 1024 * 1024
+CHUNKS_PER_WORKER = 4
+
+
+class ImportFileError(ValueError):
+    """
+    The file can't be imported (any further). `saved` holds the flights
+    already committed when it stopped part-way.
+    """
+
+    def __init__(self, message, saved=()):
+        super().__init__(message)
+        self.saved = list(saved)
+
+
+def choice_maps():
+    """{field: {code or lower-cased label: code}} for the choice fields."""
+    from .models import FlightRecord
+
+    maps = {}
+    for field, choices in (
+        ("uav_type", FlightRecord.UavConfig.choices),
+        ("gcs_type", FlightRecord.GcsFormFactor.choices),
+        ("uav_easa_class", FlightRecord.EasaClass.choices),
+        ("mission_type", FlightRecord.MissionType.choices),
+        ("pilot_role", FlightRecord.PilotRole.choices),
+    ):
+        maps[field] = {code: code for code, _ in choices}
+        maps[field].update((str(label).lower(), code) for code, label in choices)
+    return maps
+
+
+def max_lengths():
+    """{field: max_length} for the text fields that have one."""
+    from .models import FlightRecord
+
+    lengths = {}
+    for field in TEXT_FIELDS:
+        max_length = FlightRecord._meta.get_field(field).max_length
+        if max_length:
+            lengths[field] = max_length
+    return lengths
+
+
+# ---- Parsing (runs in the workers) ----
+
+def _time(value):
+    """HH:MM or HH:MM:SS, without strptime."""
+    if isinstance(value, time):
+        return value
+    value = (value or "").strip()
+    if not value:
+        return None
+    parts = value.split(":")
+    if len(parts) not in (2, 3):
+        raise ValueError(f"Bad time {value!r}.")
+    return time(*(int(p) for p in parts))
+
+
+def _date(value):
+    if isinstance(value, date):
+        return value.date() if hasattr(value, "date") else value
+    return date.fromisoformat(value.strip())
+
+
+def _count(value):
+    if value in (None, ""):
+        return 0
+    number = int(value)
+    if not 0 <= number <= MAX_COUNT:
+        raise ValueError(f"Count {number} out of range.")
+    return number
+
+
+def _degrees(value, limit):
+    if value in (None, ""):
+        return None
+    number = float(value)
+    if not -limit <= number <= limit:
+        raise ValueError(f"Coordinate {number} out of range.")
+    return number
+
+
+def parse_record(row, choices, lengths=None):
+    """
+    Typed field values for one row ({column: raw value}), checked
+    against the choices and `lengths` ({field: max_length}). Raises
+    ValueError for rows that can't be imported.
+    """
+    values = {}
+    for column, raw in row.items():
+        field = COLUMNS.get(column)
+        if field is not None and raw not in (None, ""):
+            values[field] = raw if not isinstance(raw, str) else raw.strip()
+
+    if not values.get("date") or not values.get("departure") or not values.get("arrival"):
+        raise ValueError("Date, departure and arrival are required.")
+
+    record = {
+        "date": _date(values["date"]),
+        "off_block": _time(values.get("off_block")),
+        "on_block": _time(values.get("on_block")),
+        "is_simulator": str(values.get("is_simulator", "")).lower() == "yes",
+        "simulator_time": _count(values.get("simulator_time")),
+    }
+    for field in TEXT_FIELDS:
+        record[field] = str(values.get(field, ""))
+        limit = (lengths or {}).get(field)
+        if limit and len(record[field]) > limit:
+            raise ValueError(f"{field} is longer than {limit} characters.")
+    for field in COUNT_FIELDS:
+        record[field] = _count(values.get(field))
+    for lat, lon in POINT_FIELDS:
+        record[lat] = _degrees(values.get(lat), 90)
+        record[lon] = _degrees(values.get(lon), 180)
+        if (record[lat] is None) != (record[lon] is None):
+            raise ValueError("Coordinates need both latitude and longitude.")
+    for field, valid in choices.items():
+        raw = values.get(field)
+        if raw is None:
+            continue
+        code = valid.get(raw) or valid.get(str(raw).lower())
+        if code is None:
+            raise ValueError(f"Unknown {field} {raw!r}.")
+        record[field] = code
+    record.setdefault("uav_type", "OTHER")
+    return record
+
+
+def _parse_rows(rows, choices, lengths):
+    records, skipped = [], 0
+    for row in rows:
+        try:
+            records.append(parse_record(row, choices, lengths))
+        except (TypeError, ValueError):
+            skipped += 1
+    return records, skipped
+
+
+def _parse_csv_range(path, start, end, header, choices, lengths):
+    with open(path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8-sig")
+    return _parse_rows(
+        csv.DictReader(io.StringIO(text, newline=""), fieldnames=header), choices, lengths,
+    )
+
+
+def _parse_xlsx_range(path, first_row, last_row, header, choices, lengths):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(min_row=first_row, max_row=last_row, values_only=True)
+        return _parse_rows((dict(zip(header, row)) for row in rows), choices, lengths)
+    finally:
+        workbook.close()
+
+
+# ---- Splitting ----
+
+def csv_chunks(path, count):
+    """
+    Header plus up to `count` (start, end) byte ranges covering the rows
+    of a CSV file. Every range ends on a line break with an even number
+    of quote characters before it, i.e. never inside a quoted field.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header_line = f.readline()
+        header = next(csv.reader([header_line.decode("utf-8-sig")]), None)
+        if not header:
+            raise ImportFileError("The file has no header row.")
+
+        ranges = []
+        start = quotes_to = f.tell()
+        quotes = 0
+        step = max((size - start) // max(count, 1), 1)
+        while start < size:
+            target = min(start + step, size)
+            f.seek(quotes_to)
+            quotes += f.read(target - quotes_to).count(b'"')
+            end = target
+            line = b""
+            while end < size and (quotes % 2 or not line.endswith(b"\n")):
+                line = f.readline()
+                if not line:
+                    break
+                quotes += line.count(b'"')
+                end += len(line)
+            ranges.append((start, end))
+            start = quotes_to = end
+    return header, ranges
+
+
+def xlsx_chunks(path, count):
+    from openpyxl import load_workbook
+
+    try:
+        workbook = load_workbook(path, read_only=True, data_only=True)
+    except Exception:  # zipfile/XML errors for anything that isn't a workbook
+        raise ImportFileError("This is not a readable XLSX file.")
+    try:
+        sheet = workbook.active
+        header = [str(c) if c is not None else "" for c in next(
+            sheet.iter_rows(min_row=1, max_row=1, values_only=True), ()
+        )]
+        last = sheet.max_row or 1
+    finally:
+        workbook.close()
+    if not any(header):
+        raise ImportFileError("The file has no header row.")
+    step = max((last - 1) // max(count, 1) + 1, 1)
+    return header, [(first, min(first + step - 1, last)) for first in range(2, last + 1, step)]
+
+
+def parse_file(path, kind="csv", workers=1):
+    """
+    Yield (records, skipped) per chunk of the file, in file order.
+    Chunks are parsed by `workers` processes (in-process for 1 worker or
+    a small file).
+    """
+    if kind == "xlsx":
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            raise ImportFileError("Importing XLSX files needs the openpyxl package.")
+        split, parse = xlsx_chunks, _parse_xlsx_range
+    else:
+        split, parse = csv_chunks, _parse_csv_range
+
+    if os.path.getsize(path) < PARALLEL_MIN_BYTES:
+        workers = 1
+    header, chunks = split(path, workers * CHUNKS_PER_WORKER)
+    choices, lengths = choice_maps(), max_lengths()
+    if workers <= 1 or len(chunks) <= 1:
+        for first, last in chunks:
+            yield parse(path, first, last, header, choices, lengths)
+        return
+
+    # Loaded here: the pool machinery costs more to import than the rest
+    # of this module, and most imports are small enough to skip it.
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(
+            parse,
+            *zip(*((path, first, last, header, choices, lengths) for first, last in chunks)),
+        )
+
+
+# ---- Writing ----
+
+def default_workers():
+    from django.conf import settings
+
+    return getattr(settings, "LOGBOOK_IMPORT_WORKERS", None) or os.cpu_count() or 1
+
+
+def import_file(user, path, kind="csv", workers=None):
+    """
+    Parse `path` in parallel and save its flights for `user`. Returns the
+    saved flights and the number of rows that were skipped. Chunks are
+    committed as they are written, so if the file turns out unreadable
+    part-way the ImportFileError carries the flights already saved.
+    """
+    from django.db import DatabaseError
+
+    created, skipped = [], 0
+    try:
+        for records, bad in parse_file(path, kind, workers or default_workers()):
+            skipped += bad
+            created.extend(save_records(user, records))
+    except ImportFileError as exc:
+        raise ImportFileError(str(exc), saved=created) from exc
+    except (csv.Error, UnicodeDecodeError, ValueError, DatabaseError) as exc:
+        raise ImportFileError(str(exc) or type(exc).__name__, saved=created) from exc
+    return created, skipped
+
+
+def save_records(user, records):
+    """
+    Save new flights for `user` in one transaction, doing in bulk what
+    FlightLogEntry.save() and its signals do for a single flight.
+    """
+    from django.db import transaction
+
+    from . import currency, merkle, spatial
+    from .models import ChangeCounter, FlightLogEntry
+
+    entries = [FlightLogEntry(user=user, **record) for record in records]
+    if not entries:
+        return entries
+    for entry in entries:
+        entry.calculate_flight_time()
+        entry.bump_server_version()
+
+    with transaction.atomic():
+        for entry, seq in zip(entries, ChangeCounter.next_values(len(entries))):
+            entry.change_seq = seq
+        FlightLogEntry.objects.bulk_create(entries, batch_size=1000)
+        if entries[0].pk is None:  # the backend can't return ids from bulk inserts
+            ids = dict(
+                FlightLogEntry.objects
+                .filter(uuid__in=[entry.uuid for entry in entries])
+                .values_list("uuid", "pk")
+            )
+            for entry in entries:
+                entry.pk = ids[entry.uuid]
+        merkle.append_flights(user.pk, entries)
+        spatial.count_many(user.pk, [spatial.location(entry) for entry in entries])
+        if any(currency.in_window(entry.date) for entry in entries):
+            currency.evaluate([user.pk])
+    return entries
+
+
+def import_upload(user, upload, workers=None):
+    """import_file() for an uploaded file; XLSX is recognised by its name."""
+    kind = "xlsx" if upload.name.lower().endswith(".xlsx") else "csv"
+    if hasattr(upload, "temporary_file_path"):
+        return import_file(user, upload.temporary_file_path(), kind, workers)
+    with tempfile.NamedTemporaryFile(suffix=f".{kind}") as f:
+        for chunk in upload.chunks():
+            f.write(chunk)
+        f.flush()
+        return import_file(user, f.name, kind, workers)
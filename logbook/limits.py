@@ -0,0 +1,292 @@
+"""
+Concurrency limits for heavy views.
+
+Exports, imports, the audit page, the logbook PDF and pivot reports work
+through a user's whole logbook. @limited gives each such request a slot
+from two semaphores - one per user (LOGBOOK_HEAVY_PER_USER) and one
+shared by everybody (LOGBOOK_HEAVY_TOTAL) - so one user firing several
+at once can't occupy every worker. A slot is a cache key taken with
+cache.add(), which is atomic on every backend, so the limits hold across
+worker processes as long as they share a cache (Memcached, Redis, the
+database cache). Slots are leases: if a worker dies holding one it comes
+free after LOGBOOK_HEAVY_LEASE_SECONDS.
+
+A request that finds no free slot queues, polling, for up to
+LOGBOOK_HEAVY_QUEUE_SECONDS and then gets a 429 with Retry-After.
+Leases are renewed while the view runs (from a heartbeat thread, so a
+long import keeps its slots) and, for streamed responses, until the body
+has been sent (or the client went away).
+
+With coalesce=True, identical GET requests (same user, path and query)
+that arrive while one is being computed wait for that response instead
+of computing it again.
+
+Every limited response reports the time it spent queued in a
+Server-Timing header ("queue;dur=<ms>", plus "coalesced" when it shared
+another request's result), which browser dev tools and APM agents show.
+"""
+import hashlib
+import math
+import threading
+import time
+from functools import wraps
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+
+POLL_INTERVAL = 0.05
+POLL_MAX_INTERVAL = 0.25
+# Running views and streams renew their leases this often, so long imports
+# and downloads keep their slots.
+RENEW_SECONDS = 30
+# How long a coalesced result stays in the cache for requests waiting on it.
+RESULT_TIMEOUT = 30
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class Slot:
+    """One leased semaphore slot."""
+
+    def __init__(self, key, token, lease):
+        self.key, self.token, self.lease = key, token, lease
+
+    def renew(self):
+        cache.touch(self.key, self.lease)
+
+    def release(self):
+        # Not atomic, but a lease only runs out under us after
+        # LOGBOOK_HEAVY_LEASE_SECONDS without a renewal.
+        if cache.get(self.key) == self.token:
+            cache.delete(self.key)
+
+
+def _take(name, size, lease):
+    """A free slot of semaphore `name` with `size` slots, or None."""
+    token = uuid4().hex
+    for i in range(size):
+        key = f"logbook:slot:{name}:{i}"
+        if cache.add(key, token, lease):
+            return Slot(key, token, lease)
+    return None
+
+
+def _sleep(interval, deadline):
+    """Sleep up to `interval` (not past `deadline`); the next interval."""
+    time.sleep(max(min(interval, deadline - time.monotonic()), 0))
+    return min(interval * 2, POLL_MAX_INTERVAL)
+
+
+def acquire(user_id, wait=None):
+    """
+    Slots for `user_id` from the per-user and the total semaphore,
+    waiting up to `wait` seconds (LOGBOOK_HEAVY_QUEUE_SECONDS). Returns
+    the slots, or None if none came free in time. A limit of None means
+    no limit.
+    """
+    per_user = _setting("LOGBOOK_HEAVY_PER_USER", 2)
+    total = _setting("LOGBOOK_HEAVY_TOTAL", 4)
+    lease = _setting("LOGBOOK_HEAVY_LEASE_SECONDS", 300)
+    if wait is None:
+        wait = _setting("LOGBOOK_HEAVY_QUEUE_SECONDS", 5)
+
+    deadline = time.monotonic() + wait
+    interval = POLL_INTERVAL
+    while True:
+        slots = []
+        for name, size in ((f"user:{user_id}", per_user), ("total", total)):
+            if size is None:
+                continue
+            slot = _take(name, size, lease)
+            if slot is None:
+                release(slots)
+                break
+            slots.append(slot)
+        else:
+            return slots
+        if time.monotonic() >= deadline:
+            return None
+        interval = _sleep(interval, deadline)
+
+
+def release(slots):
+    for slot in slots:
+        slot.release()
+
+
+class _Heartbeat:
+    """Renews slot leases from a background thread while a view runs."""
+
+    def __init__(self, slots):
+        self.slots = slots
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._beat, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+    def _beat(self):
+        try:
+            while not self.stopped.wait(RENEW_SECONDS):
+                for slot in self.slots:
+                    slot.renew()
+        finally:
+            # The database cache opens a connection for this thread.
+            connections.close_all()
+
+
+class _Holding:
+    """
+    Streamed content that gives its slots back once it is exhausted or
+    closed. A class rather than a generator: the server closes the
+    response even if it never started iterating, and an unstarted
+    generator would skip its cleanup.
+    """
+
+    def __init__(self, slots, content):
+        self.slots, self.content = slots, iter(content)
+        self.renewed = time.monotonic()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            chunk = next(self.content)
+        except BaseException:
+            self.close()
+            raise
+        if time.monotonic() - self.renewed > RENEW_SECONDS:
+            for slot in self.slots:
+                slot.renew()
+            self.renewed = time.monotonic()
+        return chunk
+
+    def close(self):
+        slots, self.slots = self.slots, []
+        release(slots)
+
+
+def too_busy():
+    wait = _setting("LOGBOOK_HEAVY_QUEUE_SECONDS", 5)
+    response = HttpResponse(
+        "Too many exports and reports are running. Please try again shortly.",
+        status=429,
+        content_type="text/plain; charset=utf-8",
+    )
+    response["Retry-After"] = str(max(math.ceil(wait), 1))
+    return response
+
+
+def _timing(response, queued, coalesced=False):
+    metrics = [response.get("Server-Timing"), f"queue;dur={queued * 1000:.1f}"]
+    if coalesced:
+        metrics.append('coalesced;desc="shared result"')
+    response["Server-Timing"] = ", ".join(filter(None, metrics))
+    return response
+
+
+# ---- Coalescing ----
+
+def _coalesce_key(request):
+    digest = hashlib.sha256(request.get_full_path().encode()).hexdigest()[:32]
+    return f"logbook:coalesce:{request.user.pk}:{digest}"
+
+
+def _frozen(response):
+    headers = [(k, v) for k, v in response.items() if k != "Server-Timing"]
+    return response.status_code, response.content, headers
+
+
+def _thawed(frozen):
+    status, content, headers = frozen
+    response = HttpResponse(content, status=status)
+    for name, value in headers:
+        response[name] = value
+    return response
+
+
+def _shared(key, token, lease):
+    """
+    Wait for the request holding `key` with `token` to finish; its
+    frozen response, or None if it left none (failed, streamed, died).
+    """
+    deadline = time.monotonic() + lease
+    interval = POLL_INTERVAL
+    while time.monotonic() < deadline:
+        frozen = cache.get(f"{key}:{token}")
+        if frozen is not None:
+            return frozen
+        if cache.get(key) != token:
+            # The result is stored before the key goes, so look once more.
+            return cache.get(f"{key}:{token}")
+        interval = _sleep(interval, deadline)
+    return None
+
+
+# ---- Decorator ----
+
+def _run(view, request, args, kwargs, started):
+    slots = acquire(request.user.pk)
+    queued = time.monotonic() - started
+    if slots is None:
+        return _timing(too_busy(), queued)
+    try:
+        with _Heartbeat(slots):
+            response = view(request, *args, **kwargs)
+    except BaseException:
+        release(slots)
+        raise
+    if getattr(response, "streaming", False):
+        response.streaming_content = _Holding(slots, response.streaming_content)
+    else:
+        release(slots)
+    return _timing(response, queued)
+
+
+def limited(view=None, *, coalesce=False, methods=None):
+    """
+    Run a heavy view within the concurrency limits, optionally only for
+    some HTTP `methods`. Use as @limited or @limited(coalesce=True).
+    """
+    if view is None:
+        return lambda view: limited(view, coalesce=coalesce, methods=methods)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if methods and request.method not in methods:
+            return view(request, *args, **kwargs)
+        started = time.monotonic()
+        if not (coalesce and request.method == "GET"):
+            return _run(view, request, args, kwargs, started)
+
+        key = _coalesce_key(request)
+        token = uuid4().hex
+        lease = _setting("LOGBOOK_HEAVY_LEASE_SECONDS", 300)
+        while not cache.add(key, token, lease):
+            leader = cache.get(key)
+            if leader is None:
+                continue  # it just finished; try to compute it ourselves
+            frozen = _shared(key, leader, lease)
+            if frozen is not None:
+                return _timing(_thawed(frozen), time.monotonic() - started, coalesced=True)
+
+        try:
+            response = _run(view, request, args, kwargs, started)
+            if not response.streaming and response.status_code == 200:
+                cache.set(f"{key}:{token}", _frozen(response), RESULT_TIMEOUT)
+            return response
+        finally:
+            if cache.get(key) == token:
+                cache.delete(key)
+    return wrapper
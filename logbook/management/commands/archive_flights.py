@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from logbook import archive
+from logbook.models import FlightLogEntry
+
+
+class Command(BaseCommand):
+    help = (
+        "Move flights older than the archive horizon "
+        "(LOGBOOK_ARCHIVE_AFTER_DAYS) into the archive table, then refresh "
+        "both tables' statistics. Run daily, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, help="Override the archive horizon in days.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true", help="Only count the flights.")
+
+    def handle(self, *args, **options):
+        if options["days"] is not None:
+            cutoff = timezone.now().date() - timedelta(days=options["days"])
+        else:
+            cutoff = archive.default_cutoff()
+
+        if options["dry_run"]:
+            count = FlightLogEntry.objects.filter(date__lt=cutoff).count()
+            self.stdout.write(f"{count} flights dated before {cutoff} would be archived.")
+            return
+
+        moved = archive.archive_before(cutoff, batch_size=options["batch_size"])
+        archive.analyze()
+        self.stdout.write(f"Archived {moved} flights dated before {cutoff}.")
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from logbook.benchmarks import BENCHMARKS, scratch_database
+
+
+class Command(BaseCommand):
+    help = "Run a local performance benchmark against a throw-away database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", help=f"One of: {', '.join(sorted(BENCHMARKS))}.")
+        parser.add_argument("--rows", type=int, default=100_000, help="Flights to seed.")
+        parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case.")
+
+    def handle(self, *args, **options):
+        try:
+            bench = BENCHMARKS[options["name"]]
+        except KeyError:
+            raise CommandError(f"Unknown benchmark. Choose from: {', '.join(sorted(BENCHMARKS))}.")
+
+        with scratch_database():
+            bench(self, options)
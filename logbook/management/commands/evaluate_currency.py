@@ -0,0 +1,44 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from logbook import currency
+from logbook.models import PilotStatus
+
+
+class Command(BaseCommand):
+    help = (
+        "Evaluate every pilot's currency and document expiry into the pilot "
+        "status table. Run daily, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="Evaluate as of this day (YYYY-MM-DD) instead of today.")
+        parser.add_argument(
+            "--warn-days", type=int, default=30,
+            help="Also list pilots with something falling due within this many days.",
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        if options["date"]:
+            try:
+                today = date.fromisoformat(options["date"])
+            except ValueError:
+                raise CommandError(f"Bad date {options['date']!r}, use YYYY-MM-DD.")
+
+        started = time.perf_counter()
+        count = currency.evaluate(today=today)
+        elapsed = time.perf_counter() - started
+
+        statuses = PilotStatus.objects.select_related("user")
+        lapsed = statuses.filter(lapsed=True).count()
+        self.stdout.write(f"Evaluated {count} pilots in {elapsed:.1f}s; {lapsed} not current.")
+        if options["warn_days"] > 0:
+            soon = statuses.filter(lapsed=False, next_due__isnull=False).order_by("next_due")
+            for status in soon.filter(next_due__lte=today + timedelta(days=options["warn_days"])):
+                self.stdout.write(
+                    f"{status.user}: {status.get_next_due_item_display()} due {status.next_due}"
+                )
@@ -0,0 +1,23 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from logbook import spatial
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the flight map cells for all (or the given) pilots, e.g. after "
+        "flights were bulk loaded without signals."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("usernames", nargs="*", help="Limit to these users.")
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by("pk")
+        if options["usernames"]:
+            users = users.filter(username__in=options["usernames"])
+
+        for user in users:
+            cells = spatial.rebuild_cells(user)
+            self.stdout.write(f"{user}: {cells} map cells")
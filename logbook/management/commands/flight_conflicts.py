@@ -0,0 +1,43 @@
+import time
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from logbook import conflicts
+
+
+class Command(BaseCommand):
+    help = "Report overlapping and duplicate flights, per pilot and per airframe."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only check this pilot's logbook (username).")
+        parser.add_argument(
+            "--limit", type=int, default=100,
+            help="Print at most this many conflicts (0 prints none, only the summary).",
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if options["user"]:
+            User = get_user_model()
+            try:
+                user = User.objects.get(**{User.USERNAME_FIELD: options["user"]})
+            except User.DoesNotExist:
+                raise CommandError(f"No user {options['user']!r}.")
+
+        started = time.perf_counter()
+        counts = Counter()
+        for conflict in conflicts.find_all(user):
+            counts[conflict.kind, conflict.scope] += 1
+            if sum(counts.values()) <= options["limit"]:
+                self.stdout.write(
+                    f"{conflict.kind} ({conflict.scope} {conflict.key}): "
+                    f"flights {conflict.first} and {conflict.second}"
+                )
+        elapsed = time.perf_counter() - started
+
+        summary = ", ".join(
+            f"{n} {kind}s ({scope})" for (kind, scope), n in sorted(counts.items())
+        ) or "no conflicts"
+        self.stdout.write(f"{summary}; checked in {elapsed:.1f}s.")
@@ -0,0 +1,21 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from logbook import merkle
+
+
+class Command(BaseCommand):
+    help = "Rebuild the logbook Merkle tree for all (or the given) pilots."
+
+    def add_arguments(self, parser):
+        parser.add_argument("usernames", nargs="*", help="Limit to these users.")
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by("pk")
+        if options["usernames"]:
+            users = users.filter(username__in=options["usernames"])
+
+        for user in users:
+            merkle.rebuild(user)
+            tree = user.merkle_tree
+            self.stdout.write(f"{user}: {tree.size} leaves, root {tree.root or '-'}")
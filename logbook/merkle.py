@@ -0,0 +1,364 @@
+"""
+Tamper-evident integrity layer for the logbook.
+
+Each pilot gets a binary Merkle tree over their flights. Leaves are
+appended in insertion order and never move: editing a flight rewrites
+its leaf, deleting it replaces the leaf with a tombstone. Only the path
+from that leaf up to the root is recomputed, so every save/delete/import
+costs O(log n) node reads and writes instead of re-hashing the logbook.
+A batch of new flights (an import) is appended in one pass that writes
+each affected node once.
+
+Hashing follows RFC 6962 style domain separation:
+
+    leaf  = sha256(0x00 || canonical JSON of the flight)
+    node  = sha256(0x01 || left || right)
+    empty = sha256(b"") at level 0, node(empty, empty) above
+"""
+import hashlib
+import heapq
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+
+from .models import ArchivedFlight, MerkleNode, MerkleTree
+
+# Fields that make up a flight record in the tree. Keep this list stable:
+# changing it changes every leaf and therefore every published root, so
+# bump the version in SCHEME and have trees rebuilt (`manage.py
+# merkle_rebuild`). v2 added the departure/arrival coordinates.
+LEAF_FIELDS = (
+    "id",
+    "date",
+    "departure",
+    "arrival",
+    "departure_lat",
+    "departure_lon",
+    "arrival_lat",
+    "arrival_lon",
+    "off_block",
+    "on_block",
+    "uav_type",
+    "uav_model",
+    "uav_reg",
+    "gcs_type",
+    "gcs_reg",
+    "uav_easa_class",
+    "mission_type",
+    "gcs_software",
+    "pilot_role",
+    "takeoff_day",
+    "takeoff_night",
+    "landing_day",
+    "landing_night",
+    "flight_time",
+    "is_simulator",
+    "simulator_type",
+    "simulator_time",
+    "remarks",
+    "created_at",
+)
+
+SCHEME = "v2; sha256; leaf=H(0x00||canonical_json(record)); node=H(0x01||left||right)"
+
+_EMPTY = [hashlib.sha256(b"").hexdigest()]
+
+
+def _sha256(prefix, *parts):
+    h = hashlib.sha256(prefix)
+    for part in parts:
+        h.update(bytes.fromhex(part))
+    return h.hexdigest()
+
+
+def empty_digest(level):
+    """Digest of a subtree of the given level that holds no leaves yet."""
+    while len(_EMPTY) <= level:
+        _EMPTY.append(node_digest(_EMPTY[-1], _EMPTY[-1]))
+    return _EMPTY[level]
+
+
+def node_digest(left, right):
+    return _sha256(b"\x01", left, right)
+
+
+def canonical_json(record):
+    return json.dumps(
+        record, cls=DjangoJSONEncoder, sort_keys=True, separators=(",", ":")
+    )
+
+
+def leaf_record(flight):
+    return {name: getattr(flight, name) for name in LEAF_FIELDS}
+
+
+def leaf_digest(record):
+    return hashlib.sha256(b"\x00" + canonical_json(record).encode()).hexdigest()
+
+
+def tombstone_digest(flight_pk):
+    return leaf_digest({"id": flight_pk, "deleted": True})
+
+
+def tree_height(size):
+    """Number of levels above the leaves needed to hold `size` leaves."""
+    return max(size - 1, 0).bit_length()
+
+
+# ---- Incremental updates ----
+
+def record_flight(flight):
+    """Insert or refresh the leaf for a saved flight."""
+    with transaction.atomic():
+        tree = _lock_tree(flight.user_id)
+        position = (
+            MerkleNode.objects
+            .filter(user_id=flight.user_id, level=0, flight_pk=flight.pk)
+            .values_list("position", flat=True)
+            .first()
+        )
+        if position is None:
+            position = tree.size
+            tree.size += 1
+        _update_path(tree, position, leaf_digest(leaf_record(flight)), flight.pk)
+
+
+def append_flights(user_id, flights):
+    """
+    Add leaves for many newly created flights at once. The new leaves are
+    contiguous, so above them only the nodes they cover change; those are
+    computed level by level and written in one bulk upsert, with at most
+    two stored siblings read per level.
+    """
+    if not flights:
+        return
+    with transaction.atomic():
+        tree = _lock_tree(user_id)
+        first = tree.size
+        tree.size += len(flights)
+        height = tree_height(tree.size)
+
+        level_digests = {
+            first + i: leaf_digest(leaf_record(flight)) for i, flight in enumerate(flights)
+        }
+        nodes = [
+            MerkleNode(
+                user_id=user_id, level=0, position=first + i,
+                digest=level_digests[first + i], flight_pk=flight.pk,
+            )
+            for i, flight in enumerate(flights)
+        ]
+
+        # Stored nodes next to the edges of the new range, at every level.
+        lookup = Q(pk__in=[])
+        for level in range(height):
+            low, high = first >> level, (tree.size - 1) >> level
+            lookup |= Q(level=level, position__in=[low ^ 1, high ^ 1])
+        stored = {
+            (level, pos): d
+            for level, pos, d in MerkleNode.objects
+            .filter(lookup, user_id=user_id)
+            .values_list("level", "position", "digest")
+        }
+
+        for level in range(height):
+            parents = {}
+            for index in sorted({pos >> 1 for pos in level_digests}):
+                left, right = (
+                    level_digests.get(pos) or stored.get((level, pos)) or empty_digest(level)
+                    for pos in (2 * index, 2 * index + 1)
+                )
+                parents[index] = node_digest(left, right)
+            level_digests = parents
+            nodes.extend(
+                MerkleNode(user_id=user_id, level=level + 1, position=index, digest=d)
+                for index, d in parents.items()
+            )
+
+        MerkleNode.objects.bulk_create(
+            nodes,
+            batch_size=2000,
+            update_conflicts=True,
+            unique_fields=["user", "level", "position"],
+            update_fields=["digest", "flight_pk"],
+        )
+        tree.root = level_digests[0]
+        tree.save(update_fields=["size", "root", "updated_at"])
+
+
+def forget_flight(flight):
+    """Replace a deleted flight's leaf with a tombstone."""
+    with transaction.atomic():
+        # Never create a tree here: the pilot may be being deleted.
+        tree = MerkleTree.objects.select_for_update().filter(user_id=flight.user_id).first()
+        if tree is None:
+            return
+        position = (
+            MerkleNode.objects
+            .filter(user_id=flight.user_id, level=0, flight_pk=flight.pk)
+            .values_list("position", flat=True)
+            .first()
+        )
+        if position is None:
+            return
+        _update_path(tree, position, tombstone_digest(flight.pk), flight.pk)
+
+
+def _lock_tree(user_id):
+    tree, _ = MerkleTree.objects.select_for_update().get_or_create(user_id=user_id)
+    return tree
+
+
+def _update_path(tree, position, digest, flight_pk):
+    height = tree_height(tree.size)
+
+    lookup = Q(pk__in=[])
+    for level in range(height):
+        lookup |= Q(level=level, position=(position >> level) ^ 1)
+    siblings = {
+        (level, pos): d
+        for level, pos, d in MerkleNode.objects
+        .filter(lookup, user_id=tree.user_id)
+        .values_list("level", "position", "digest")
+    }
+
+    nodes = [MerkleNode(
+        user_id=tree.user_id, level=0, position=position,
+        digest=digest, flight_pk=flight_pk,
+    )]
+    for level in range(height):
+        index = position >> level
+        sibling = siblings.get((level, index ^ 1), empty_digest(level))
+        if index % 2 == 0:
+            digest = node_digest(digest, sibling)
+        else:
+            digest = node_digest(sibling, digest)
+        nodes.append(MerkleNode(
+            user_id=tree.user_id, level=level + 1, position=index >> 1,
+            digest=digest,
+        ))
+
+    MerkleNode.objects.bulk_create(
+        nodes,
+        update_conflicts=True,
+        unique_fields=["user", "level", "position"],
+        update_fields=["digest", "flight_pk"],
+    )
+    tree.root = digest
+    tree.save(update_fields=["size", "root", "updated_at"])
+
+
+# ---- Full rebuild ----
+
+def rebuild(user):
+    """
+    Rebuild a pilot's tree from scratch in O(n), e.g. for flights logged
+    before the integrity layer existed. Archived flights keep their
+    leaves: both tables are merged in insertion order, as leaves were
+    appended. Deleted flights are not remembered, so this starts a new
+    history.
+    """
+    order = ("created_at", "pk")
+    flights = heapq.merge(
+        ArchivedFlight.objects.filter(user=user).order_by(*order).iterator(chunk_size=2000),
+        user.uas_flights.order_by(*order).iterator(chunk_size=2000),
+        key=lambda f: (f.created_at, f.pk),
+    )
+
+    with transaction.atomic():
+        MerkleNode.objects.filter(user=user).delete()
+        nodes = []
+        level_digests = []
+        for position, flight in enumerate(flights):
+            digest = leaf_digest(leaf_record(flight))
+            level_digests.append(digest)
+            nodes.append(MerkleNode(
+                user=user, level=0, position=position,
+                digest=digest, flight_pk=flight.pk,
+            ))
+
+        size = len(level_digests)
+        for level in range(tree_height(size)):
+            if len(level_digests) % 2:
+                level_digests.append(empty_digest(level))
+            level_digests = [
+                node_digest(level_digests[i], level_digests[i + 1])
+                for i in range(0, len(level_digests), 2)
+            ]
+            nodes.extend(
+                MerkleNode(user=user, level=level + 1, position=i, digest=d)
+                for i, d in enumerate(level_digests)
+            )
+        MerkleNode.objects.bulk_create(nodes, batch_size=2000)
+
+        MerkleTree.objects.update_or_create(
+            user=user,
+            defaults={"size": size, "root": level_digests[0] if size else ""},
+        )
+
+
+# ---- Proofs ----
+
+def inclusion_proofs(user, flight_pks):
+    """
+    Audit paths for the given flights against the pilot's current root.
+    Siblings are fetched level by level, so the cost is one query per
+    tree level however many flights are requested.
+    """
+    tree = MerkleTree.objects.filter(user=user).first()
+    if tree is None:
+        return {"scheme": SCHEME, "root": "", "size": 0, "proofs": []}
+
+    height = tree_height(tree.size)
+    leaves = list(
+        MerkleNode.objects
+        .filter(user=user, level=0, flight_pk__in=flight_pks)
+        .values_list("flight_pk", "position", "digest")
+        .order_by("position")
+    )
+
+    siblings = {}
+    for level in range(height):
+        wanted = sorted({(pos >> level) ^ 1 for _, pos, _ in leaves})
+        for i in range(0, len(wanted), 500):
+            siblings.update(
+                ((level, p), d)
+                for p, d in MerkleNode.objects
+                .filter(user=user, level=level, position__in=wanted[i:i + 500])
+                .values_list("position", "digest")
+            )
+
+    proofs = []
+    for flight_pk, position, digest in leaves:
+        path = [
+            siblings.get(
+                (level, (position >> level) ^ 1), empty_digest(level)
+            )
+            for level in range(height)
+        ]
+        proofs.append({
+            "flight": flight_pk,
+            "position": position,
+            "leaf": digest,
+            "path": path,
+        })
+
+    return {
+        "scheme": SCHEME,
+        "root": tree.root,
+        "size": tree.size,
+        "proofs": proofs,
+    }
+
+
+def verify_proof(leaf, position, path, root):
+    """Recompute the root from a leaf and its audit path."""
+    digest = leaf
+    for level, sibling in enumerate(path):
+        if (position >> level) % 2 == 0:
+            digest = node_digest(digest, sibling)
+        else:
+            digest = node_digest(sibling, digest)
+    return digest == root
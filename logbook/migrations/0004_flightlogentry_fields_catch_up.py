@@ -0,0 +1,113 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logbook', '0003_pilotprofile'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='flightlogentry',
+            name='block_time',
+        ),
+        migrations.RemoveField(
+            model_name='flightlogentry',
+            name='connection_time',
+        ),
+        migrations.RemoveField(
+            model_name='flightlogentry',
+            name='disconnection_time',
+        ),
+        migrations.RemoveField(
+            model_name='flightlogentry',
+            name='engine_class',
+        ),
+        migrations.RemoveField(
+            model_name='flightlogentry',
+            name='engine_start',
+        ),
+        migrations.RemoveField(
+            model_name='flightlogentry',
+            name='engine_stop',
+        ),
+        migrations.RemoveField(
+            model_name='flightlogentry',
+            name='engine_time',
+        ),
+        migrations.RemoveField(
+            model_name='flightlogentry',
+            name='gcs_time',
+        ),
+        migrations.RemoveField(
+            model_name='flightlogentry',
+            name='landing',
+        ),
+        migrations.RemoveField(
+            model_name='flightlogentry',
+            name='takeoff',
+        ),
+        migrations.AddField(
+            model_name='flightlogentry',
+            name='gcs_software',
+            field=models.CharField(blank=True, help_text='e.g. Embention, DJI Fly, QGroundControl…', max_length=50, verbose_name='GCS software'),
+        ),
+        migrations.AddField(
+            model_name='flightlogentry',
+            name='mission_type',
+            field=models.CharField(blank=True, choices=[('MAP', 'Mapping / Survey'), ('INSP', 'Inspection'), ('SAR', 'Search & Rescue'), ('TRN', 'Training flight'), ('REC', 'Recreational'), ('ISR', 'ISR / Surveillance'), ('CRG', 'Cargo / logistics'), ('EXP', 'Experimental mission')], max_length=4, verbose_name='Mission type'),
+        ),
+        migrations.AddField(
+            model_name='flightlogentry',
+            name='uav_easa_class',
+            field=models.CharField(blank=True, choices=[('C0', 'C0 (<250g)'), ('C1', 'C1 (<900g)'), ('C2', 'C2 (<4kg)'), ('C3', 'C3 (<25kg)'), ('C4', 'C4 (<25kg, no automation)'), ('C5', 'C5 (STS-01)'), ('C6', 'C6 (STS-02)')], max_length=3, verbose_name='EASA class'),
+        ),
+        migrations.AddField(
+            model_name='flightlogentry',
+            name='uav_model',
+            field=models.CharField(blank=True, help_text='e.g. fixed-wing piston trainer, Mavic 3 Pro', max_length=100, verbose_name='UAV model'),
+        ),
+        migrations.AddField(
+            model_name='pilotprofile',
+            name='time_display_unit',
+            field=models.CharField(choices=[('MIN', 'Minutes'), ('HMM', 'Hours:Minutes (hh:mm)')], default='MIN', max_length=3, verbose_name='Time display unit'),
+        ),
+        migrations.AlterField(
+            model_name='flightlogentry',
+            name='gcs_type',
+            field=models.CharField(blank=True, choices=[('HANDHELD', 'Handheld controller'), ('TABLET', 'Tablet controller'), ('RUGGED', 'Rugged tablet GCS'), ('LAPTOP', 'Laptop GCS'), ('BRIEFCASE', 'Portable briefcase GCS'), ('VEHICLE', 'Vehicle-mounted GCS'), ('FIXED', 'Fixed installation GCS'), ('FPV', 'FPV controller + goggles'), ('OTHER', 'Other')], help_text='Handheld, laptop GCS, vehicle, etc.', max_length=15, verbose_name='GCS form factor'),
+        ),
+        migrations.AlterField(
+            model_name='flightlogentry',
+            name='is_simulator',
+            field=models.BooleanField(default=False, verbose_name='Simulator session'),
+        ),
+        migrations.AlterField(
+            model_name='flightlogentry',
+            name='off_block',
+            field=models.TimeField(blank=True, null=True, verbose_name='Departure time'),
+        ),
+        migrations.AlterField(
+            model_name='flightlogentry',
+            name='on_block',
+            field=models.TimeField(blank=True, null=True, verbose_name='Arrival time'),
+        ),
+        migrations.AlterField(
+            model_name='flightlogentry',
+            name='pilot_role',
+            field=models.CharField(choices=[('PIC', 'Pilot in Command'), ('COP', 'Co-pilot'), ('OBS', 'Observer / VO'), ('STU', 'Student / Trainee'), ('INS', 'Instructor'), ('EXM', 'Examiner'), ('OTH', 'Other')], default='PIC', max_length=3, verbose_name='Pilot role'),
+        ),
+        migrations.AlterField(
+            model_name='flightlogentry',
+            name='remarks',
+            field=models.TextField(blank=True, verbose_name='Remarks / skill tests / checks'),
+        ),
+        migrations.AlterField(
+            model_name='flightlogentry',
+            name='uav_type',
+            field=models.CharField(choices=[('MULTI', 'Multirotor'), ('FIXED', 'Fixed-wing'), ('HELI', 'Helicopter'), ('VTOL', 'VTOL / hybrid'), ('OTHER', 'Other')], help_text='Multirotor / fixed-wing / VTOL / heli, etc.', max_length=10, verbose_name='UAV configuration'),
+        ),
+    ]
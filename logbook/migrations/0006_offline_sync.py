@@ -0,0 +1,69 @@
+import uuid
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_uuids(apps, schema_editor):
+    FlightLogEntry = apps.get_model("logbook", "FlightLogEntry")
+    flights = FlightLogEntry.objects.using(schema_editor.connection.alias).only("pk").order_by("pk")
+    last = 0
+    # Batches by primary key: SQLite can't update a table it is still reading.
+    while batch := list(flights.filter(pk__gt=last)[:1000]):
+        for entry in batch:
+            entry.uuid = uuid.uuid4()
+            entry.version_vector = {"server": 1}
+        flights.bulk_update(batch, ["uuid", "version_vector"])
+        last = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logbook', '0005_merkle_integrity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flightlogentry',
+            name='uuid',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='flightlogentry',
+            name='version_vector',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='flightlogentry',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_uuids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='flightlogentry',
+            name='uuid',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='flightlogentry',
+            index=models.Index(fields=['user', 'updated_at'], name='logbook_flight_sync_idx'),
+        ),
+        migrations.CreateModel(
+            name='FlightTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField(unique=True)),
+                ('version_vector', models.JSONField(blank=True, default=dict)),
+                ('deleted_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flight_tombstones', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'deleted_at'], name='logbook_tombstone_sync_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def number_existing_changes(apps, schema_editor):
+    ChangeCounter = apps.get_model("logbook", "ChangeCounter")
+    FlightLogEntry = apps.get_model("logbook", "FlightLogEntry")
+    FlightTombstone = apps.get_model("logbook", "FlightTombstone")
+    db = schema_editor.connection.alias
+
+    seq = 0
+    for model, order in (
+        (FlightLogEntry, ("updated_at", "pk")),
+        (FlightTombstone, ("deleted_at", "pk")),
+    ):
+        for pk in model.objects.using(db).order_by(*order).values_list("pk", flat=True).iterator():
+            seq += 1
+            model.objects.using(db).filter(pk=pk).update(change_seq=seq)
+    ChangeCounter.objects.using(db).create(pk=1, value=seq)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logbook', '0006_offline_sync'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='flightlogentry',
+            name='logbook_flight_sync_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='flighttombstone',
+            name='logbook_tombstone_sync_idx',
+        ),
+        migrations.AddField(
+            model_name='flightlogentry',
+            name='change_seq',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='flighttombstone',
+            name='change_seq',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(number_existing_changes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='flightlogentry',
+            index=models.Index(fields=['change_seq'], name='logbook_flight_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flightlogentry',
+            index=models.Index(fields=['user', 'change_seq'], name='logbook_flight_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flighttombstone',
+            index=models.Index(fields=['change_seq'], name='logbook_tombstone_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flighttombstone',
+            index=models.Index(fields=['user', 'change_seq'], name='logbook_tombstone_sync_idx'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logbook', '0007_change_feed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedFlight',
+            fields=[
+                ('date', models.DateField()),
+                ('departure', models.CharField(max_length=100, verbose_name='Departure location')),
+                ('arrival', models.CharField(max_length=100, verbose_name='Arrival location')),
+                ('off_block', models.TimeField(blank=True, null=True, verbose_name='Departure time')),
+                ('on_block', models.TimeField(blank=True, null=True, verbose_name='Arrival time')),
+                ('uav_type', models.CharField(choices=[('MULTI', 'Multirotor'), ('FIXED', 'Fixed-wing'), ('HELI', 'Helicopter'), ('VTOL', 'VTOL / hybrid'), ('OTHER', 'Other')], help_text='Multirotor / fixed-wing / VTOL / heli, etc.', max_length=10, verbose_name='UAV configuration')),
+                ('uav_model', models.CharField(blank=True, help_text='e.g. fixed-wing piston trainer, Mavic 3 Pro', max_length=100, verbose_name='UAV model')),
+                ('uav_reg', models.CharField(help_text='Aircraft registration / ID', max_length=50, verbose_name='UAV registration')),
+                ('gcs_type', models.CharField(blank=True, choices=[('HANDHELD', 'Handheld controller'), ('TABLET', 'Tablet controller'), ('RUGGED', 'Rugged tablet GCS'), ('LAPTOP', 'Laptop GCS'), ('BRIEFCASE', 'Portable briefcase GCS'), ('VEHICLE', 'Vehicle-mounted GCS'), ('FIXED', 'Fixed installation GCS'), ('FPV', 'FPV controller + goggles'), ('OTHER', 'Other')], help_text='Handheld, laptop GCS, vehicle, etc.', max_length=15, verbose_name='GCS form factor')),
+                ('gcs_reg', models.CharField(blank=True, max_length=50, verbose_name='GCS registration / ID')),
+                ('uav_easa_class', models.CharField(blank=True, choices=[('C0', 'C0 (<250g)'), ('C1', 'C1 (<900g)'), ('C2', 'C2 (<4kg)'), ('C3', 'C3 (<25kg)'), ('C4', 'C4 (<25kg, no automation)'), ('C5', 'C5 (STS-01)'), ('C6', 'C6 (STS-02)')], max_length=3, verbose_name='EASA class')),
+                ('mission_type', models.CharField(blank=True, choices=[('MAP', 'Mapping / Survey'), ('INSP', 'Inspection'), ('SAR', 'Search & Rescue'), ('TRN', 'Training flight'), ('REC', 'Recreational'), ('ISR', 'ISR / Surveillance'), ('CRG', 'Cargo / logistics'), ('EXP', 'Experimental mission')], max_length=4, verbose_name='Mission type')),
+                ('gcs_software', models.CharField(blank=True, help_text='e.g. Embention, DJI Fly, QGroundControl…', max_length=50, verbose_name='GCS software')),
+                ('pilot_role', models.CharField(choices=[('PIC', 'Pilot in Command'), ('COP', 'Co-pilot'), ('OBS', 'Observer / VO'), ('STU', 'Student / Trainee'), ('INS', 'Instructor'), ('EXM', 'Examiner'), ('OTH', 'Other')], default='PIC', max_length=3, verbose_name='Pilot role')),
+                ('takeoff_day', models.PositiveIntegerField(default=0, verbose_name='Takeoffs (day)')),
+                ('takeoff_night', models.PositiveIntegerField(default=0, verbose_name='Takeoffs (night)')),
+                ('landing_day', models.PositiveIntegerField(default=0, verbose_name='Landings (day)')),
+                ('landing_night', models.PositiveIntegerField(default=0, verbose_name='Landings (night)')),
+                ('flight_time', models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Flight time (min)')),
+                ('is_simulator', models.BooleanField(default=False, verbose_name='Simulator session')),
+                ('simulator_type', models.CharField(blank=True, max_length=100, verbose_name='Simulator type')),
+                ('simulator_time', models.PositiveIntegerField(blank=True, null=True, verbose_name='Simulator time (min)')),
+                ('remarks', models.TextField(blank=True, verbose_name='Remarks / skill tests / checks')),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('uuid', models.UUIDField(editable=False, unique=True)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_flights', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-date', '-created_at'],
+                'indexes': [models.Index(fields=['user', 'date'], name='logbook_archive_date_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedTotals',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('flights', models.PositiveIntegerField(default=0)),
+                ('flight_time', models.PositiveBigIntegerField(default=0)),
+                ('takeoff_day', models.PositiveIntegerField(default=0)),
+                ('takeoff_night', models.PositiveIntegerField(default=0)),
+                ('landing_day', models.PositiveIntegerField(default=0)),
+                ('landing_night', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_totals', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['user', 'month'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'month'), name='logbook_archived_totals_unique')],
+            },
+        ),
+    ]
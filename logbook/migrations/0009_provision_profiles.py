@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def create_missing_profiles(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    PilotProfile = apps.get_model("logbook", "PilotProfile")
+    db = schema_editor.connection.alias
+    PilotProfile.objects.using(db).bulk_create(
+        PilotProfile(user_id=pk)
+        for pk in User.objects.using(db).filter(pilot_profile__isnull=True).values_list("pk", flat=True)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logbook', '0008_flight_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_profiles, migrations.RunPython.noop),
+    ]
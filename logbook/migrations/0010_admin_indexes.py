@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logbook', '0009_provision_profiles'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flightlogentry',
+            index=models.Index(fields=['date', 'created_at'], name='logbook_flight_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flightlogentry',
+            index=models.Index(fields=['uav_reg', 'date'], name='logbook_flight_reg_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flightlogentry',
+            index=models.Index(fields=['departure'], name='logbook_flight_dep_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flightlogentry',
+            index=models.Index(fields=['arrival'], name='logbook_flight_arr_idx'),
+        ),
+    ]
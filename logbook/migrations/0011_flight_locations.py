@@ -0,0 +1,149 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:21
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import DatabaseError, migrations, models, transaction
+
+# A frozen copy of the index DDL in logbook.spatial as of this migration,
+# so later changes to that module don't change what this migration does.
+# (logbook.spatial.install still runs after every migrate.)
+INDEXES = {
+    "logbook_flightlogentry": "logbook_flight_rtree",
+    "logbook_archivedflight": "logbook_archive_rtree",
+}
+# R*Tree entry ids: 2 * flight pk for the departure, + 1 for the arrival.
+ENTRIES = (("departure", 0), ("arrival", 1))
+
+
+def sqlite_inserts(rtree, table=None):
+    prefix = f"{table or 'NEW'}."
+    source = f" FROM {table}" if table else ""
+    return [
+        f"INSERT INTO {rtree} SELECT 2 * {prefix}id + {offset}, "
+        f"{prefix}{point}_lat, {prefix}{point}_lat, {prefix}{point}_lon, {prefix}{point}_lon{source} "
+        f"WHERE {prefix}{point}_lat IS NOT NULL AND {prefix}{point}_lon IS NOT NULL"
+        for point, offset in ENTRIES
+    ]
+
+
+def sqlite_triggers(table, rtree):
+    forget = f"DELETE FROM {rtree} WHERE id IN (2 * OLD.id, 2 * OLD.id + 1)"
+    insert = "; ".join(sqlite_inserts(rtree))
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {rtree}_insert AFTER INSERT ON {table} BEGIN "
+        f"{insert}; END",
+        f"CREATE TRIGGER IF NOT EXISTS {rtree}_update "
+        f"AFTER UPDATE OF departure_lat, departure_lon, arrival_lat, arrival_lon ON {table} BEGIN "
+        f"{forget}; {insert}; END",
+        f"CREATE TRIGGER IF NOT EXISTS {rtree}_delete AFTER DELETE ON {table} BEGIN "
+        f"{forget}; END",
+    ]
+
+
+def install_spatial_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        tables = set(connection.introspection.table_names(cursor))
+        for table, rtree in INDEXES.items():
+            if connection.vendor == "sqlite":
+                if rtree not in tables:
+                    try:
+                        with transaction.atomic(using=connection.alias):
+                            cursor.execute(
+                                f"CREATE VIRTUAL TABLE {rtree} "
+                                f"USING rtree(id, min_lat, max_lat, min_lon, max_lon)"
+                            )
+                    except DatabaseError:
+                        continue  # SQLite built without R*Tree: unindexed queries
+                    for statement in sqlite_inserts(rtree, table):
+                        cursor.execute(statement)
+                for statement in sqlite_triggers(table, rtree):
+                    cursor.execute(statement)
+            elif connection.vendor == "postgresql":
+                for point, _ in ENTRIES:
+                    cursor.execute(
+                        f"CREATE INDEX IF NOT EXISTS {table}_{point[:3]}_geo_idx "
+                        f"ON {table} USING gist ((point({point}_lon, {point}_lat)))"
+                    )
+
+
+def uninstall_spatial_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        for table, rtree in INDEXES.items():
+            if connection.vendor == "sqlite":
+                for suffix in ("insert", "update", "delete"):
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {rtree}_{suffix}")
+                cursor.execute(f"DROP TABLE IF EXISTS {rtree}")
+            elif connection.vendor == "postgresql":
+                for point, _ in ENTRIES:
+                    cursor.execute(f"DROP INDEX IF EXISTS {table}_{point[:3]}_geo_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logbook', '0010_admin_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedflight',
+            name='arrival_lat',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)], verbose_name='Arrival latitude'),
+        ),
+        migrations.AddField(
+            model_name='archivedflight',
+            name='arrival_lon',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)], verbose_name='Arrival longitude'),
+        ),
+        migrations.AddField(
+            model_name='archivedflight',
+            name='departure_lat',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)], verbose_name='Departure latitude'),
+        ),
+        migrations.AddField(
+            model_name='archivedflight',
+            name='departure_lon',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)], verbose_name='Departure longitude'),
+        ),
+        migrations.AddField(
+            model_name='flightlogentry',
+            name='arrival_lat',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)], verbose_name='Arrival latitude'),
+        ),
+        migrations.AddField(
+            model_name='flightlogentry',
+            name='arrival_lon',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)], verbose_name='Arrival longitude'),
+        ),
+        migrations.AddField(
+            model_name='flightlogentry',
+            name='departure_lat',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)], verbose_name='Departure latitude'),
+        ),
+        migrations.AddField(
+            model_name='flightlogentry',
+            name='departure_lon',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)], verbose_name='Departure longitude'),
+        ),
+        migrations.CreateModel(
+            name='FlightCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.PositiveSmallIntegerField()),
+                ('x', models.PositiveIntegerField()),
+                ('y', models.PositiveIntegerField()),
+                ('flights', models.PositiveIntegerField(default=0)),
+                ('lat_sum', models.FloatField(default=0)),
+                ('lon_sum', models.FloatField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flight_cells', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'level', 'x', 'y'), name='logbook_flight_cell_unique')],
+            },
+        ),
+        migrations.RunPython(install_spatial_index, uninstall_spatial_index),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logbook', '0011_flight_locations'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pilotprofile',
+            name='flight_crew_license_expires',
+            field=models.DateField(blank=True, null=True, verbose_name='Flight crew licence expires'),
+        ),
+        migrations.AddField(
+            model_name='pilotprofile',
+            name='medical_certificate_expires',
+            field=models.DateField(blank=True, null=True, verbose_name='Medical certificate expires'),
+        ),
+        migrations.CreateModel(
+            name='PilotStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('evaluated_on', models.DateField()),
+                ('recent_minutes', models.PositiveIntegerField(default=0)),
+                ('recent_takeoffs', models.PositiveIntegerField(default=0)),
+                ('recent_landings', models.PositiveIntegerField(default=0)),
+                ('current_until', models.DateField(blank=True, null=True)),
+                ('next_due', models.DateField(blank=True, null=True)),
+                ('next_due_item', models.CharField(blank=True, choices=[('RECENCY', 'Recency'), ('MEDICAL', 'Medical certificate'), ('LICENSE', 'Flight crew licence')], max_length=7)),
+                ('lapsed', models.BooleanField(default=False)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='pilot_status', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'pilot statuses',
+                'ordering': ['next_due'],
+                'indexes': [models.Index(fields=['next_due'], name='logbook_status_due_idx')],
+            },
+        ),
+    ]
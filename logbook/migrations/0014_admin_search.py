@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:02
+
+from django.conf import settings
+from django.db import DatabaseError, migrations, models, transaction
+
+# A frozen copy of the full-text index DDL in logbook.search as of this
+# migration. (logbook.search.install still runs after every migrate.)
+TABLE = "logbook_flightlogentry"
+FTS = "logbook_flight_fts"
+
+
+def sqlite_triggers():
+    forget = f"INSERT INTO {FTS}({FTS}, rowid, remarks) VALUES ('delete', OLD.id, OLD.remarks)"
+    insert = f"INSERT INTO {FTS}(rowid, remarks) VALUES (NEW.id, NEW.remarks)"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {FTS}_insert AFTER INSERT ON {TABLE} BEGIN "
+        f"{insert}; END",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS}_update AFTER UPDATE OF remarks ON {TABLE} BEGIN "
+        f"{forget}; {insert}; END",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS}_delete AFTER DELETE ON {TABLE} BEGIN "
+        f"{forget}; END",
+    ]
+
+
+def install_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            if FTS not in connection.introspection.table_names(cursor):
+                try:
+                    with transaction.atomic(using=connection.alias):
+                        cursor.execute(
+                            f"CREATE VIRTUAL TABLE {FTS} USING fts5("
+                            f"remarks, content='{TABLE}', content_rowid='id')"
+                        )
+                except DatabaseError:
+                    return  # SQLite built without FTS5: unindexed search
+                cursor.execute(f"INSERT INTO {FTS}({FTS}) VALUES ('rebuild')")
+            for statement in sqlite_triggers():
+                cursor.execute(statement)
+        elif connection.vendor == "postgresql":
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {FTS}_idx ON {TABLE} "
+                f"USING gin ((to_tsvector('simple', remarks)))"
+            )
+
+
+def uninstall_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            for suffix in ("insert", "update", "delete"):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {FTS}_{suffix}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS}")
+        elif connection.vendor == "postgresql":
+            cursor.execute(f"DROP INDEX IF EXISTS {FTS}_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logbook', '0013_cache_table'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flightlogentry',
+            index=models.Index(fields=['uav_model'], name='logbook_flight_model_idx'),
+        ),
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logbook', '0014_admin_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flightlogentry',
+            index=models.Index(fields=['user', 'date'], name='logbook_flight_user_date_idx'),
+        ),
+    ]
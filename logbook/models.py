@@ -1,7 +1,11 @@
 from datetime import datetime
+from uuid import uuid4
 
 from django.conf import settings
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models, transaction
+from django.db.models import F
 
 
 class PilotProfile(models.Model):
@@ -42,6 +46,18 @@ class PilotProfile(models.Model):
         null=True,
     )
 
+    medical_certificate_expires = models.DateField(
+        "Medical certificate expires",
+        blank=True,
+        null=True,
+    )
+
+    flight_crew_license_expires = models.DateField(
+        "Flight crew licence expires",
+        blank=True,
+        null=True,
+    )
+
     time_display_unit = models.CharField(
         "Time display unit",
         max_length=3,
@@ -54,7 +70,78 @@ class PilotProfile(models.Model):
     def __str__(self):
         return f"Profile for {self.user}"
 
-class FlightLogEntry(models.Model):
+
+class PilotStatus(models.Model):
+    """
+    A pilot's currency and document validity as of the last evaluation
+    (logbook.currency.evaluate: the daily batch run, or the pilot's own
+    flight and profile changes), so "who is about to lapse" never has to
+    be worked out per request.
+    """
+    class Item(models.TextChoices):
+        RECENCY = "RECENCY", "Recency"
+        MEDICAL = "MEDICAL", "Medical certificate"
+        LICENSE = "LICENSE", "Flight crew licence"
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="pilot_status",
+    )
+    evaluated_on = models.DateField()
+    # Within the currency window, simulator sessions not counted.
+    recent_minutes = models.PositiveIntegerField(default=0)
+    recent_takeoffs = models.PositiveIntegerField(default=0)
+    recent_landings = models.PositiveIntegerField(default=0)
+    # Last day the pilot is current on recent takeoffs and landings (None: not current).
+    current_until = models.DateField(null=True, blank=True)
+    # The earliest of current_until and the document expiry dates.
+    next_due = models.DateField(null=True, blank=True)
+    next_due_item = models.CharField(max_length=7, choices=Item.choices, blank=True)
+    lapsed = models.BooleanField(default=False)
+
+    class Meta:
+        verbose_name_plural = "pilot statuses"
+        ordering = ["next_due"]
+        indexes = [
+            models.Index(fields=["next_due"], name="logbook_status_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user}: next due {self.next_due or '-'}"
+
+class ChangeCounter(models.Model):
+    """
+    Single-row, global change sequence. Every insert, update and delete
+    of a flight takes the next value inside its own transaction; the row
+    lock is held until commit, so sequence numbers become visible in
+    order and `?since=<seq>` readers never skip a change.
+    """
+    value = models.PositiveBigIntegerField(default=0)
+
+    @classmethod
+    def next_value(cls):
+        return cls.next_values(1)[0]
+
+    @classmethod
+    def next_values(cls, count):
+        """`count` consecutive values, e.g. for a batch of inserts."""
+        # Update first so the row lock is taken before the read.
+        if not cls.objects.filter(pk=1).update(value=F("value") + count):
+            cls.objects.get_or_create(pk=1)
+            cls.objects.filter(pk=1).update(value=F("value") + count)
+        last = cls.objects.values_list("value", flat=True).get(pk=1)
+        return range(last - count + 1, last + 1)
+
+    @classmethod
+    def current_value(cls):
+        return cls.objects.filter(pk=1).values_list("value", flat=True).first() or 0
+
+
+class FlightRecord(models.Model):
+    """
+    Fields shared by live logbook entries and archived flights.
+    """
     class PilotRole(models.TextChoices):
         PIC = "PIC", "Pilot in Command"
         COPILOT = "COP", "Co-pilot"
@@ -101,12 +188,6 @@ class FlightLogEntry(models.Model):
         FPV = "FPV", "FPV controller + goggles"
         OTHER = "OTHER", "Other"
 
-    user = models.ForeignKey(
-        settings.AUTH_USER_MODEL,
-        on_delete=models.CASCADE,
-        related_name="uas_flights",
-    )
-
     # ---- Flight identification ----
     date = models.DateField()
     departure = models.CharField("Departure location", max_length=100)
@@ -116,6 +197,24 @@ class FlightLogEntry(models.Model):
     off_block = models.TimeField("Departure time", blank=True, null=True)
     on_block = models.TimeField("Arrival time", blank=True, null=True)
 
+    # ---- Coordinates (WGS84 degrees, optional; see logbook.spatial) ----
+    departure_lat = models.FloatField(
+        "Departure latitude", blank=True, null=True,
+        validators=[MinValueValidator(-90), MaxValueValidator(90)],
+    )
+    departure_lon = models.FloatField(
+        "Departure longitude", blank=True, null=True,
+        validators=[MinValueValidator(-180), MaxValueValidator(180)],
+    )
+    arrival_lat = models.FloatField(
+        "Arrival latitude", blank=True, null=True,
+        validators=[MinValueValidator(-90), MaxValueValidator(90)],
+    )
+    arrival_lon = models.FloatField(
+        "Arrival longitude", blank=True, null=True,
+        validators=[MinValueValidator(-180), MaxValueValidator(180)],
+    )
+
     # ---- Aircraft / GCS ----
     uav_type = models.CharField(
         "UAV configuration",
@@ -203,25 +302,63 @@ class FlightLogEntry(models.Model):
         blank=True,
     )
 
-    created_at = models.DateTimeField(auto_now_add=True)
-
     class Meta:
-        ordering = ["-date", "-created_at"]
+        abstract = True
 
     def __str__(self):
         return f"{self.date} {self.uav_type} {self.uav_reg} ({self.user})"
 
+    def clean(self):
+        super().clean()
+        for point in ("departure", "arrival"):
+            lat, lon = f"{point}_lat", f"{point}_lon"
+            if (getattr(self, lat) is None) != (getattr(self, lon) is None):
+                raise ValidationError(f"Give both the {point} latitude and longitude, or neither.")
+
+
+class FlightLogEntry(FlightRecord):
+    # Replica id the server uses in version vectors (see logbook.sync).
+    SERVER_REPLICA = "server"
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="uas_flights",
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # ---- Offline sync ----
+    uuid = models.UUIDField(default=uuid4, unique=True, editable=False)
+    version_vector = models.JSONField(default=dict, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # ---- Change feed ----
+    change_seq = models.PositiveBigIntegerField(default=0, editable=False)
+
+    class Meta:
+        ordering = ["-date", "-created_at"]
+        indexes = [
+            models.Index(fields=["change_seq"], name="logbook_flight_seq_idx"),
+            # A pilot's recent flights (currency.evaluate on every save).
+            models.Index(fields=["user", "date"], name="logbook_flight_user_date_idx"),
+            models.Index(fields=["user", "change_seq"], name="logbook_flight_sync_idx"),
+            # Admin: date drill-down/ordering and prefix search.
+            models.Index(fields=["date", "created_at"], name="logbook_flight_date_idx"),
+            models.Index(fields=["uav_reg", "date"], name="logbook_flight_reg_idx"),
+            models.Index(fields=["uav_model"], name="logbook_flight_model_idx"),
+            models.Index(fields=["departure"], name="logbook_flight_dep_idx"),
+            models.Index(fields=["arrival"], name="logbook_flight_arr_idx"),
+        ]
+
     # ---- Helpers for time calculations ----
     def _combine(self, t):
         if not t or not self.date:
             return None
         return datetime.combine(self.date, t)
 
-    def save(self, *args, **kwargs):
-        """
-        Auto-calc flight time from departure & arrival
-        (off_block / on_block) in minutes.
-        """
+    def calculate_flight_time(self):
+        """Flight time in minutes from off_block to on_block."""
         start = self._combine(self.off_block)
         end = self._combine(self.on_block)
 
@@ -231,4 +368,195 @@ class FlightLogEntry(models.Model):
         else:
             self.flight_time = None
 
-        super().save(*args, **kwargs)
+    def bump_server_version(self):
+        """Count an edit made on the server in the version vector."""
+        vector = dict(self.version_vector or {})
+        vector[self.SERVER_REPLICA] = vector.get(self.SERVER_REPLICA, 0) + 1
+        self.version_vector = vector
+
+    def save(self, *args, bump_version=True, **kwargs):
+        """
+        Auto-calc flight time from departure & arrival
+        (off_block / on_block) in minutes.
+
+        Edits made on the server bump the server's version vector entry;
+        the sync API passes bump_version=False because it stores the
+        client's (already bumped) vector itself.
+        """
+        self.calculate_flight_time()
+        if bump_version:
+            self.bump_server_version()
+
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {*kwargs["update_fields"], "change_seq"} | (
+                {"version_vector"} if bump_version else set()
+            )
+
+        # Keep the row, its change sequence and its integrity-tree update
+        # (post_save) in one transaction.
+        with transaction.atomic():
+            self.change_seq = ChangeCounter.next_value()
+            super().save(*args, **kwargs)
+
+
+class ArchivedFlight(FlightRecord):
+    """
+    Cold storage for flights older than the archive horizon
+    (see logbook.archive). Rows keep the primary key, UUID and creation
+    time of the original entry, so integrity proofs and exports still
+    refer to the same flight.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="archived_flights",
+    )
+    uuid = models.UUIDField(unique=True, editable=False)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-date", "-created_at"]
+        indexes = [
+            models.Index(fields=["user", "date"], name="logbook_archive_date_idx"),
+        ]
+
+
+class ArchivedTotals(models.Model):
+    """
+    Per-pilot, per-month totals of archived flights, so all-time stats
+    never have to scan the archive.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="archived_totals",
+    )
+    month = models.DateField()
+    flights = models.PositiveIntegerField(default=0)
+    flight_time = models.PositiveBigIntegerField(default=0)
+    takeoff_day = models.PositiveIntegerField(default=0)
+    takeoff_night = models.PositiveIntegerField(default=0)
+    landing_day = models.PositiveIntegerField(default=0)
+    landing_night = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["user", "month"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "month"], name="logbook_archived_totals_unique"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.month:%Y-%m}: {self.flights} flights"
+
+
+class FlightCell(models.Model):
+    """
+    Flights per map cell (Web Mercator tile `x`, `y` at zoom `level`),
+    with coordinate sums for the cluster centre, so map tiles never read
+    flight rows (see logbook.spatial).
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="flight_cells",
+    )
+    level = models.PositiveSmallIntegerField()
+    x = models.PositiveIntegerField()
+    y = models.PositiveIntegerField()
+    flights = models.PositiveIntegerField(default=0)
+    lat_sum = models.FloatField(default=0)
+    lon_sum = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "level", "x", "y"], name="logbook_flight_cell_unique"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.level}/{self.x}/{self.y}: {self.flights} flights"
+
+
+class FlightTombstone(models.Model):
+    """
+    Remembers deleted flights so offline clients learn about the delete
+    on their next sync.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="flight_tombstones",
+    )
+    uuid = models.UUIDField(unique=True)
+    version_vector = models.JSONField(default=dict, blank=True)
+    deleted_at = models.DateTimeField(auto_now=True)
+    change_seq = models.PositiveBigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["change_seq"], name="logbook_tombstone_seq_idx"),
+            models.Index(fields=["user", "change_seq"], name="logbook_tombstone_sync_idx"),
+        ]
+
+    def __str__(self):
+        return f"Deleted flight {self.uuid}"
+
+    def save(self, *args, **kwargs):
+        if kwargs.get("update_fields") is not None:
+            # update_or_create() saves only the changed fields.
+            kwargs["update_fields"] = {*kwargs["update_fields"], "change_seq"}
+        with transaction.atomic():
+            self.change_seq = ChangeCounter.next_value()
+            super().save(*args, **kwargs)
+
+
+class MerkleTree(models.Model):
+    """
+    Head of a pilot's logbook Merkle tree (see logbook.merkle).
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="merkle_tree",
+    )
+    size = models.PositiveBigIntegerField(default=0)
+    root = models.CharField(max_length=64, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Merkle root for {self.user}: {self.root or '(empty)'}"
+
+
+class MerkleNode(models.Model):
+    """
+    One node of a pilot's Merkle tree. Level 0 holds the flight leaves;
+    `flight_pk` is a plain integer so tombstones outlive the flight.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="merkle_nodes",
+    )
+    level = models.PositiveSmallIntegerField()
+    position = models.PositiveBigIntegerField()
+    digest = models.CharField(max_length=64)
+    flight_pk = models.PositiveBigIntegerField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "level", "position"],
+                name="logbook_merkle_node_unique",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["user", "flight_pk"], name="logbook_merkle_flight_idx"),
+        ]
+
+    def __str__(self):
+        return f"L{self.level}#{self.position} {self.digest[:12]}"
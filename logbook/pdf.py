@@ -0,0 +1,271 @@
+"""
+Paper-style logbook PDF.
+
+One pass over a pilot's flights (archive first, then live, oldest
+first) cuts them into fixed-size pages and keeps the running totals, so
+every page carries its own totals, the totals brought forward and the
+total to date, like a paper logbook. Pages are drawn and compressed by
+a process pool and written out in order as they come back, with only
+a few pages in flight at a time: memory stays bounded however long the
+logbook is.
+
+The PDF is written by hand (PDF 1.4, the standard Helvetica fonts, no
+embedded resources), so there is no dependency. The drawing half of
+this module avoids Django imports so pool workers don't need Django.
+"""
+import zlib
+from collections import deque
+
+PAGE_WIDTH, PAGE_HEIGHT = 842, 595  # A4 landscape, in points
+MARGIN = 30
+ROWS_PER_PAGE = 25
+ROW_HEIGHT = 15
+FONT_SIZE = 7.5
+
+# Pages rendered in-process below this; starting workers costs more.
+PARALLEL_MIN_PAGES = 20
+PAGES_IN_FLIGHT_PER_WORKER = 4
+
+# (title, width, right-aligned)
+COLUMNS = (
+    ("Date", 52, False),
+    ("Departure", 86, False),
+    ("Arrival", 86, False),
+    ("Off", 30, False),
+    ("On", 30, False),
+    ("UAV", 80, False),
+    ("Registration", 62, False),
+    ("Role", 70, False),
+    ("Flight", 40, True),
+    ("TO D", 26, True),
+    ("TO N", 26, True),
+    ("LDG D", 28, True),
+    ("LDG N", 28, True),
+    ("Remarks", 138, False),
+)
+TOTALS = ("flight_time", "takeoff_day", "takeoff_night", "landing_day", "landing_night")
+
+# Object numbers: pages tree, fonts and info first, then (page, content) pairs.
+CATALOG, PAGES, FONT, FONT_BOLD, INFO, FIRST_PAGE = 1, 2, 3, 4, 5, 6
+
+
+# ---- Drawing (runs in the workers) ----
+
+def _text(value):
+    """A PDF string literal in WinAnsi (Latin-1-ish) encoding."""
+    raw = str(value).encode("cp1252", "replace")
+    return b"(" + raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def _fit(value, width, size=FONT_SIZE):
+    # Helvetica averages about half an em per character.
+    limit = max(int(width / (size * 0.5)) - 1, 1)
+    value = str(value)
+    return value if len(value) <= limit else value[:limit - 1] + "…"
+
+
+def _duration(minutes, hhmm):
+    if hhmm:
+        return f"{minutes // 60}:{minutes % 60:02d}"
+    return str(minutes)
+
+
+def render_page(spec):
+    """Compressed content stream for one page spec (see page_specs)."""
+    out = []
+
+    def text(x, y, value, bold=False, size=FONT_SIZE, right=False):
+        if right:
+            x -= len(str(value)) * size * 0.556
+        font = b"/F2" if bold else b"/F1"
+        out.append(b"BT %s %.1f Tf %.1f %.1f Td %s Tj ET" % (font, size, x, y, _text(value)))
+
+    def rule(y, weight=0.4):
+        out.append(b"%.1f w %d %.1f m %d %.1f l S" % (weight, MARGIN, y, PAGE_WIDTH - MARGIN, y))
+
+    def cells(y, values, bold=False):
+        x = MARGIN
+        for (_, width, right), value in zip(COLUMNS, values):
+            if right:
+                text(x + width - 3, y, value, bold, right=True)
+            else:
+                text(x + 2, y, _fit(value, width - 4), bold)
+            x += width
+
+    hhmm = spec["hhmm"]
+    top = PAGE_HEIGHT - MARGIN
+    text(MARGIN, top - 12, spec["title"], bold=True, size=13)
+    text(MARGIN, top - 26, spec["subtitle"], size=8.5)
+    text(
+        PAGE_WIDTH - MARGIN, top - 12,
+        f"Page {spec['number']} of {spec['pages']}", bold=True, size=9, right=True,
+    )
+
+    y = top - 52
+    out.append(b"0.88 g %d %.1f %d %d re f 0 g" % (
+        MARGIN, y - 4, PAGE_WIDTH - 2 * MARGIN, ROW_HEIGHT,
+    ))
+    cells(y, [title for title, _, _ in COLUMNS], bold=True)
+    rule(y - 4, 0.8)
+
+    for row in spec["rows"]:
+        y -= ROW_HEIGHT
+        values = list(row)
+        values[8] = _duration(values[8] or 0, hhmm)
+        cells(y, values)
+        rule(y - 4, 0.2)
+    if not spec["rows"]:
+        y -= ROW_HEIGHT
+        text(MARGIN + 2, y, "No flights logged.")
+
+    y = MARGIN + 3 * ROW_HEIGHT + 4
+    rule(y + ROW_HEIGHT - 4, 0.8)
+    for label, totals in (
+        ("Totals this page", spec["page_totals"]),
+        ("Brought forward", spec["brought_forward"]),
+        ("Total to date", spec["to_date"]),
+    ):
+        bold = label == "Total to date"
+        text(MARGIN + 2, y, label, bold)  # spans the empty leading columns
+        cells(y, [""] * 8 + [_duration(totals[0], hhmm)] + list(totals[1:]) + [""], bold)
+        y -= ROW_HEIGHT
+
+    return zlib.compress(b"\n".join(out))
+
+
+# ---- Paging (one pass in the calling process) ----
+
+def page_specs(flights, pages, title, subtitle, hhmm=False):
+    """
+    Cut `flights` (oldest first) into page specs with page, brought
+    forward and to-date totals. `pages` is the expected page count,
+    used for "Page n of m".
+    """
+    to_date = [0] * len(TOTALS)
+
+    def spec(number, rows, page_totals):
+        brought = list(to_date)
+        for i, value in enumerate(page_totals):
+            to_date[i] += value
+        return {
+            "number": number, "pages": pages, "title": title, "subtitle": subtitle,
+            "hhmm": hhmm, "rows": rows, "page_totals": page_totals,
+            "brought_forward": brought, "to_date": list(to_date),
+        }
+
+    number, rows, page_totals = 1, [], [0] * len(TOTALS)
+    for f in flights:
+        rows.append((
+            f.date.isoformat(),
+            f.departure,
+            f.arrival,
+            f.off_block.strftime("%H:%M") if f.off_block else "",
+            f.on_block.strftime("%H:%M") if f.on_block else "",
+            " ".join(filter(None, (f.get_uav_type_display(), f.uav_model))),
+            f.uav_reg,
+            f.get_pilot_role_display(),
+            f.flight_time or 0,
+            f.takeoff_day,
+            f.takeoff_night,
+            f.landing_day,
+            f.landing_night,
+            " ".join(f.remarks.split()),
+        ))
+        for i, name in enumerate(TOTALS):
+            page_totals[i] += getattr(f, name) or 0
+        if len(rows) == ROWS_PER_PAGE:
+            yield spec(number, rows, page_totals)
+            number, rows, page_totals = number + 1, [], [0] * len(TOTALS)
+    if rows or number == 1:
+        yield spec(number, rows, page_totals)
+
+
+def _rendered(specs, workers):
+    """render_page() over `specs` in order, a bounded number at a time."""
+    if workers <= 1:
+        yield from map(render_page, specs)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for spec in specs:
+            pending.append(pool.submit(render_page, spec))
+            if len(pending) >= workers * PAGES_IN_FLIGHT_PER_WORKER:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def write(specs, pages, title, workers=1):
+    """Yield the bytes of a PDF with one page per spec."""
+    offsets = {}
+    position = 0
+
+    def obj(number, body):
+        nonlocal position
+        offsets[number] = position
+        chunk = b"%d 0 obj\n%s\nendobj\n" % (number, body)
+        position += len(chunk)
+        return chunk
+
+    header = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+    position = len(header)
+    yield header
+    yield obj(CATALOG, b"<< /Type /Catalog /Pages %d 0 R >>" % PAGES)
+    for number, name in ((FONT, b"Helvetica"), (FONT_BOLD, b"Helvetica-Bold")):
+        yield obj(number, b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>" % name)
+    yield obj(INFO, b"<< /Title %s /Producer (UAS Logbook) >>" % _text(title))
+
+    if workers > 1 and pages < PARALLEL_MIN_PAGES:
+        workers = 1
+    kids = []
+    for content in _rendered(specs, workers):
+        page = FIRST_PAGE + 2 * len(kids)
+        kids.append(page)
+        yield obj(page, (
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d]"
+            b" /Resources << /Font << /F1 %d 0 R /F2 %d 0 R >> >> /Contents %d 0 R >>"
+        ) % (PAGES, PAGE_WIDTH, PAGE_HEIGHT, FONT, FONT_BOLD, page + 1))
+        yield obj(page + 1, b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream" % (
+            len(content), content,
+        ))
+
+    yield obj(PAGES, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids),
+    ))
+
+    size = max(offsets) + 1
+    xref = [b"xref\n0 %d\n0000000000 65535 f \n" % size]
+    xref += [b"%010d 00000 n \n" % offsets[n] for n in range(1, size)]
+    yield b"".join(xref)
+    yield b"trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        size, CATALOG, INFO, position,
+    )
+
+
+# ---- Entry point ----
+
+def default_workers():
+    import os
+
+    from django.conf import settings
+
+    return getattr(settings, "LOGBOOK_PDF_WORKERS", None) or os.cpu_count() or 1
+
+
+def logbook(user, profile=None, workers=None):
+    """Yield the bytes of `user`'s complete logbook as a PDF."""
+    from django.utils import timezone
+
+    from . import archive
+
+    count = user.uas_flights.count() + user.archived_flights.count()
+    pages = max((count + ROWS_PER_PAGE - 1) // ROWS_PER_PAGE, 1)
+    name = user.get_full_name() or user.get_username()
+    title = "UAS Pilot Logbook"
+    subtitle = f"{name} (@{user.get_username()}), {count} flights, generated {timezone.now():%Y-%m-%d %H:%M} UTC"
+    hhmm = bool(profile and profile.time_display_unit == "HMM")
+
+    specs = page_specs(archive.flights_between(user), pages, title, subtitle, hhmm)
+    return write(specs, pages, f"{title} – {name}", workers or default_workers())
@@ -0,0 +1,77 @@
+"""
+Request-scoped access to the logged-in pilot's profile.
+
+Profiles are created together with their user (see signals), so pages
+only ever need to read them. The profile is cached per user and the
+entry is dropped whenever the profile is saved or deleted; after
+warm-up a read-only page no longer queries the profile table.
+
+Invalidation has to reach every worker, so the cache must be shared
+between processes. Settings use the database cache by default (its
+table is created by a migration), where a warm lookup is one primary-key
+read of the cache table; with Memcached or Redis it needs no SQL at all.
+A cache that fails is skipped: the profile is then read from the
+database.
+"""
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from .models import PilotProfile
+
+CACHE_TIMEOUT = 60 * 60
+
+
+def cache_key(user_id):
+    return f"logbook:profile:{user_id}"
+
+
+def get_profile(user):
+    """The user's PilotProfile, from the cache when possible."""
+    if not user.is_authenticated:
+        return None
+    key = cache_key(user.pk)
+    profile = _cached(cache.get, key)
+    if profile is None:
+        profile = PilotProfile.objects.filter(user=user).first()
+        if profile is None:
+            # Users created before profiles were provisioned on signup.
+            profile, _ = PilotProfile.objects.get_or_create(user=user)
+        _cached(cache.set, key, profile, CACHE_TIMEOUT)
+    return profile
+
+
+def _cached(operation, *args):
+    """Run a cache operation; None if the cache is unavailable."""
+    try:
+        return operation(*args)
+    except Exception:  # whatever the backend raises: fall back to the database
+        return None
+
+
+def profile_for_edit(request):
+    """
+    The profile for a settings form: the cached copy to display it, the
+    current row when a POST is about to save it back.
+    """
+    if request.method == "POST":
+        get_profile(request.user)  # make sure it exists
+        return PilotProfile.objects.get(user=request.user)
+    return request.pilot_profile
+
+
+def invalidate(user_id):
+    _cached(cache.delete, cache_key(user_id))
+
+
+class PilotProfileMiddleware:
+    """
+    Attach `request.pilot_profile`, loaded lazily on first access. Must
+    come after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.pilot_profile = SimpleLazyObject(lambda: get_profile(request.user))
+        return self.get_response(request)
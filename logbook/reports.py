@@ -0,0 +1,196 @@
+"""
+Pivot reports over the FlightLogEntry choice dimensions.
+
+A pivot is computed from a single grouped query over the requested row
+and column dimensions; row/column subtotals and the grand total are
+folded from that result in Python, so adding subtotals costs no extra
+queries. Results are cached per user and dataset version (the global
+change sequence), which makes repeated report views free until a
+flight changes.
+"""
+import hashlib
+import json
+from collections import defaultdict
+from itertools import chain
+
+from django.core.cache import cache
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth, TruncYear
+
+from .models import ChangeCounter, FlightLogEntry
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+DIMENSIONS = {
+    "month": TruncMonth("date"),
+    "year": TruncYear("date"),
+    "uav_class": F("uav_easa_class"),
+    "mission": F("mission_type"),
+    "role": F("pilot_role"),
+    "uav_type": F("uav_type"),
+    "simulator": F("is_simulator"),
+}
+
+METRICS = {
+    "flights": Count("pk"),
+    "minutes": Sum("flight_time", default=0),
+    "takeoffs": Sum(F("takeoff_day") + F("takeoff_night"), default=0),
+    "landings": Sum(F("landing_day") + F("landing_night"), default=0),
+}
+
+_CHOICES = {
+    "uav_class": dict(FlightLogEntry.EasaClass.choices),
+    "mission": dict(FlightLogEntry.MissionType.choices),
+    "role": dict(FlightLogEntry.PilotRole.choices),
+    "uav_type": dict(FlightLogEntry.UavConfig.choices),
+}
+
+
+class ReportError(ValueError):
+    pass
+
+
+def label(dimension, value):
+    if value in (None, ""):
+        return "(none)"
+    if dimension == "month":
+        return value.strftime("%Y-%m")
+    if dimension == "year":
+        return value.strftime("%Y")
+    if dimension == "simulator":
+        return "Simulator" if value else "Aircraft"
+    return _CHOICES.get(dimension, {}).get(value, value)
+
+
+def _check(rows, columns, metric):
+    if not rows:
+        raise ReportError("Pick at least one row dimension.")
+    dimensions = rows + columns
+    unknown = [d for d in dimensions if d not in DIMENSIONS]
+    if unknown:
+        raise ReportError(f"Unknown dimension(s): {', '.join(unknown)}.")
+    if len(set(dimensions)) != len(dimensions):
+        raise ReportError("Each dimension can only be used once.")
+    if metric not in METRICS:
+        raise ReportError(f"Unknown metric: {metric}.")
+
+
+def pivot(flights, rows, columns=(), metric="minutes"):
+    """
+    Pivot `flights` by `rows` x `columns` for one metric. `flights` may
+    also be a list of querysets (live and archived flights), which are
+    grouped separately and merged.
+
+    Returns a dict with the column keys, one line per row key (plus
+    subtotal lines for every prefix of a multi-dimension row key) and
+    column/grand totals. Keys are display labels, ready for output.
+    """
+    rows, columns = list(rows), list(columns)
+    _check(rows, columns, metric)
+    dims = rows + columns
+
+    if not isinstance(flights, (list, tuple)):
+        flights = [flights]
+    grouped = chain.from_iterable(
+        qs
+        .order_by()
+        .annotate(**{f"dim_{d}": DIMENSIONS[d] for d in dims})
+        .values(*(f"dim_{d}" for d in dims))
+        .annotate(value=METRICS[metric])
+        for qs in flights
+    )
+
+    cells = defaultdict(int)
+    column_keys = set()
+    for item in grouped:
+        row_key = tuple(item[f"dim_{d}"] for d in rows)
+        column_key = tuple(item[f"dim_{d}"] for d in columns)
+        cells[row_key, column_key] += item["value"] or 0
+        column_keys.add(column_key)
+
+    def sort_key(key):
+        return tuple((v is None, v if v is not None else "") for v in key)
+
+    column_keys = sorted(column_keys, key=sort_key)
+    row_keys = sorted({r for r, _ in cells}, key=sort_key)
+
+    lines = []
+    column_totals = defaultdict(int)
+    subtotals = [defaultdict(int) for _ in rows[:-1]]
+
+    def flush_subtotals(upto, previous):
+        # Emit subtotals for the prefix levels that just closed, innermost first.
+        for level in reversed(range(upto, len(subtotals))):
+            prefix = previous[:level + 1]
+            values = [subtotals[level][c] for c in column_keys]
+            lines.append({
+                "key": [label(d, v) for d, v in zip(rows, prefix)]
+                + ["Subtotal"] + [""] * (len(rows) - level - 2),
+                "cells": values,
+                "total": sum(values),
+                "subtotal": True,
+            })
+            subtotals[level].clear()
+
+    previous = None
+    for row_key in row_keys:
+        if previous is not None:
+            changed = next(i for i, (a, b) in enumerate(zip(previous, row_key)) if a != b)
+            flush_subtotals(changed, previous)
+        values = [cells.get((row_key, c), 0) for c in column_keys]
+        for c, v in zip(column_keys, values):
+            column_totals[c] += v
+            for level in range(len(subtotals)):
+                subtotals[level][c] += v
+        lines.append({
+            "key": [label(d, v) for d, v in zip(rows, row_key)],
+            "cells": values,
+            "total": sum(values),
+            "subtotal": False,
+        })
+        previous = row_key
+    if previous is not None:
+        flush_subtotals(0, previous)
+
+    totals = [column_totals[c] for c in column_keys]
+    return {
+        "rows": rows,
+        "columns": columns,
+        "metric": metric,
+        "column_keys": [[label(d, v) for d, v in zip(columns, c)] for c in column_keys],
+        "lines": lines,
+        "column_totals": totals,
+        "total": sum(totals),
+    }
+
+
+def cached_pivot(user, flights, rows, columns=(), metric="minutes", extra=()):
+    """
+    `pivot()` cached per user and dataset version. `extra` must describe
+    any filters already applied to `flights` (e.g. the date range).
+    """
+    params = json.dumps([list(rows), list(columns), metric, list(extra)])
+    key = "logbook:pivot:{}:{}:{}".format(
+        user.pk,
+        ChangeCounter.current_value(),
+        hashlib.md5(params.encode()).hexdigest(),
+    )
+    result = cache.get(key)
+    if result is None:
+        result = pivot(flights, rows, columns, metric)
+        cache.set(key, result, CACHE_TIMEOUT)
+    return result
+
+
+def csv_rows(result):
+    """Flatten a pivot result into CSV rows (header first)."""
+    header = list(result["rows"])
+    header += [" / ".join(key) or result["metric"] for key in result["column_keys"]]
+    header.append("Total")
+    yield header
+    for line in result["lines"]:
+        yield line["key"] + line["cells"] + [line["total"]]
+    yield (
+        ["Total"] + [""] * (len(result["rows"]) - 1)
+        + result["column_totals"] + [result["total"]]
+    )
@@ -0,0 +1,123 @@
+"""
+Read/write routing with optional read replicas.
+
+Writes and ordinary reads always use the `default` (primary) database.
+Heavy read paths - stats, audit, exports, reports, the change feed and
+admin changelists - opt in with @replica_reads (or `using_replica()`),
+which sends their reads to one of settings.LOGBOOK_READ_REPLICAS.
+
+After a user writes, ReplicaPinningMiddleware sets a short-lived cookie
+(LOGBOOK_REPLICA_STICKY_SECONDS); while it is present that user's reads
+stay on the primary, so they always see their own writes even if the
+replicas lag behind.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+PRIMARY = "default"
+PIN_COOKIE = "logbook_primary"
+
+_read_alias = ContextVar("logbook_read_alias", default=None)
+_pinned = ContextVar("logbook_pinned_to_primary", default=False)
+_writes = ContextVar("logbook_request_writes", default=None)
+
+
+def replicas():
+    return list(getattr(settings, "LOGBOOK_READ_REPLICAS", []))
+
+
+def choose_replica():
+    """A replica alias for this request, or None to stay on the primary."""
+    aliases = replicas()
+    if not aliases or _pinned.get():
+        return None
+    return random.choice(aliases)
+
+
+@contextmanager
+def using_replica():
+    token = _read_alias.set(choose_replica())
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def _stream_from(alias, content):
+    # Streaming bodies are consumed after the view has returned, so the
+    # routing decision has to travel with the iterator.
+    token = _read_alias.set(alias)
+    try:
+        yield from content
+    finally:
+        _read_alias.reset(token)
+
+
+def replica_reads(view):
+    """Run a read-only view (including a streamed body) against a replica."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        alias = choose_replica()
+        token = _read_alias.set(alias)
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+        if alias and getattr(response, "streaming", False):
+            response.streaming_content = _stream_from(alias, response.streaming_content)
+        return response
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == "django_cache":
+            # The database cache is shared state, not a report: a lagging
+            # replica would serve invalidated entries and miss fresh ones.
+            return PRIMARY
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        writes = _writes.get()
+        if writes is not None and model._meta.app_label == "logbook":
+            writes["logbook"] = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {PRIMARY, *replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary via replication.
+        return db not in replicas()
+
+
+class ReplicaPinningMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        writes = {}
+        pinned_token = _pinned.set(PIN_COOKIE in request.COOKIES)
+        writes_token = _writes.set(writes)
+        try:
+            response = self.get_response(request)
+        finally:
+            _writes.reset(writes_token)
+            _pinned.reset(pinned_token)
+
+        if writes and replicas():
+            response.set_cookie(
+                PIN_COOKIE,
+                "1",
+                max_age=getattr(settings, "LOGBOOK_REPLICA_STICKY_SECONDS", 15),
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -0,0 +1,138 @@
+"""
+Full-text search over flight remarks, for the admin.
+
+The index is kept by the database itself, like the spatial one, so
+rows written by bulk_create(), the archive mover or raw SQL are covered:
+
+- SQLite: an FTS5 table over the flight table's remarks (external
+  content, no second copy of the text), maintained by triggers.
+- PostgreSQL: a GIN index on the remarks' tsvector.
+- Other databases, or SQLite built without FTS5: no index; the search
+  is a plain substring filter.
+
+Every word of the search text must appear, as a word or word prefix.
+"""
+import re
+
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import FlightLogEntry
+
+INDEXES = {
+    FlightLogEntry: "logbook_flight_fts",
+}
+
+FIELD = "remarks"
+
+
+# ---- Index DDL (run after every migrate; migration 0014 has a frozen copy) ----
+
+def _sqlite_ddl(table, fts):
+    forget = f"INSERT INTO {fts}({fts}, rowid, {FIELD}) VALUES ('delete', OLD.id, OLD.{FIELD})"
+    insert = f"INSERT INTO {fts}(rowid, {FIELD}) VALUES (NEW.id, NEW.{FIELD})"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN "
+        f"{insert}; END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {FIELD} ON {table} BEGIN "
+        f"{forget}; {insert}; END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN "
+        f"{forget}; END",
+    ]
+
+
+def _pg_document():
+    """PostgreSQL tsvector expression, identical in the index and queries."""
+    return f"to_tsvector('simple', {FIELD})"
+
+
+def install(connection):
+    """
+    Create the full-text indexes if they are missing. Safe to run again;
+    runs after every migrate (see logbook.signals) for the same reason
+    as spatial.install().
+    """
+    with connection.cursor() as cursor:
+        tables = set(connection.introspection.table_names(cursor))
+        for model, fts in INDEXES.items():
+            table = model._meta.db_table
+            if table not in tables:
+                continue
+            if connection.vendor == "sqlite":
+                if fts not in tables:
+                    try:
+                        with transaction.atomic(using=connection.alias):
+                            cursor.execute(
+                                f"CREATE VIRTUAL TABLE {fts} USING fts5("
+                                f"{FIELD}, content='{table}', content_rowid='id')"
+                            )
+                    except DatabaseError:
+                        continue  # SQLite built without FTS5: unindexed search
+                    cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+                for statement in _sqlite_ddl(table, fts):
+                    cursor.execute(statement)
+            elif connection.vendor == "postgresql":
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {fts}_idx ON {table} USING gin (({_pg_document()}))"
+                )
+    _indexed.clear()
+
+
+def uninstall(connection):
+    with connection.cursor() as cursor:
+        for model, fts in INDEXES.items():
+            if connection.vendor == "sqlite":
+                for suffix in ("insert", "update", "delete"):
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+                cursor.execute(f"DROP TABLE IF EXISTS {fts}")
+            elif connection.vendor == "postgresql":
+                cursor.execute(f"DROP INDEX IF EXISTS {fts}_idx")
+    _indexed.clear()
+
+
+# ---- Queries ----
+
+_indexed = {}  # (database alias, model) -> SQLite FTS5 table exists
+
+
+def _index_lookup(queryset, words):
+    """pk__in subquery over the full-text index, or None without one."""
+    model = queryset.model
+    connection = connections[queryset.db]
+    table, fts = model._meta.db_table, INDEXES[model]
+
+    if connection.vendor == "sqlite":
+        key = (queryset.db, model)
+        if key not in _indexed:
+            with connection.cursor() as cursor:
+                _indexed[key] = fts in connection.introspection.table_names(cursor)
+        if not _indexed[key]:
+            return None
+        # "word"* is a prefix match on one word; the words are ANDed.
+        query = " ".join(f'"{word}"*' for word in words)
+        return RawSQL(f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s", [query])
+    if connection.vendor == "postgresql":
+        query = " & ".join(f"{word}:*" for word in words)
+        return RawSQL(
+            f"SELECT id FROM {table} WHERE {_pg_document()} @@ to_tsquery('simple', %s)",
+            [query],
+        )
+    return None
+
+
+def remarks_match(queryset, text):
+    """
+    Q for flights of `queryset` whose remarks contain every word of
+    `text`, or None if `text` has no words.
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    candidates = _index_lookup(queryset, words)
+    if candidates is not None:
+        return Q(pk__in=candidates)
+    match = Q()
+    for word in words:
+        match &= Q(**{f"{FIELD}__icontains": word})
+    return match
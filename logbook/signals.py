@@ -0,0 +1,101 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+
+from . import currency, merkle, profiles, search, spatial
+from .models import FlightLogEntry, FlightTombstone, PilotProfile
+
+_archiving = ContextVar("logbook_archiving", default=False)
+
+
+@contextmanager
+def archiving():
+    """
+    Flights deleted inside this block are being moved to the archive,
+    not removed from the logbook: keep their Merkle leaves and do not
+    publish tombstones.
+    """
+    token = _archiving.set(True)
+    try:
+        yield
+    finally:
+        _archiving.reset(token)
+
+
+@receiver(pre_save, sender=FlightLogEntry)
+def flight_saving(sender, instance, raw=False, **kwargs):
+    # Where the flight was on the map, to move it in the map cells, and
+    # when, to tell whether the pilot's currency changed.
+    instance._map_location = instance._old_date = None
+    if not raw and instance.pk:
+        old = FlightLogEntry.objects.filter(pk=instance.pk).only("user", "date", *spatial.POINT_FIELDS).first()
+        if old is not None:
+            instance._map_location = (old.user_id, spatial.location(old))
+            instance._old_date = old.date
+
+
+@receiver(post_save, sender=FlightLogEntry)
+def flight_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    merkle.record_flight(instance)
+
+    old = getattr(instance, "_map_location", None) or (instance.user_id, None)
+    new = (instance.user_id, spatial.location(instance))
+    if old != new:
+        spatial.count(*old, sign=-1)
+        spatial.count(*new)
+
+    old_date = getattr(instance, "_old_date", None)
+    if any(day and currency.in_window(day) for day in (instance.date, old_date)):
+        currency.evaluate([instance.user_id])
+
+
+def _cascaded(origin):
+    """Whether a delete started from something other than flights (a user)."""
+    if origin is None or isinstance(origin, FlightLogEntry):
+        return False
+    return getattr(origin, "model", None) is not FlightLogEntry
+
+
+@receiver(post_delete, sender=FlightLogEntry)
+def flight_deleted(sender, instance, origin=None, **kwargs):
+    # Archived flights stay in the logbook; a deleted pilot takes their
+    # tree, tombstones and map cells along.
+    if _archiving.get() or _cascaded(origin):
+        return
+
+    merkle.forget_flight(instance)
+    spatial.count(instance.user_id, spatial.location(instance), sign=-1)
+    if currency.in_window(instance.date):
+        currency.evaluate([instance.user_id])
+
+    vector = dict(instance.version_vector or {})
+    vector[instance.SERVER_REPLICA] = vector.get(instance.SERVER_REPLICA, 0) + 1
+    FlightTombstone.objects.update_or_create(
+        uuid=instance.uuid,
+        defaults={"user_id": instance.user_id, "version_vector": vector},
+    )
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        PilotProfile.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=PilotProfile)
+@receiver(post_delete, sender=PilotProfile)
+def profile_changed(sender, instance, **kwargs):
+    profiles.invalidate(instance.user_id)
+
+
+@receiver(post_migrate)
+def migrated(sender, app_config, using, **kwargs):
+    if app_config.label == "logbook":
+        spatial.install(connections[using])
+        search.install(connections[using])
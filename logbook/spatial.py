@@ -0,0 +1,421 @@
+"""
+Where flights were flown.
+
+Flights have optional departure and arrival coordinates. Both points
+sit in a spatial index that the database keeps up to date itself, so
+rows written by bulk_create(), the archive mover or raw SQL are indexed
+too:
+
+- SQLite: an R*Tree virtual table per flight table (one entry per
+  point), maintained by triggers.
+- PostgreSQL: GiST indexes on the point expressions (core geometric
+  types, PostGIS is not needed).
+- Other databases, or SQLite built without R*Tree: no index; box
+  queries are plain column filters.
+
+Box and radius queries take candidates from the index and then check the
+actual points. Map tiles are built from FlightCell counts (kept per zoom
+level as flights are saved and deleted), so a zoomed-out map of a
+million flights reads a few hundred cells instead of the flights.
+"""
+from collections import defaultdict
+from itertools import chain
+from math import asin, asinh, atan, cos, degrees, pi, radians, sin, sinh, sqrt, tan
+
+from django.db import DatabaseError, IntegrityError, connections, transaction
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+
+from .models import ArchivedFlight, FlightCell, FlightLogEntry
+
+INDEXES = {
+    FlightLogEntry: "logbook_flight_rtree",
+    ArchivedFlight: "logbook_archive_rtree",
+}
+
+# Zoom levels FlightCell counts are kept at. A tile at zoom z is split
+# into 8 x 8 clusters, read from the first level at or below z + 3.
+CELL_LEVELS = (3, 6, 9, 12, 15, 18)
+CLUSTER_BITS = 3
+MAX_ZOOM = 22
+POINTS_PER_TILE = 500
+
+POINT_FIELDS = ("departure_lat", "departure_lon", "arrival_lat", "arrival_lon")
+
+MAX_LAT = 85.05112878  # Web Mercator limit
+EARTH_RADIUS_KM = 6371.0088
+
+
+# ---- Index DDL (run after every migrate; migration 0011 has a frozen copy) ----
+
+# R*Tree entry ids: 2 * flight pk for the departure, + 1 for the arrival.
+_ENTRIES = (("departure", 0), ("arrival", 1))
+
+
+def _sqlite_inserts(rtree, table=None):
+    """INSERTs of NEW's (in a trigger) or every `table` row's points."""
+    prefix = f"{table or 'NEW'}."
+    source = f" FROM {table}" if table else ""
+    return [
+        f"INSERT INTO {rtree} SELECT 2 * {prefix}id + {offset}, "
+        f"{prefix}{point}_lat, {prefix}{point}_lat, {prefix}{point}_lon, {prefix}{point}_lon{source} "
+        f"WHERE {prefix}{point}_lat IS NOT NULL AND {prefix}{point}_lon IS NOT NULL"
+        for point, offset in _ENTRIES
+    ]
+
+
+def _sqlite_ddl(table, rtree):
+    forget = f"DELETE FROM {rtree} WHERE id IN (2 * OLD.id, 2 * OLD.id + 1)"
+    insert = "; ".join(_sqlite_inserts(rtree))
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {rtree}_insert AFTER INSERT ON {table} BEGIN "
+        f"{insert}; END",
+        f"CREATE TRIGGER IF NOT EXISTS {rtree}_update "
+        f"AFTER UPDATE OF departure_lat, departure_lon, arrival_lat, arrival_lon ON {table} BEGIN "
+        f"{forget}; {insert}; END",
+        f"CREATE TRIGGER IF NOT EXISTS {rtree}_delete AFTER DELETE ON {table} BEGIN "
+        f"{forget}; END",
+    ]
+
+
+def _pg_point(point):
+    """PostgreSQL point expression, identical in the index and queries."""
+    return f"point({point}_lon, {point}_lat)"
+
+
+def install(connection):
+    """
+    Create the spatial indexes if they are missing. Safe to run again:
+    SQLite drops triggers when a migration rebuilds their table, so this
+    also runs after every migrate (see logbook.signals), including back
+    to before the coordinates existed.
+    """
+    with connection.cursor() as cursor:
+        tables = set(connection.introspection.table_names(cursor))
+        for model, rtree in INDEXES.items():
+            table = model._meta.db_table
+            if table not in tables:
+                continue
+            columns = {c.name for c in connection.introspection.get_table_description(cursor, table)}
+            if not columns.issuperset(POINT_FIELDS):
+                continue
+            if connection.vendor == "sqlite":
+                if rtree not in tables:
+                    try:
+                        with transaction.atomic(using=connection.alias):
+                            cursor.execute(
+                                f"CREATE VIRTUAL TABLE {rtree} "
+                                f"USING rtree(id, min_lat, max_lat, min_lon, max_lon)"
+                            )
+                    except DatabaseError:
+                        continue  # SQLite built without R*Tree: unindexed queries
+                    for statement in _sqlite_inserts(rtree, table):
+                        cursor.execute(statement)
+                for statement in _sqlite_ddl(table, rtree):
+                    cursor.execute(statement)
+            elif connection.vendor == "postgresql":
+                for point, _ in _ENTRIES:
+                    cursor.execute(
+                        f"CREATE INDEX IF NOT EXISTS {table}_{point[:3]}_geo_idx "
+                        f"ON {table} USING gist (({_pg_point(point)}))"
+                    )
+    _indexed.clear()
+
+
+def uninstall(connection):
+    with connection.cursor() as cursor:
+        for model, rtree in INDEXES.items():
+            table = model._meta.db_table
+            if connection.vendor == "sqlite":
+                for suffix in ("insert", "update", "delete"):
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {rtree}_{suffix}")
+                cursor.execute(f"DROP TABLE IF EXISTS {rtree}")
+            elif connection.vendor == "postgresql":
+                for point, _ in _ENTRIES:
+                    cursor.execute(f"DROP INDEX IF EXISTS {table}_{point[:3]}_geo_idx")
+    _indexed.clear()
+
+
+# ---- Box and radius queries ----
+
+_indexed = {}  # (database alias, model) -> SQLite R*Tree exists
+
+
+def _index_lookup(queryset, south, west, north, east):
+    """pk__in subquery over the spatial index, or None without one."""
+    model = queryset.model
+    connection = connections[queryset.db]
+    table, rtree = model._meta.db_table, INDEXES[model]
+    ranges = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+
+    if connection.vendor == "sqlite":
+        key = (queryset.db, model)
+        if key not in _indexed:
+            with connection.cursor() as cursor:
+                _indexed[key] = rtree in connection.introspection.table_names(cursor)
+        if not _indexed[key]:
+            return None
+        sql = " UNION ALL ".join(
+            f"SELECT id / 2 FROM {rtree} WHERE max_lat >= %s AND min_lat <= %s "
+            f"AND max_lon >= %s AND min_lon <= %s"
+            for _ in ranges
+        )
+        params = [v for lo, hi in ranges for v in (south, north, lo, hi)]
+    elif connection.vendor == "postgresql":
+        sql = " UNION ALL ".join(
+            f"SELECT id FROM {table} WHERE {_pg_point(point)} <@ box(point(%s, %s), point(%s, %s))"
+            for _ in ranges
+            for point, _ in _ENTRIES
+        )
+        params = [v for lo, hi in ranges for _ in _ENTRIES for v in (lo, south, hi, north)]
+    else:
+        return None
+    return RawSQL(sql, params)
+
+
+def in_box(queryset, south, west, north, east):
+    """
+    Flights of `queryset` (live or archived) with a point inside the box.
+    A box with west > east crosses the antimeridian.
+    """
+    def inside(point):
+        lat = Q(**{f"{point}_lat__gte": south, f"{point}_lat__lte": north})
+        if west <= east:
+            return lat & Q(**{f"{point}_lon__gte": west, f"{point}_lon__lte": east})
+        return lat & (Q(**{f"{point}_lon__gte": west}) | Q(**{f"{point}_lon__lte": east}))
+
+    queryset = queryset.filter(inside("departure") | inside("arrival"))
+    candidates = _index_lookup(queryset, south, west, north, east)
+    if candidates is not None:
+        queryset = queryset.filter(pk__in=candidates)
+    return queryset
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle (haversine) distance."""
+    lat1, lon1, lat2, lon2 = map(radians, (lat1, lon1, lat2, lon2))
+    a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(min(sqrt(a), 1.0))
+
+
+def points(flight):
+    """The flight's (lat, lon) points: departure, then arrival."""
+    return [
+        (getattr(flight, f"{p}_lat"), getattr(flight, f"{p}_lon"))
+        for p in ("departure", "arrival")
+        if getattr(flight, f"{p}_lat") is not None and getattr(flight, f"{p}_lon") is not None
+    ]
+
+
+def near(queryset, lat, lon, km, limit=None):
+    """
+    (distance in km, flight) for the (`limit` nearest) flights of
+    `queryset` with a point within `km` of (lat, lon), nearest first.
+    """
+    angle = km / EARTH_RADIUS_KM
+    south, north = lat - degrees(angle), lat + degrees(angle)
+    if south <= -90.0 or north >= 90.0 or sin(angle) >= cos(radians(lat)):
+        # The circle reaches a pole: every longitude.
+        south, north, west, east = max(south, -90.0), min(north, 90.0), -180.0, 180.0
+    else:
+        dlon = degrees(asin(sin(angle) / cos(radians(lat))))
+        west, east = lon - dlon, lon + dlon
+        west = west + 360.0 if west < -180.0 else west
+        east = east - 360.0 if east > 180.0 else east
+
+    # Distances from the coordinates alone; only the results are loaded.
+    found = []
+    rows = in_box(queryset, south, west, north, east).values_list("pk", *POINT_FIELDS)
+    for pk, dep_lat, dep_lon, arr_lat, arr_lon in rows.iterator(chunk_size=5000):
+        distance = min(
+            distance_km(lat, lon, p_lat, p_lon)
+            for p_lat, p_lon in ((dep_lat, dep_lon), (arr_lat, arr_lon))
+            if p_lat is not None and p_lon is not None
+        )
+        if distance <= km:
+            found.append((distance, pk))
+    found.sort()
+    found = found[:limit]
+    flights = queryset.in_bulk([pk for _, pk in found])
+    return [(distance, flights[pk]) for distance, pk in found]
+
+
+# ---- Map cells and tiles ----
+
+def location(flight):
+    """Where a flight shows on the map: its departure, else its arrival."""
+    found = points(flight)
+    return found[0] if found else None
+
+
+def cell(lat, lon, level):
+    """Web Mercator tile (x, y) containing the point at zoom `level`."""
+    n = 1 << level
+    lat = max(min(lat, MAX_LAT), -MAX_LAT)
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - asinh(tan(radians(lat))) / pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bounds(z, x, y):
+    """(south, west, north, east) of a Web Mercator tile."""
+    n = 1 << z
+
+    def lat(row):
+        return degrees(atan(sinh(pi * (1 - 2 * row / n))))
+
+    return lat(y + 1), x / n * 360.0 - 180.0, lat(y), (x + 1) / n * 360.0 - 180.0
+
+
+def count(user_id, point, sign=1):
+    """Add (sign=1) or remove (sign=-1) one flight at `point` in every level."""
+    if point is None:
+        return
+    lat, lon = point
+    for level in CELL_LEVELS:
+        x, y = cell(lat, lon, level)
+        changes = {
+            "flights": F("flights") + sign,
+            "lat_sum": F("lat_sum") + sign * lat,
+            "lon_sum": F("lon_sum") + sign * lon,
+        }
+        cells = FlightCell.objects.filter(user_id=user_id, level=level, x=x, y=y)
+        if cells.update(**changes) or sign < 0:
+            continue
+        try:
+            with transaction.atomic():
+                FlightCell.objects.create(
+                    user_id=user_id, level=level, x=x, y=y, flights=1, lat_sum=lat, lon_sum=lon,
+                )
+        except IntegrityError:  # created concurrently
+            cells.update(**changes)
+
+
+def count_many(user_id, points):
+    """
+    count() for many new flights at once (None for those without a
+    location): the cells they fall in are read in chunks, added to and
+    written back with one bulk upsert. The caller must hold the pilot's
+    Merkle tree lock, which every single-flight save and delete takes
+    before it counts, so no increment is lost in between.
+    """
+    totals = _cell_totals(point for point in points if point is not None)
+    by_level = defaultdict(set)
+    for level, x, _ in totals:
+        by_level[level].add(x)
+    for level, xs in by_level.items():
+        xs = sorted(xs)
+        for i in range(0, len(xs), 500):
+            stored = FlightCell.objects.filter(
+                user_id=user_id, level=level, x__in=xs[i:i + 500],
+            ).values_list("x", "y", "flights", "lat_sum", "lon_sum")
+            for x, y, flights, lat_sum, lon_sum in stored:
+                total = totals.get((level, x, y))
+                if total is not None:
+                    total[0] += flights
+                    total[1] += lat_sum
+                    total[2] += lon_sum
+
+    FlightCell.objects.bulk_create(
+        (
+            FlightCell(user_id=user_id, level=level, x=x, y=y, flights=n, lat_sum=a, lon_sum=b)
+            for (level, x, y), (n, a, b) in totals.items()
+        ),
+        batch_size=2000,
+        update_conflicts=True,
+        unique_fields=["user", "level", "x", "y"],
+        update_fields=["flights", "lat_sum", "lon_sum"],
+    )
+
+
+def _cell_totals(points):
+    """{(level, x, y): [flights, lat_sum, lon_sum]} for (lat, lon) points."""
+    totals = defaultdict(lambda: [0, 0.0, 0.0])
+    for lat, lon in points:
+        for level in CELL_LEVELS:
+            total = totals[(level, *cell(lat, lon, level))]
+            total[0] += 1
+            total[1] += lat
+            total[2] += lon
+    return totals
+
+
+def rebuild_cells(user):
+    """Recount a pilot's map cells from both flight tables."""
+    def located():
+        for model in (ArchivedFlight, FlightLogEntry):
+            rows = (
+                model.objects.filter(user=user)
+                .filter(Q(departure_lat__isnull=False) | Q(arrival_lat__isnull=False))
+                .values_list(*POINT_FIELDS)
+            )
+            for dep_lat, dep_lon, arr_lat, arr_lon in rows.iterator(chunk_size=5000):
+                if dep_lat is not None and dep_lon is not None:
+                    yield dep_lat, dep_lon
+                elif arr_lat is not None and arr_lon is not None:
+                    yield arr_lat, arr_lon
+
+    totals = _cell_totals(located())
+
+    with transaction.atomic():
+        FlightCell.objects.filter(user=user).delete()
+        FlightCell.objects.bulk_create(
+            (
+                FlightCell(user=user, level=level, x=x, y=y, flights=n, lat_sum=a, lon_sum=b)
+                for (level, x, y), (n, a, b) in totals.items()
+            ),
+            batch_size=5000,
+        )
+    return len(totals)
+
+
+def tile(user, z, x, y):
+    """
+    Flight clusters in Web Mercator tile z/x/y: up to 8 x 8 clusters from
+    FlightCell counts, or single flights once zoomed in past the finest
+    cell level.
+    """
+    if z + CLUSTER_BITS > CELL_LEVELS[-1]:
+        return _flight_points(user, z, x, y)
+
+    level = next(level for level in CELL_LEVELS if level >= z + CLUSTER_BITS)
+    shift = level - z
+    group = 1 << (shift - CLUSTER_BITS)
+    rows = FlightCell.objects.filter(
+        user=user, level=level, flights__gt=0,
+        x__gte=x << shift, x__lt=(x + 1) << shift,
+        y__gte=y << shift, y__lt=(y + 1) << shift,
+    ).values_list("x", "y", "flights", "lat_sum", "lon_sum")
+
+    clusters = defaultdict(lambda: [0, 0.0, 0.0])
+    for cx, cy, flights, lat_sum, lon_sum in rows:
+        cluster = clusters[cx // group, cy // group]
+        cluster[0] += flights
+        cluster[1] += lat_sum
+        cluster[2] += lon_sum
+    return {
+        "z": z, "x": x, "y": y,
+        "flights": sum(c[0] for c in clusters.values()),
+        "clusters": [
+            {"lat": round(lat / n, 6), "lon": round(lon / n, 6), "flights": n}
+            for n, lat, lon in clusters.values()
+        ],
+    }
+
+
+def _flight_points(user, z, x, y):
+    south, west, north, east = tile_bounds(z, x, y)
+    rows = chain.from_iterable(
+        in_box(model.objects.filter(user=user), south, west, north, east)
+        .values_list("pk", *POINT_FIELDS)
+        .iterator(chunk_size=2000)
+        for model in (ArchivedFlight, FlightLogEntry)
+    )
+    clusters = []
+    for pk, dep_lat, dep_lon, arr_lat, arr_lon in rows:
+        point = (dep_lat, dep_lon) if dep_lat is not None and dep_lon is not None else (arr_lat, arr_lon)
+        if None not in point and cell(*point, z) == (x, y):
+            clusters.append({"lat": point[0], "lon": point[1], "flights": 1, "id": pk})
+            if len(clusters) == POINTS_PER_TILE:
+                break
+    return {"z": z, "x": x, "y": y, "flights": len(clusters), "clusters": clusters}
@@ -0,0 +1,198 @@
+"""
+Batched delta sync for offline clients.
+
+Clients create flights with their own UUIDs and keep a version vector
+per record ({replica_id: counter}); they bump their own counter on every
+local edit. A sync request carries all local changes plus the token
+from the previous sync. The server applies the changes in one
+transaction and answers with everything that changed on its side since
+that token.
+
+Request body:
+
+    {
+        "token": "<token from last sync, or empty>",
+        "changes": [
+            {"uuid": "...", "version": {"tablet-1": 3}, "fields": {...}},
+            {"uuid": "...", "version": {"tablet-1": 4}, "deleted": true}
+        ]
+    }
+
+A change is applied when its vector dominates the server's copy. If the
+server copy is newer or the two were edited concurrently, the change is
+reported under "conflicts" together with the server version; the client
+resolves it and sends a new change whose vector covers both.
+"""
+from uuid import UUID
+
+from django.db import transaction
+
+from .forms import FlightLogEntryForm
+from .models import ArchivedFlight, ChangeCounter, FlightLogEntry, FlightTombstone
+
+MAX_CHANGES = 2000
+
+EQUAL = "equal"
+NEWER = "newer"
+OLDER = "older"
+CONCURRENT = "concurrent"
+
+
+class SyncError(ValueError):
+    pass
+
+
+def compare(a, b):
+    """Order version vector `a` relative to `b`."""
+    keys = a.keys() | b.keys()
+    a_ge = all(a.get(k, 0) >= b.get(k, 0) for k in keys)
+    b_ge = all(b.get(k, 0) >= a.get(k, 0) for k in keys)
+    if a_ge and b_ge:
+        return EQUAL
+    if a_ge:
+        return NEWER
+    if b_ge:
+        return OLDER
+    return CONCURRENT
+
+
+def merge(a, b):
+    return {k: max(a.get(k, 0), b.get(k, 0)) for k in a.keys() | b.keys()}
+
+
+def flight_record(entry):
+    return {
+        "uuid": str(entry.uuid),
+        "version": entry.version_vector,
+        "fields": {name: getattr(entry, name) for name in FlightLogEntryForm.Meta.fields},
+        "flight_time": entry.flight_time,
+    }
+
+
+def tombstone_record(tombstone):
+    return {
+        "uuid": str(tombstone.uuid),
+        "version": tombstone.version_vector,
+        "deleted": True,
+    }
+
+
+def parse_token(token):
+    """
+    Tokens are change sequence numbers (see ChangeCounter), sent as a
+    non-negative integer or a string of digits.
+    """
+    if token is None or token == "":
+        return 0
+    if isinstance(token, str) and token.isascii() and token.isdigit():
+        return int(token)
+    if isinstance(token, int) and not isinstance(token, bool) and token >= 0:
+        return token
+    raise SyncError("Invalid sync token.")
+
+
+def _parse_change(change):
+    try:
+        uuid = UUID(str(change["uuid"]))
+    except (KeyError, TypeError, ValueError):
+        raise SyncError("Each change needs a valid 'uuid'.")
+    version = change.get("version")
+    if not isinstance(version, dict) or not all(
+        isinstance(v, int) and not isinstance(v, bool) and v >= 0 for v in version.values()
+    ):
+        raise SyncError(f"Change {uuid} needs a 'version' vector of counters.")
+    if not isinstance(change.get("fields", {}), dict):
+        raise SyncError(f"Change {uuid} has 'fields' that are not an object.")
+    return uuid, version
+
+
+def _apply_change(user, change, result):
+    uuid, version = _parse_change(change)
+
+    if FlightLogEntry.objects.filter(uuid=uuid).exclude(user=user).exists():
+        result["rejected"].append({
+            "uuid": str(uuid),
+            "errors": {"uuid": [{"message": "Already in use.", "code": "unique"}]},
+        })
+        return
+    if ArchivedFlight.objects.filter(uuid=uuid).exists():
+        result["rejected"].append({
+            "uuid": str(uuid),
+            "errors": {"uuid": [{"message": "Archived flights are read-only.", "code": "archived"}]},
+        })
+        return
+
+    entry = FlightLogEntry.objects.select_for_update().filter(user=user, uuid=uuid).first()
+    tombstone = FlightTombstone.objects.filter(user=user, uuid=uuid).first()
+    current = entry or tombstone
+    server_version = current.version_vector if current else {}
+
+    relation = compare(version, server_version)
+    if current and relation == EQUAL:
+        result["applied"].append(str(uuid))  # retried batch
+        return
+    if current and relation != NEWER:
+        result["conflicts"].append({
+            "uuid": str(uuid),
+            "server": flight_record(entry) if entry else tombstone_record(tombstone),
+        })
+        return
+
+    merged = merge(version, server_version)
+
+    if change.get("deleted"):
+        if entry:
+            entry.delete()
+        FlightTombstone.objects.update_or_create(
+            uuid=uuid, defaults={"user": user, "version_vector": merged},
+        )
+        result["applied"].append(str(uuid))
+        return
+
+    form = FlightLogEntryForm(change.get("fields") or {}, instance=entry)
+    if not form.is_valid():
+        result["rejected"].append({"uuid": str(uuid), "errors": form.errors.get_json_data()})
+        return
+
+    entry = form.save(commit=False)
+    entry.user = user
+    entry.uuid = uuid
+    entry.version_vector = merged
+    entry.save(bump_version=False)
+    if tombstone:
+        tombstone.delete()
+    result["applied"].append(str(uuid))
+
+
+def apply_batch(user, token, changes):
+    """
+    Apply a client's batch and collect the server-side delta since
+    `token`, all inside one transaction.
+    """
+    since = parse_token(token)
+    if not isinstance(changes, list):
+        raise SyncError("'changes' must be a list.")
+    if len(changes) > MAX_CHANGES:
+        raise SyncError(f"At most {MAX_CHANGES} changes per sync.")
+
+    result = {"applied": [], "conflicts": [], "rejected": []}
+
+    with transaction.atomic():
+        for change in changes:
+            if not isinstance(change, dict):
+                raise SyncError("Each change must be an object.")
+            with transaction.atomic():
+                _apply_change(user, change, result)
+
+        new_token = ChangeCounter.current_value()
+        flights = FlightLogEntry.objects.filter(
+            user=user, change_seq__gt=since, change_seq__lte=new_token,
+        )
+        tombstones = FlightTombstone.objects.filter(
+            user=user, change_seq__gt=since, change_seq__lte=new_token,
+        )
+        result["changes"] = [flight_record(f) for f in flights.order_by("change_seq")]
+        result["deleted"] = [tombstone_record(t) for t in tombstones.order_by("change_seq")]
+
+    result["token"] = str(new_token)
+    return result
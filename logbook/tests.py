@@ -1,3 +1,800 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import re
+import zlib
+import shutil
+import tempfile
+import time
+from datetime import date, time as clock, timedelta
+from unittest import mock
+from uuid import uuid4
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from logbook import (
+    archive, conflicts, currency, importer, limits, merkle, pdf, profiles, reports, search, spatial, staticfiles, sync,
+)
+from logbook.admin import EstimatedCountPaginator
+from logbook.routers import PIN_COOKIE
+
+from logbook.models import (
+    ChangeCounter, FlightCell, FlightLogEntry, FlightTombstone, MerkleTree, PilotProfile, PilotStatus,
+)
+
+
+def make_flight(user, **fields):
+    values = {"date": date(2024, 5, 1), "departure": "EDDF", "arrival": "EDDM"}
+    values.update(fields)
+    return FlightLogEntry.objects.create(user=user, **values)
+
+
+class DeleteTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("pilot")
+
+    def test_deleting_a_pilot_with_flights(self):
+        make_flight(self.user, departure_lat=50.03, departure_lon=8.57)
+        make_flight(self.user)
+        self.user.delete()
+
+        self.assertFalse(FlightLogEntry.objects.exists())
+        self.assertFalse(MerkleTree.objects.exists())
+        self.assertFalse(FlightTombstone.objects.exists())
+        self.assertFalse(FlightCell.objects.exists())
+
+    def test_deleting_a_flight_leaves_a_tombstone(self):
+        flight = make_flight(self.user)
+        other = make_flight(self.user)
+        root = MerkleTree.objects.get(user=self.user).root
+        flight.delete()
+        FlightLogEntry.objects.filter(pk=other.pk).delete()
+
+        self.assertEqual(
+            set(FlightTombstone.objects.values_list("uuid", flat=True)), {flight.uuid, other.uuid}
+        )
+        self.assertNotEqual(MerkleTree.objects.get(user=self.user).root, root)
+
+
+class ChangeSequenceTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("pilot")
+
+    def test_update_fields_still_advance_the_sequence(self):
+        flight = make_flight(self.user)
+        before = flight.change_seq
+        flight.remarks = "Checked"
+        flight.save(update_fields=["remarks"])
+        flight.refresh_from_db()
+        self.assertGreater(flight.change_seq, before)
+        self.assertEqual(flight.version_vector[FlightLogEntry.SERVER_REPLICA], 2)
+
+    def test_updated_tombstone_is_republished(self):
+        flight = make_flight(self.user)
+        flight.delete()
+        tombstone = FlightTombstone.objects.get(uuid=flight.uuid)
+        FlightTombstone.objects.update_or_create(
+            uuid=flight.uuid, defaults={"version_vector": {"server": 5}},
+        )
+        tombstone.refresh_from_db()
+        self.assertEqual(tombstone.change_seq, ChangeCounter.objects.get().value)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class SyncTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("pilot")
+        self.client.force_login(self.user)
+
+    def sync(self, changes):
+        return self.client.post(
+            "/flights/sync/", json.dumps({"changes": changes}), content_type="application/json",
+        )
+
+    def test_fields_must_be_an_object(self):
+        response = self.sync([{"uuid": str(uuid4()), "version": {"phone": 1}, "fields": "x"}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("fields", response.json()["error"])
+
+    def test_sync_tokens(self):
+        for token in (None, "", 0, "0"):
+            self.assertEqual(sync.parse_token(token), 0)
+        self.assertEqual(sync.parse_token("42"), 42)
+        self.assertEqual(sync.parse_token(42), 42)
+        for token in (True, False, -1, "-1", " 4", "4.0", 4.0, "١٢", "²", [], {}):
+            with self.assertRaises(sync.SyncError, msg=repr(token)):
+                sync.parse_token(token)
+
+    def test_version_counters_must_be_integers(self):
+        for counter in (True, -1, 1.0, "1"):
+            response = self.sync([{"uuid": str(uuid4()), "version": {"phone": counter}, "fields": {}}])
+            self.assertEqual(response.status_code, 400, counter)
+            self.assertIn("version", response.json()["error"])
+
+    def test_new_flight(self):
+        uuid = uuid4()
+        response = self.sync([{
+            "uuid": str(uuid), "version": {"phone": 1},
+            "fields": {
+                "date": "2024-05-01", "departure": "EDDF", "arrival": "EDDM",
+                "uav_type": "MULTI", "uav_reg": "D-UAS1", "pilot_role": "PIC",
+                "takeoff_day": 1, "takeoff_night": 0, "landing_day": 1, "landing_night": 0,
+            },
+        }])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["applied"], [str(uuid)])
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("pilot")
+
+    def test_live_flights_older_than_the_archive_sort_in_place(self):
+        for day in (date(2021, 3, 1), date(2022, 3, 1)):
+            make_flight(self.user, date=day)
+        make_flight(self.user, date=date(2025, 1, 1))
+        archive.archive_before(date(2023, 1, 1))
+        late_entry = make_flight(self.user, date=date(2020, 6, 1))
+
+        dates = [f.date for f in archive.flights_between(self.user)]
+        self.assertEqual(dates, sorted(dates))
+        self.assertEqual(dates[0], late_entry.date)
+        dates = [f.date for f in archive.flights_between(self.user, descending=True)]
+        self.assertEqual(dates, sorted(dates, reverse=True))
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"], LOGBOOK_READ_REPLICAS=["replica"])
+class ReplicaTests(TestCase):
+    """The 'replica' alias is a second SQLite database that never gets writes."""
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("pilot")
+        get_user_model().objects.using("replica").bulk_create([get_user_model()(
+            pk=self.user.pk, username=self.user.username, password=self.user.password,
+        )])
+        make_flight(self.user, departure="PRIMARY")
+        # bulk_create skips the signals, which would write to the primary.
+        FlightLogEntry.objects.using("replica").bulk_create([
+            FlightLogEntry(user_id=self.user.pk, date=date(2024, 5, 2), departure="REPLICA", arrival="EDDM"),
+        ])
+        self.client.force_login(self.user)
+
+    def body(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return (b"".join(response) if response.streaming else response.content).decode()
+
+    def test_writes_go_to_the_primary_and_pin_reads(self):
+        response = self.client.post("/flights/new/", {
+            "date": "2024-05-03", "departure": "NEW", "arrival": "EDDM", "uav_type": "MULTI",
+            "uav_reg": "D-UAS1", "pilot_role": "PIC",
+            "takeoff_day": 1, "takeoff_night": 0, "landing_day": 1, "landing_night": 0,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(FlightLogEntry.objects.using("default").filter(departure="NEW").exists())
+        self.assertFalse(FlightLogEntry.objects.using("replica").filter(departure="NEW").exists())
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        # The pin cookie keeps this pilot's reads on the primary.
+        body = self.body("/flights/export/")
+        self.assertIn("NEW", body)
+        self.assertNotIn("REPLICA", body)
+
+    def test_streamed_replica_reads(self):
+        for path in ("/flights/export/", "/audit/"):
+            body = self.body(path)
+            self.assertIn("REPLICA", body)
+            self.assertNotIn("PRIMARY", body)
+
+    def test_pinned_reads_stay_on_the_primary(self):
+        self.client.cookies[PIN_COOKIE] = "1"
+        body = self.body("/audit/")
+        self.assertIn("PRIMARY", body)
+        self.assertNotIn("REPLICA", body)
+
+    def test_plain_views_read_from_the_primary(self):
+        response = self.client.get("/flights/near/", {"lat": 0, "lon": 0, "km": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("PRIMARY", self.body("/flights/"))
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class StaticAssetTests(TestCase):
+    """Pages link fingerprinted, precompressed assets instead of inlining them."""
+    HTML_BUDGET = 8 * 1024  # bytes of HTML for a page with an empty logbook
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.static_root)
+        cls.enterClassContext(override_settings(STATIC_ROOT=cls.static_root))
+        call_command("collectstatic", interactive=False, verbosity=0)
+
+    def setUp(self):
+        staticfiles._lookup.cache_clear()
+        self.user = get_user_model().objects.create_user("pilot")
+        self.client.force_login(self.user)
+
+    def asset(self, path):
+        with open(f"{self.static_root}/{path}", "rb") as f:
+            return f.read()
+
+    def test_pages_link_hashed_assets(self):
+        inline = self.asset("css/base.css") + self.asset("js/base.js")
+        for path in ("/flights/", "/audit/", "/profile/"):
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                html = b"".join(response) if response.streaming else response.content
+                self.assertRegex(html, rb'href="/static/css/base\.[0-9a-f]{12}\.css"')
+                self.assertRegex(html, rb'src="/static/js/base\.[0-9a-f]{12}\.js"')
+                self.assertNotIn(b"<style", html)
+                self.assertNotRegex(html, rb'<script(?![^>]*(src=|application/json))')
+                # The assets used to be inlined into every page.
+                self.assertLess(len(html), self.HTML_BUDGET)
+                self.assertLess(len(html), len(inline))
+
+    def hashed(self, name):
+        html = self.client.get("/profile/").content.decode()
+        return re.search(rf'/static/({name}\.[0-9a-f]{{12}}\.\w+)"', html)[1]
+
+    def test_middleware_picks_the_smallest_accepted_encoding(self):
+        path = self.hashed("css/base")
+        response = self.client.get(f"/static/{path}", HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(response["Cache-Control"], staticfiles.IMMUTABLE)
+        self.assertIn("immutable", response["Cache-Control"])
+        body = b"".join(response.streaming_content)
+        self.assertEqual(int(response["Content-Length"]), len(body))
+        self.assertLess(len(body), len(self.asset(path)))
+
+        response = self.client.get(f"/static/{path}")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(b"".join(response.streaming_content), self.asset(path))
+
+    def test_unhashed_names_revalidate(self):
+        response = self.client.get("/static/css/base.css", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Cache-Control"], staticfiles.REVALIDATE)
+        self.assertEqual(self.client.post("/static/css/base.css").status_code, 405)
+
+
+class ProfileCacheTests(TestCase):
+    def test_invalidation_reaches_other_workers(self):
+        user = get_user_model().objects.create_user("pilot")
+        # A cache connection of its own, as another worker process would have.
+        other_worker = caches.create_connection("default")
+        self.assertEqual(profiles.get_profile(user).time_display_unit, "MIN")
+        self.assertIsNotNone(other_worker.get(profiles.cache_key(user.pk)))
+
+        profile = user.pilot_profile
+        profile.time_display_unit = "HMM"
+        profile.save()
+        self.assertIsNone(other_worker.get(profiles.cache_key(user.pk)))
+        self.assertEqual(profiles.get_profile(user).time_display_unit, "HMM")
+
+    def test_cold_cache_fills_once(self):
+        user = get_user_model().objects.create_user("pilot")
+        caches["default"].clear()
+        with CaptureQueriesContext(connection) as cold:
+            profiles.get_profile(user)
+        with CaptureQueriesContext(connection) as warm:
+            self.assertEqual(profiles.get_profile(user).user_id, user.pk)
+        self.assertTrue(any("logbook_pilotprofile" in q["sql"] for q in cold.captured_queries))
+        # One primary-key read of the cache table, no profile query.
+        self.assertEqual(len(warm.captured_queries), 1)
+        self.assertIn("logbook_cache", warm.captured_queries[0]["sql"])
+
+    @override_settings(
+        ALLOWED_HOSTS=["testserver"],
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "no_such_table"}},
+    )
+    def test_missing_cache_table_falls_back_to_the_database(self):
+        user = get_user_model().objects.create_user("pilot")
+        self.client.force_login(user)
+        for path in ("/flights/", "/profile/"):
+            self.assertEqual(self.client.get(path).status_code, 200, path)
+        profile = user.pilot_profile
+        profile.time_display_unit = "HMM"
+        profile.save()  # invalidating can't fail either
+        self.assertEqual(profiles.get_profile(user).time_display_unit, "HMM")
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    LOGBOOK_HEAVY_PER_USER=1, LOGBOOK_HEAVY_TOTAL=None, LOGBOOK_HEAVY_LEASE_SECONDS=0.2,
+)
+class LimitTests(TestCase):
+    def test_running_view_keeps_its_slot(self):
+        request = RequestFactory().post("/flights/import/")
+        request.user = get_user_model().objects.create_user("pilot")
+        held = []
+
+        @limits.limited
+        def slow_import(request):
+            time.sleep(0.5)  # well past the lease
+            held.append(limits.acquire(request.user.pk, wait=0))
+            return HttpResponse("done")
+
+        with mock.patch.object(limits, "RENEW_SECONDS", 0.05):
+            self.assertEqual(slow_import(request).status_code, 200)
+        self.assertEqual(held, [None])
+        self.assertIsNotNone(limits.acquire(request.user.pk, wait=0))
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class ImportTests(TestCase):
+    HEADER = "Date,Departure,Arrival,UAV registration,Takeoffs (day),Remarks\n"
+
+    def import_csv(self, text, workers=1):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", newline="") as f:
+            f.write(text)
+            f.flush()
+            return importer.import_file(self.user, f.name, "csv", workers=workers)
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("pilot")
+
+    def test_rows_the_database_would_reject_are_skipped(self):
+        created, skipped = self.import_csv(
+            self.HEADER
+            + "2024-03-01,EDDB,EDDT,D-1234,1,ok\n"
+            + f"2024-03-02,EDDB,EDDT,{'X' * 51},1,registration too long\n"
+            + "2024-03-03,EDDB,EDDT,D-1234,99999999999,count out of range\n"
+            + f"2024-03-04,{'A' * 101},EDDT,D-1234,1,departure too long\n"
+            + f"2024-03-05,EDDB,EDDT,D-1234,1,{'long remarks ' * 1000}\n"  # a TextField
+        )
+        self.assertEqual((len(created), skipped), (2, 3))
+
+    def test_unreadable_tail_reports_the_flights_saved(self):
+        # Enough rows that the broken one lands in a later chunk.
+        rows = "2024-03-01,EDDB,EDDT,D-1234,1,\n" * 2000
+        broken = '2024-04-01,EDDB,EDDT,D-1234,1,"' + "x" * 140_000 + '"\n'
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile("flights.csv", (self.HEADER + rows + broken).encode())
+        response = self.client.post("/flights/import/", {"file": upload}, follow=True)
+
+        saved = FlightLogEntry.objects.filter(user=self.user).count()
+        self.assertTrue(0 < saved < 2000)
+        (message,) = [str(m) for m in response.context["messages"]]
+        self.assertIn("stopped part-way", message)
+        self.assertIn(f"{saved} flights", message)
+
+    def test_batched_import_matches_saving_one_by_one(self):
+        user = self.user
+        before = make_flight(user, departure_lat=52.5, departure_lon=13.4)
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", newline="") as f:
+            f.write("Date,Departure,Arrival,Departure time,Arrival time,Departure latitude,Departure longitude\n")
+            for day in range(1, 8):
+                f.write(f"2024-03-0{day},EDDB,EDDT,10:00,10:{day * 5:02d},{48 + day},{11 - day}\n")
+            f.write("2024-03-09,EDDB,EDDT,,,,\n")
+            f.flush()
+            created, skipped = importer.import_file(user, f.name, "csv", workers=1)
+
+        self.assertEqual((len(created), skipped), (8, 0))
+        self.assertEqual([entry.flight_time for entry in created], [5, 10, 15, 20, 25, 30, 35, None])
+        self.assertEqual({entry.version_vector["server"] for entry in created}, {1})
+        seqs = [entry.change_seq for entry in created]
+        self.assertEqual(seqs, list(range(before.change_seq + 1, before.change_seq + 9)))
+        self.assertEqual(ChangeCounter.current_value(), seqs[-1])
+
+        tree = MerkleTree.objects.get(user=user)
+        cells = set(FlightCell.objects.filter(user=user).values_list(
+            "level", "x", "y", "flights", "lat_sum", "lon_sum",
+        ))
+        merkle.rebuild(user)
+        spatial.rebuild_cells(user)
+        self.assertEqual((tree.size, tree.root), MerkleTree.objects.values_list("size", "root").get(user=user))
+        self.assertEqual(cells, set(FlightCell.objects.filter(user=user).values_list(
+            "level", "x", "y", "flights", "lat_sum", "lon_sum",
+        )))
+
+
+class MerkleTests(TestCase):
+    def test_coordinates_are_sealed(self):
+        user = get_user_model().objects.create_user("pilot")
+        flight = make_flight(user, departure_lat=50.03, departure_lon=8.57)
+        root = MerkleTree.objects.get(user=user).root
+
+        flight.departure_lon = 8.58
+        flight.save()
+        self.assertNotEqual(MerkleTree.objects.get(user=user).root, root)
+
+        proof = merkle.inclusion_proofs(user, [flight.pk])
+        self.assertTrue(proof["scheme"].startswith("v2;"))
+        (item,) = proof["proofs"]
+        record = merkle.leaf_record(flight)
+        self.assertEqual(record["departure_lon"], 8.58)
+        self.assertEqual(item["leaf"], merkle.leaf_digest(record))
+        self.assertTrue(merkle.verify_proof(item["leaf"], item["position"], item["path"], proof["root"]))
+
+    def test_rebuild_keeps_archived_flights(self):
+        user = get_user_model().objects.create_user("pilot")
+        old = [make_flight(user, date=date(2020, 1, day)) for day in (1, 2, 3)]
+        new = make_flight(user, date=date(2024, 5, 1))
+        archive.archive_before(date(2021, 1, 1))
+        merkle.rebuild(user)
+
+        tree = MerkleTree.objects.get(user=user)
+        self.assertEqual(tree.size, 4)
+        proof = merkle.inclusion_proofs(user, [f.pk for f in old + [new]])
+        self.assertEqual(len(proof["proofs"]), 4)
+        for item in proof["proofs"]:
+            self.assertTrue(merkle.verify_proof(item["leaf"], item["position"], item["path"], tree.root))
+        archived = {f.pk: f for f in archive.flights_between(user, end=date(2020, 12, 31))}
+        self.assertEqual(set(archived), {f.pk for f in old})
+        for item in proof["proofs"]:
+            if item["flight"] in archived:
+                self.assertEqual(item["leaf"], merkle.leaf_digest(merkle.leaf_record(archived[item["flight"]])))
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class PivotTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("pilot")
+        for day, role, uav_class, minutes in (
+            (date(2023, 5, 1), "PIC", "C1", 30),
+            (date(2023, 6, 1), "PIC", "C2", 20),
+            (date(2023, 6, 2), "STU", "C1", 15),
+            (date(2024, 1, 10), "PIC", "C1", 45),
+        ):
+            make_flight(
+                self.user, date=day, pilot_role=role, uav_easa_class=uav_class,
+                off_block=clock(10, 0), on_block=clock(10, minutes),
+            )
+
+    def test_subtotals_and_grand_total(self):
+        result = reports.pivot(
+            FlightLogEntry.objects.filter(user=self.user), ["year", "role"], ["uav_class"], "minutes",
+        )
+        self.assertEqual(result["column_keys"], [["C1 (<900g)"], ["C2 (<4kg)"]])
+        lines = [(line["key"], line["cells"], line["total"]) for line in result["lines"]]
+        self.assertEqual(lines, [
+            (["2023", "Pilot in Command"], [30, 20], 50),
+            (["2023", "Student / Trainee"], [15, 0], 15),
+            (["2023", "Subtotal"], [45, 20], 65),
+            (["2024", "Pilot in Command"], [45, 0], 45),
+            (["2024", "Subtotal"], [45, 0], 45),
+        ])
+        self.assertEqual((result["column_totals"], result["total"]), ([90, 20], 110))
+
+    def test_csv_export_includes_archived_flights(self):
+        archive.archive_before(date(2024, 1, 1))
+        self.client.force_login(self.user)
+        response = self.client.get("/reports/pivot/?rows=year&cols=role&metric=flights&format=csv")
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual(list(csv.reader(io.StringIO(response.content.decode()))), [
+            ["year", "Pilot in Command", "Student / Trainee", "Total"],
+            ["2023", "2", "1", "3"],
+            ["2024", "1", "0", "1"],
+            ["Total", "3", "1", "4"],
+        ])
+
+    def test_unknown_dimension_is_a_400(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get("/reports/pivot/?rows=colour").status_code, 400)
+
+
+class ConflictTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("pilot")
+
+    def flight(self, start, end, day=date(2024, 5, 1), user=None, **fields):
+        return make_flight(
+            user or self.user, date=day, off_block=clock(*start), on_block=clock(*end), **fields,
+        )
+
+    def found(self, flights):
+        return {(c.kind, c.scope, c.first, c.second) for c in conflicts.check(flights)}
+
+    def test_overlapping_flights(self):
+        first = self.flight((10, 0), (11, 0))
+        second = self.flight((10, 30), (11, 30), arrival="EDDS")
+        self.flight((11, 30), (12, 0))  # starts as the second ends: no clash
+        self.assertEqual(self.found([second]), {(conflicts.OVERLAP, conflicts.PILOT, first.pk, second.pk)})
+
+    def test_exact_duplicate(self):
+        first = self.flight((10, 0), (11, 0))
+        second = self.flight((10, 0), (11, 0))
+        (conflict,) = conflicts.check([second])
+        self.assertEqual((conflict.kind, conflict.scope), (conflicts.DUPLICATE, conflicts.PILOT))
+        self.assertEqual({conflict.first, conflict.second}, {first.pk, second.pk})  # same start: either order
+        self.assertIn("duplicate", conflicts.describe(conflict, second))
+
+    def test_airframe_double_booked(self):
+        other = get_user_model().objects.create_user("other")
+        first = self.flight((10, 0), (11, 0), uav_reg="D-UAS1")
+        second = self.flight((10, 45), (11, 15), user=other, uav_reg="D-UAS1")
+        self.flight((10, 45), (11, 15), user=other, uav_reg="D-UAS1", is_simulator=True, departure="SIM")
+        self.assertEqual(
+            {c for c in self.found([second]) if c[1] == conflicts.AIRFRAME},
+            {(conflicts.OVERLAP, conflicts.AIRFRAME, first.pk, second.pk)},
+        )
+
+    def test_flight_across_midnight(self):
+        night = self.flight((23, 30), (0, 30), day=date(2024, 5, 1))
+        morning = self.flight((0, 15), (1, 0), day=date(2024, 5, 2))
+        self.flight((0, 30), (1, 0), day=date(2024, 5, 3), arrival="EDDS")  # the next night: no clash
+        expected = {(conflicts.OVERLAP, conflicts.PILOT, night.pk, morning.pk)}
+        self.assertEqual(self.found([morning]), expected)
+        self.assertEqual(self.found([night]), expected)
+        self.assertEqual({(c.kind, c.scope, c.first, c.second) for c in conflicts.find_all(self.user)}, expected)
+
+
+class LogbookPdfTests(TestCase):
+    FIRST_DAY = date(2020, 1, 1)
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("pilot")
+        # 60 flights, 1 to 60 minutes, two landings each: pages of 25, 25 and 10.
+        for i in range(60):
+            make_flight(
+                self.user, date=self.FIRST_DAY + timedelta(days=10 * i),
+                off_block=clock(10, 0), on_block=clock(10 + (i + 1) // 60, (i + 1) % 60),
+                takeoff_day=1, landing_day=1, landing_night=1,
+            )
+        archive.archive_before(self.FIRST_DAY + timedelta(days=300))  # the first 30
+
+    def test_page_and_carried_forward_totals(self):
+        specs = list(pdf.page_specs(archive.flights_between(self.user), 3, "Logbook", ""))
+        self.assertEqual([len(spec["rows"]) for spec in specs], [25, 25, 10])
+        minutes = [sum(range(1, 26)), sum(range(26, 51)), sum(range(51, 61))]
+        self.assertEqual([spec["page_totals"] for spec in specs], [
+            [minutes[0], 25, 0, 25, 25], [minutes[1], 25, 0, 25, 25], [minutes[2], 10, 0, 10, 10],
+        ])
+        self.assertEqual([spec["brought_forward"] for spec in specs], [
+            [0] * 5, [minutes[0], 25, 0, 25, 25], [minutes[0] + minutes[1], 50, 0, 50, 50],
+        ])
+        self.assertEqual(specs[-1]["to_date"], [sum(range(1, 61)), 60, 0, 60, 60])
+        # Archived flights come first, oldest first.
+        self.assertEqual(self.user.archived_flights.count(), 30)
+        self.assertEqual(specs[0]["rows"][0][0], "2020-01-01")
+        self.assertEqual(specs[2]["rows"][-1][0], str(self.FIRST_DAY + timedelta(days=590)))
+
+    def test_document(self):
+        document = b"".join(pdf.logbook(self.user, workers=1))
+        self.assertTrue(document.startswith(b"%PDF-1.4"))
+        self.assertTrue(document.endswith(b"%%EOF\n"))
+        self.assertIn(b"/Count 3", document)
+        self.assertEqual(document.count(b"/Type /Page /Parent"), 3)
+
+        streams = [
+            zlib.decompress(body)
+            for body in re.findall(rb"stream\n(.*?)\nendstream", document, re.S)
+        ]
+        self.assertEqual(len(streams), 3)
+        self.assertIn(b"(Page 3 of 3)", streams[2])
+        totals = re.split(rb"\((?:Totals this page|Brought forward|Total to date)\)", streams[2])[1:]
+        for line, minutes, count in zip(totals, (b"555", b"1275", b"1830"), (b"10", b"50", b"60")):
+            self.assertIn(b"(%s) Tj" % minutes, line)
+            self.assertIn(b"(%s) Tj" % count, line)
+
+
+class CurrencyTests(TestCase):
+    TODAY = date(2024, 6, 30)
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("pilot")
+
+    def log(self, days_ago, count=1, **fields):
+        for _ in range(count):
+            make_flight(
+                self.user, date=self.TODAY - timedelta(days=days_ago),
+                off_block=clock(10, 0), on_block=clock(10, 20),
+                takeoff_day=1, landing_day=1, **fields,
+            )
+
+    def status(self, today=TODAY):
+        currency.evaluate([self.user.pk], today=today)
+        return PilotStatus.objects.get(user=self.user)
+
+    def test_current_until_the_last_day_of_the_window(self):
+        self.log(90)  # the oldest day still inside the 90 days
+        self.log(10, count=2)
+        status = self.status()
+        self.assertEqual((status.recent_takeoffs, status.recent_landings, status.recent_minutes), (3, 3, 60))
+        self.assertEqual(status.current_until, self.TODAY)
+        self.assertFalse(status.lapsed)
+        self.assertEqual(status.next_due_item, PilotStatus.Item.RECENCY)
+
+        # One day later that flight has left the window.
+        status = self.status(self.TODAY + timedelta(days=1))
+        self.assertEqual((status.recent_takeoffs, status.current_until), (2, None))
+        self.assertTrue(status.lapsed)
+
+    def test_flight_outside_the_window_or_simulated_does_not_count(self):
+        self.log(91)
+        self.log(5, is_simulator=True)
+        self.log(10, count=2)
+        status = self.status()
+        self.assertEqual((status.recent_takeoffs, status.current_until), (2, None))
+        self.assertTrue(status.lapsed)
+
+    def test_expired_document_lapses_a_current_pilot(self):
+        self.log(1, count=3)
+        PilotProfile.objects.filter(user=self.user).update(medical_certificate_expires=self.TODAY - timedelta(days=1))
+        status = self.status()
+        self.assertEqual(status.current_until, self.TODAY + timedelta(days=89))
+        self.assertEqual((status.next_due, status.next_due_item), (self.TODAY - timedelta(days=1), PilotStatus.Item.MEDICAL))
+        self.assertTrue(status.lapsed)
+
+    @override_settings(ALLOWED_HOSTS=["testserver"])
+    def test_flight_changes_refresh_the_status(self):
+        today = timezone.localdate()
+        flights = [make_flight(self.user, date=today, takeoff_day=1, landing_day=1) for _ in range(3)]
+        self.client.force_login(self.user)
+        audit = b"".join(self.client.get("/audit/")).decode()
+        self.assertIn((today + timedelta(days=90)).isoformat(), audit)
+
+        flights[0].date = today - timedelta(days=91)
+        flights[0].save()
+        self.assertTrue(PilotStatus.objects.get(user=self.user).lapsed)
+
+        importer.save_records(self.user, [{"date": today, "takeoff_day": 1, "landing_day": 1}])
+        self.assertFalse(PilotStatus.objects.get(user=self.user).lapsed)
+
+        flights[1].delete()
+        self.assertEqual(PilotStatus.objects.get(user=self.user).recent_takeoffs, 2)
+
+        # Flights outside the window leave the status alone.
+        with CaptureQueriesContext(connection) as queries:
+            make_flight(self.user, date=today - timedelta(days=200))
+        self.assertFalse([q for q in queries if "logbook_pilotstatus" in q["sql"]])
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class SpatialTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("pilot")
+
+    def at(self, lat, lon, arrival=False):
+        point = "arrival" if arrival else "departure"
+        return make_flight(self.user, **{f"{point}_lat": lat, f"{point}_lon": lon})
+
+    def pks(self, queryset):
+        return set(queryset.values_list("pk", flat=True))
+
+    def flights(self):
+        return FlightLogEntry.objects.filter(user=self.user)
+
+    def cells(self):
+        return set(FlightCell.objects.filter(user=self.user, flights__gt=0).values_list(
+            "level", "x", "y", "flights",
+        ))
+
+    def test_box_queries(self):
+        berlin = self.at(52.52, 13.40)
+        potsdam = self.at(52.39, 13.06, arrival=True)
+        fiji = self.at(-17.76, 178.07)
+        samoa = self.at(-13.83, -171.76)
+        self.at(-33.87, 151.21)  # Sydney
+
+        self.assertEqual(self.pks(spatial.in_box(self.flights(), 52, 13, 53, 14)), {berlin.pk, potsdam.pk})
+        # West > east: the box crosses the antimeridian.
+        self.assertEqual(self.pks(spatial.in_box(self.flights(), -20, 170, -10, -170)), {fiji.pk, samoa.pk})
+        self.assertEqual(self.pks(spatial.in_box(self.flights(), -20, -170, -10, 170)), set())
+
+        # The same answers through the R*Tree and from the plain filters.
+        self.assertTrue(spatial._indexed.get(("default", FlightLogEntry)))
+        with mock.patch.object(spatial, "_index_lookup", return_value=None):
+            self.assertEqual(self.pks(spatial.in_box(self.flights(), -20, 170, -10, -170)), {fiji.pk, samoa.pk})
+
+    def test_radius_queries(self):
+        east = self.at(0.0, 179.9)
+        west = self.at(0.0, -179.95)  # 11 km away, across the antimeridian
+        self.at(0.0, 179.0)  # 100 km away
+        found = spatial.near(self.flights(), 0.0, 179.95, 20)
+        self.assertEqual([f.pk for _, f in found], [east.pk, west.pk])
+        self.assertAlmostEqual(found[0][0], 5.56, places=1)
+
+        pole = self.at(89.95, 120.0)  # 15 km from the search point, over the pole
+        self.at(89.0, 0.0)  # 100 km away
+        self.assertEqual([f.pk for _, f in spatial.near(self.flights(), 89.9, 0.0, 20)], [pole.pk])
+        south_pole = self.at(-90.0, 0.0)
+        self.assertEqual([f.pk for _, f in spatial.near(self.flights(), -89.95, 45.0, 10)], [south_pole.pk])
+
+    def test_radius_view(self):
+        self.at(0.0, -179.95)
+        self.client.force_login(self.user)
+        response = self.client.get("/flights/near/?lat=0&lon=179.95&km=20")
+        self.assertEqual(len(response.json()["flights"]), 1)
+        self.assertEqual(self.client.get("/flights/near/?bbox=10,0,-10,5").status_code, 400)
+
+    def test_tile_aggregation(self):
+        for lat, lon in ((52.52, 13.40), (52.50, 13.42), (48.14, 11.58), (-33.87, 151.21)):
+            self.at(lat, lon)
+        self.at(90.0, 0.0)  # beyond the Mercator limit: the top row of tiles
+        self.at(-90.0, 0.0)
+
+        world = spatial.tile(self.user, 0, 0, 0)
+        self.assertEqual(world["flights"], 6)
+        self.assertEqual(sum(c["flights"] for c in world["clusters"]), 6)
+        berlin = next(c for c in world["clusters"] if c["flights"] == 3)  # with Munich
+        self.assertAlmostEqual(berlin["lat"], (52.52 + 52.50 + 48.14) / 3, places=5)
+
+        x, y = spatial.cell(52.51, 13.41, 10)
+        self.assertEqual(spatial.tile(self.user, 10, x, y)["flights"], 2)
+        self.assertEqual(spatial.cell(90.0, 0.0, 3)[1], 0)
+        self.assertEqual(spatial.cell(-90.0, 0.0, 3)[1], 7)
+
+        # Zoomed in past the finest cell level: single flights.
+        x, y = spatial.cell(52.52, 13.40, 17)
+        (point,) = spatial.tile(self.user, 17, x, y)["clusters"]
+        self.assertEqual((point["lat"], point["flights"]), (52.52, 1))
+
+    def test_moving_and_deleting_update_the_cells(self):
+        flight = self.at(52.52, 13.40)
+        other = self.at(52.52, 13.40)
+        self.assertEqual({(level, n) for level, _, _, n in self.cells()}, {(level, 2) for level in spatial.CELL_LEVELS})
+
+        flight.departure_lat, flight.departure_lon = -33.87, 151.21
+        flight.save()
+        self.assertEqual(len(self.cells()), 2 * len(spatial.CELL_LEVELS))
+        self.assertEqual({n for *_, n in self.cells()}, {1})
+        flight.departure_lat = flight.departure_lon = None
+        flight.save()
+        expected = self.cells()
+        spatial.rebuild_cells(self.user)
+        self.assertEqual(self.cells(), expected)
+
+        other.delete()
+        self.assertEqual(self.cells(), set())
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class AdminSearchTests(TestCase):
+    URL = "/admin/logbook/flightlogentry/"
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_superuser("admin")
+        self.client.force_login(self.user)
+        self.survey = make_flight(self.user, uav_model="Mavic 3", remarks="Night survey of the quarry")
+        self.training = make_flight(self.user, uav_model="Matrice 30", remarks="Training, skill test passed")
+
+    def found(self, term):
+        response = self.client.get(self.URL, {"q": term})
+        self.assertEqual(response.status_code, 200)
+        return {flight.pk for flight in response.context["cl"].result_list}
+
+    def test_model_prefix_and_remark_words(self):
+        self.assertEqual(self.found("mavic"), {self.survey.pk})
+        self.assertEqual(self.found("Ma"), {self.survey.pk, self.training.pk})
+        self.assertEqual(self.found("quarr"), {self.survey.pk})
+        self.assertEqual(self.found("survey NIGHT"), {self.survey.pk})
+        self.assertEqual(self.found("skill, test"), {self.training.pk})
+        self.assertEqual(self.found("survey training"), set())
+        self.assertEqual(self.found('"quarry'), {self.survey.pk})
+
+    def test_index_follows_every_write(self):
+        self.survey.remarks = "Harbour inspection"
+        self.survey.save()
+        FlightLogEntry.objects.bulk_create([FlightLogEntry(user=self.user, date=date(2024, 5, 2), remarks="quarry")])
+        self.training.delete()
+        self.assertEqual(self.found("quarry"), set(FlightLogEntry.objects.filter(remarks="quarry").values_list("pk", flat=True)))
+        self.assertEqual(self.found("harbour"), {self.survey.pk})
+        self.assertEqual(self.found("skill"), set())
+        self.assertTrue(search._indexed[("default", FlightLogEntry)])
+
+        # The same answers from the plain filters.
+        with mock.patch.object(search, "_index_lookup", return_value=None):
+            self.assertEqual(self.found("harbour"), {self.survey.pk})
+
+    @mock.patch.object(EstimatedCountPaginator, "COUNT_LIMIT", 3)
+    def test_capped_count_is_shown_until_analyze(self):
+        for day in range(3):
+            make_flight(self.user, date=date(2024, 6, 1 + day))
+        self.assertContains(self.client.get(self.URL), "At least 3 flight log")
+
+        archive.analyze()
+        response = self.client.get(self.URL)
+        self.assertContains(response, "\n5 flight log")
+        self.assertNotContains(response, "At least")
@@ -1,58 +1,127 @@
 from datetime import timedelta
-import csv
-from io import TextIOWrapper
+from itertools import chain
+import json
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.views.decorators.http import require_POST
+from django.db.models import F, Sum
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from .forms import FlightLogEntryForm, PilotProfileForm, PilotSettingsForm
-from .models import FlightLogEntry, PilotProfile
+from . import (
+    archive, changes, conflicts, currency, export, merkle, pdf, profiles, spatial, streaming,
+    sync,
+)
+from .limits import limited
+from .models import ArchivedFlight, ArchivedTotals, FlightLogEntry, MerkleTree, PilotStatus
+from .routers import replica_reads, using_replica
 from .forms import FlightLogEntryForm, PilotProfileForm, PilotSettingsForm 
 
+def _warn_conflicts(request, entry):
+    for conflict in conflicts.check([entry]):
+        messages.warning(request, conflicts.describe(conflict, entry))
+
+
+def _date_param(request, name):
+    """YYYY-MM-DD query parameter as a date, or None if missing/invalid."""
+    try:
+        return parse_date(request.GET.get(name) or "")
+    except ValueError:
+        return None
+
+
 @login_required
+@limited
+@replica_reads
 def audit_view(request):
     """
     Compact, read-only view to show pilot documents and flights
-    in a way that is easy to show to an auditor.
+    in a way that is easy to show to an auditor. The page is streamed:
+    pilot card and summary first, then the flight table in chunks.
     """
-    profile, _ = PilotProfile.objects.get_or_create(user=request.user)
+    profile = request.pilot_profile
 
-    start = request.GET.get("start")
-    end = request.GET.get("end")
+    start = _date_param(request, "start")
+    end = _date_param(request, "end")
 
-    flights = FlightLogEntry.objects.filter(user=request.user).order_by("-date")
+    # Old date ranges transparently include archived flights.
+    flights = archive.flights_between(request.user, start, end, descending=True)
 
+    live = FlightLogEntry.objects.filter(user=request.user)
     if start:
-        flights = flights.filter(date__gte=start)
+        live = live.filter(date__gte=start)
     if end:
-        flights = flights.filter(date__lte=end)
-
-    totals = flights.aggregate(
-        total_flight=Sum("flight_time"),
-        total_takeoff_day=Sum("takeoff_day"),
-        total_takeoff_night=Sum("takeoff_night"),
-        total_landing_day=Sum("landing_day"),
-        total_landing_night=Sum("landing_night"),
+        live = live.filter(date__lte=end)
+    live_totals = live.aggregate(
+        flight_time=Sum("flight_time", default=0),
+        takeoff_day=Sum("takeoff_day", default=0),
+        takeoff_night=Sum("takeoff_night", default=0),
+        landing_day=Sum("landing_day", default=0),
+        landing_night=Sum("landing_night", default=0),
     )
+    archived = archive.archived_totals(request.user, start, end)
+    totals = {
+        "total_flight": live_totals["flight_time"] + archived["flight_time"],
+        "total_takeoff_day": live_totals["takeoff_day"] + archived["takeoff_day"],
+        "total_takeoff_night": live_totals["takeoff_night"] + archived["takeoff_night"],
+        "total_landing_day": live_totals["landing_day"] + archived["landing_day"],
+        "total_landing_night": live_totals["landing_night"] + archived["landing_night"],
+    }
 
-    today = timezone.now().date()
-    last_90 = today - timezone.timedelta(days=90)
-    recent = FlightLogEntry.objects.filter(user=request.user, date__gte=last_90)
-    recent_time = recent.aggregate(Sum("flight_time"))["flight_time__sum"] or 0
+    # Recency as of the pilot's last flight change in the window, or the
+    # daily run (manage.py evaluate_currency) since.
+    pilot_status = PilotStatus.objects.filter(user=request.user).first()
+
+    integrity = MerkleTree.objects.filter(user=request.user).first()
 
     context = {
         "profile": profile,
-        "flights": flights,
         "totals": totals,
-        "recent_90_days_time": recent_time,
+        "pilot_status": pilot_status,
+        "today": timezone.localdate(),
+        "integrity": integrity,
         "filters": {
-            "start": start or "",
-            "end": end or "",
+            "start": start.isoformat() if start else "",
+            "end": end.isoformat() if end else "",
         },
     }
-    return render(request, "audit.html", context)
+    return streaming.stream_table(
+        request, "audit.html", context, flights, "audit_rows.html", slot="flight_rows"
+    )
+
+
+@login_required
+@replica_reads
+def audit_proof(request):
+    """
+    Merkle inclusion proofs for one flight (?flight=<pk>) or a date range
+    (?start=YYYY-MM-DD&end=YYYY-MM-DD), so an auditor can check entries
+    against the published root without downloading the whole logbook.
+    """
+    flight = request.GET.get("flight")
+    start = _date_param(request, "start")
+    end = _date_param(request, "end")
+
+    if flight and flight.isdigit():
+        flights = chain(
+            FlightLogEntry.objects.filter(user=request.user, pk=flight),
+            ArchivedFlight.objects.filter(user=request.user, pk=flight),
+        )
+    elif start or end:
+        flights = archive.flights_between(request.user, start, end)
+    else:
+        return JsonResponse(
+            {"error": "Pass ?flight=<id> or a ?start=/&end= date range."},
+            status=400,
+        )
+
+    records = {f.pk: merkle.leaf_record(f) for f in flights}
+    proof = merkle.inclusion_proofs(request.user, list(records))
+    for item in proof["proofs"]:
+        item["record"] = records[item["flight"]]
+    return JsonResponse(proof)
 
 
 @login_required
@@ -80,43 +149,51 @@ def flight_list(request):
     )
 
     # --- Stats (all-time / last 30 days on full dataset) ---
-    today = timezone.now().date()
-    last_30 = today - timedelta(days=30)
-
-    recent_qs = FlightLogEntry.objects.filter(date__gte=last_30)
-    recent_time = recent_qs.aggregate(Sum("flight_time")).get("flight_time__sum") or 0
-
-    # most flown UAV by total flight_time
-    most_flown_qs = (
-        FlightLogEntry.objects
-        .values("uav_type")
-        .annotate(total_time=Sum("flight_time"))
-        .order_by("-total_time")
-    )
-    if most_flown_qs:
-        most_flown = most_flown_qs[0]
-        most_flown_uav = most_flown["uav_type"]
-        most_flown_uav_time = most_flown["total_time"] or 0
-    else:
-        most_flown_uav = None
-        most_flown_uav_time = 0
-
-    total_takeoffs = FlightLogEntry.objects.aggregate(
-        total=Sum("takeoff_day") + Sum("takeoff_night")
-    )["total"] or 0
-    total_landings = FlightLogEntry.objects.aggregate(
-        total=Sum("landing_day") + Sum("landing_night")
-    )["total"] or 0
-
-    stats = {
-        "total_flights": FlightLogEntry.objects.count(),
-        "recent_flights": recent_qs.count(),
-        "recent_flight_time": recent_time,
-        "most_flown_uav": most_flown_uav,
-        "most_flown_uav_time": most_flown_uav_time,
-        "total_takeoffs": total_takeoffs,
-        "total_landings": total_landings,
-    }
+    # Whole-table aggregates: read them from a replica when configured.
+    with using_replica():
+        today = timezone.now().date()
+        last_30 = today - timedelta(days=30)
+
+        recent_qs = FlightLogEntry.objects.filter(date__gte=last_30)
+        recent_time = recent_qs.aggregate(Sum("flight_time")).get("flight_time__sum") or 0
+
+        # most flown UAV by total flight_time
+        most_flown_qs = (
+            FlightLogEntry.objects
+            .values("uav_type")
+            .annotate(total_time=Sum("flight_time"))
+            .order_by("-total_time")
+        )
+        if most_flown_qs:
+            most_flown = most_flown_qs[0]
+            most_flown_uav = most_flown["uav_type"]
+            most_flown_uav_time = most_flown["total_time"] or 0
+        else:
+            most_flown_uav = None
+            most_flown_uav_time = 0
+
+        # All-time totals include the pre-aggregated archive months.
+        archived = ArchivedTotals.objects.aggregate(
+            flights=Sum("flights", default=0),
+            takeoffs=Sum(F("takeoff_day") + F("takeoff_night"), default=0),
+            landings=Sum(F("landing_day") + F("landing_night"), default=0),
+        )
+        total_takeoffs = (FlightLogEntry.objects.aggregate(
+            total=Sum("takeoff_day") + Sum("takeoff_night")
+        )["total"] or 0) + archived["takeoffs"]
+        total_landings = (FlightLogEntry.objects.aggregate(
+            total=Sum("landing_day") + Sum("landing_night")
+        )["total"] or 0) + archived["landings"]
+
+        stats = {
+            "total_flights": FlightLogEntry.objects.count() + archived["flights"],
+            "recent_flights": recent_qs.count(),
+            "recent_flight_time": recent_time,
+            "most_flown_uav": most_flown_uav,
+            "most_flown_uav_time": most_flown_uav_time,
+            "total_takeoffs": total_takeoffs,
+            "total_landings": total_landings,
+        }
 
     roles = FlightLogEntry.PilotRole.choices
 
@@ -135,90 +212,53 @@ def flight_list(request):
     return render(request, "logbook/flight_list.html", context)
 
 @login_required
+@limited(methods=("POST",))
 def flight_import_csv(request):
     """
-    Import flights from a CSV file.
-    Expected columns (same as export, but you can start minimal):
+    Import flights from a CSV file (or an XLSX export of another logbook
+    app). Expected columns (same as export, but you can start minimal):
     Date, Departure, Arrival, Departure time, Arrival time,
     UAV configuration, UAV model, UAV registration,
     GCS form factor, GCS registration,
-    EASA class, Mission type, GCS software,
+    EASA class, Mission type, GCS software, Pilot role,
     Takeoffs (day), Takeoffs (night), Landings (day), Landings (night),
-    Flight time (min), Simulator?, Simulator type, Simulator time (min), Remarks
+    Simulator?, Simulator type, Simulator time (min), Remarks
+    Large files are parsed in parallel, see logbook.importer.
     """
     if request.method == "POST" and request.FILES.get("file"):
-        f = request.FILES["file"]
+        from . import importer
+
         try:
-            wrapper = TextIOWrapper(f.file, encoding="utf-8")
-            reader = csv.DictReader(wrapper)
-        except Exception:
-            messages.error(request, "Could not read CSV file.")
-            return redirect("flight_import")
-
-        created = 0
-        for row in reader:
-            try:
-                date_str = row.get("Date")
-                dep = row.get("Departure") or ""
-                arr = row.get("Arrival") or ""
-                if not date_str or not dep or not arr:
-                    continue  # skip bad lines
-
-                from datetime import datetime
-                date = datetime.strptime(date_str, "%Y-%m-%d").date()
-
-                off_block = row.get("Departure time") or None
-                on_block = row.get("Arrival time") or None
-
-                def parse_time(val):
-                    if not val:
-                        return None
-                    try:
-                        return datetime.strptime(val.strip(), "%H:%M").time()
-                    except ValueError:
-                        return None
-
-                ob_time = parse_time(off_block)
-                on_time = parse_time(on_block)
-
-                entry = FlightLogEntry(
-                    user=request.user,
-                    date=date,
-                    departure=dep,
-                    arrival=arr,
-                    off_block=ob_time,
-                    on_block=on_time,
-                    uav_type=row.get("UAV configuration") or FlightLogEntry.UavConfig.OTHER,
-                    uav_model=row.get("UAV model") or "",
-                    uav_reg=row.get("UAV registration") or "",
-                    gcs_type=row.get("GCS form factor") or "",
-                    gcs_reg=row.get("GCS registration") or "",
-                    uav_easa_class=row.get("EASA class") or "",
-                    mission_type=row.get("Mission type") or "",
-                    gcs_software=row.get("GCS software") or "",
-                    takeoff_day=int(row.get("Takeoffs (day)") or 0),
-                    takeoff_night=int(row.get("Takeoffs (night)") or 0),
-                    landing_day=int(row.get("Landings (day)") or 0),
-                    landing_night=int(row.get("Landings (night)") or 0),
-                    is_simulator=(row.get("Simulator?") or "").strip().lower() == "yes",
-                    simulator_type=row.get("Simulator type") or "",
-                    simulator_time=int(row.get("Simulator time (min)") or 0),
-                    remarks=row.get("Remarks") or "",
-                )
-                entry.save()
-                created += 1
-            except Exception:
-                # You can log errors if you want per-row diagnostics
-                continue
-
-        messages.success(request, f"Imported {created} flights from CSV.")
+            created, skipped = importer.import_upload(request.user, request.FILES["file"])
+        except importer.ImportFileError as exc:
+            if not exc.saved:
+                messages.error(request, f"Could not read the file: {exc}")
+                return redirect("flight_import")
+            messages.warning(
+                request,
+                f"The import stopped part-way ({exc}). {len(exc.saved)} flights from the "
+                f"start of the file were saved; import only the rows after them again.",
+            )
+            return redirect("flight_list")
+
+        message = f"Imported {len(created)} flights."
+        if skipped:
+            message += f" Skipped {skipped} rows that could not be read."
+        messages.success(request, message)
+        clashes = {pk for c in conflicts.check(created) for pk in (c.first, c.second)}
+        clashing = sum(1 for entry in created if entry.pk in clashes)
+        if clashing:
+            messages.warning(
+                request,
+                f"{clashing} imported flights overlap another flight of yours or of the same UAV.",
+            )
         return redirect("flight_list")
 
     return render(request, "logbook/flight_import.html")
 
 @login_required
 def settings_view(request):
-    profile, _ = PilotProfile.objects.get_or_create(user=request.user)
+    profile = profiles.profile_for_edit(request)
 
     if request.method == "POST":
         form = PilotSettingsForm(request.POST, instance=profile)
@@ -238,6 +278,7 @@ def flight_create(request):
             entry = form.save(commit=False)
             entry.user = request.user  # still safe even if it's only you
             entry.save()
+            _warn_conflicts(request, entry)
             return redirect("flight_list")
     else:
         form = FlightLogEntryForm()
@@ -252,7 +293,7 @@ def flight_edit(request, pk):
     if request.method == "POST":
         form = FlightLogEntryForm(request.POST, instance=entry)
         if form.is_valid():
-            form.save()
+            _warn_conflicts(request, form.save())
             return redirect("flight_list")
     else:
         form = FlightLogEntryForm(instance=entry)
@@ -270,69 +311,189 @@ def flight_delete(request, pk):
 
 
 @login_required
+@limited
+@replica_reads
 def flight_export_csv(request):
-    flights = FlightLogEntry.objects.all().order_by("date")
-
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = 'attachment; filename="uas_logbook.csv"'
-
-    writer = csv.writer(response)
-
-    writer.writerow([
-        "Date",
-        "Departure",
-        "Arrival",
-        "Departure time",
-        "Arrival time",
-        "UAV type",
-        "UAV registration",
-        "GCS type",
-        "GCS registration",
-        "Pilot role",
-        "Takeoffs (day)",
-        "Takeoffs (night)",
-        "Landings (day)",
-        "Landings (night)",
-        "Flight time (min)",
-        "Simulator?",
-        "Simulator type",
-        "Simulator time (min)",
-        "Remarks",
-    ])
-
-    for f in flights:
-        writer.writerow([
-            f.date,
-            f.departure,
-            f.arrival,
-            f.off_block,
-            f.on_block,
-            f.get_uav_type_display(),
-            f.uav_reg,
-            f.get_gcs_type_display() if f.gcs_type else "",
-            f.gcs_reg,
-            f.get_pilot_role_display(),
-            f.takeoff_day,
-            f.takeoff_night,
-            f.landing_day,
-            f.landing_night,
-            f.flight_time,
-            "Yes" if f.is_simulator else "No",
-            f.simulator_type,
-            f.simulator_time,
-            f.remarks,
-        ])
+    """
+    Export flights to CSV, optionally limited to ?start=/&end= dates.
+    Archived flights are included when the range reaches back to them.
+    """
+    flights = archive.flights_between(
+        None, _date_param(request, "start"), _date_param(request, "end")
+    )
+    return export.stream_csv(flights)
 
+
+@login_required
+@limited
+@replica_reads
+def flight_logbook_pdf(request):
+    """The whole logbook as a paginated PDF with running totals."""
+    response = StreamingHttpResponse(
+        pdf.logbook(request.user, request.pilot_profile), content_type="application/pdf"
+    )
+    response["Content-Disposition"] = 'attachment; filename="uas_logbook.pdf"'
     return response
 
+@login_required
+@replica_reads
+def flights_near(request):
+    """
+    Flights (archived ones included) with a point inside
+    ?bbox=south,west,north,east, or within ?km= (default 5) of ?lat=&lon=,
+    nearest first. JSON, at most 500 flights.
+    """
+    limit = 500
+    querysets = [
+        ArchivedFlight.objects.filter(user=request.user),
+        FlightLogEntry.objects.filter(user=request.user),
+    ]
+    try:
+        if request.GET.get("bbox"):
+            south, west, north, east = (float(v) for v in request.GET["bbox"].split(","))
+            if not (-90 <= south <= north <= 90 and -180 <= min(west, east) <= max(west, east) <= 180):
+                raise ValueError
+            flights = chain.from_iterable(
+                spatial.in_box(qs, south, west, north, east).iterator(chunk_size=2000)
+                for qs in querysets
+            )
+            found = [(None, f) for _, f in zip(range(limit + 1), flights)]
+        else:
+            lat, lon = float(request.GET["lat"]), float(request.GET["lon"])
+            km = float(request.GET.get("km") or 5)
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180 and 0 < km <= 20_000):
+                raise ValueError
+            found = sorted(
+                chain.from_iterable(spatial.near(qs, lat, lon, km, limit + 1) for qs in querysets),
+                key=lambda item: item[0],
+            )
+    except (KeyError, ValueError):
+        return JsonResponse(
+            {"error": "Give bbox=south,west,north,east, or lat, lon and km, in degrees and km."},
+            status=400,
+        )
+
+    return JsonResponse({
+        "truncated": len(found) > limit,
+        "flights": [
+            {
+                "id": f.pk,
+                "date": f.date,
+                "departure": f.departure,
+                "arrival": f.arrival,
+                "archived": isinstance(f, ArchivedFlight),
+                "points": spatial.points(f),
+                "distance_km": None if distance is None else round(distance, 3),
+            }
+            for distance, f in found[:limit]
+        ],
+    })
+
+
+@login_required
+@replica_reads
+def flight_map_tile(request, z, x, y):
+    """Clustered flight counts for one Web Mercator map tile, as JSON."""
+    if z > spatial.MAX_ZOOM or x >= 1 << z or y >= 1 << z:
+        raise Http404("No such tile.")
+    response = JsonResponse(spatial.tile(request.user, z, x, y))
+    response["Cache-Control"] = "private, max-age=60"
+    return response
+
+
+@login_required
+@limited(coalesce=True)
+@replica_reads
+def reports_pivot(request):
+    """
+    Pivot report, e.g. ?rows=month&cols=uav_class,mission&metric=minutes.
+    Dimensions: month, year, uav_class, mission, role, uav_type, simulator.
+    Metrics: flights, minutes, takeoffs, landings. ?format=csv for CSV.
+    """
+    from . import reports  # only this view needs the pivot machinery
+
+    rows = [d for d in request.GET.get("rows", "month").split(",") if d]
+    columns = [d for d in request.GET.get("cols", "").split(",") if d]
+    metric = request.GET.get("metric", "minutes")
+    start = _date_param(request, "start")
+    end = _date_param(request, "end")
+
+    flights = [
+        FlightLogEntry.objects.filter(user=request.user),
+        ArchivedFlight.objects.filter(user=request.user),
+    ]
+    if start:
+        flights = [qs.filter(date__gte=start) for qs in flights]
+    if end:
+        flights = [qs.filter(date__lte=end) for qs in flights]
+
+    try:
+        result = reports.cached_pivot(
+            request.user, flights, rows, columns, metric, extra=(str(start), str(end))
+        )
+    except reports.ReportError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+
+    if request.GET.get("format") == "csv":
+        import csv
+
+        response = HttpResponse(content_type="text/csv")
+        response["Content-Disposition"] = 'attachment; filename="uas_logbook_report.csv"'
+        csv.writer(response).writerows(reports.csv_rows(result))
+        return response
+
+    return JsonResponse(result)
+
+
+@login_required
+@replica_reads
+def flight_changes(request):
+    """
+    NDJSON change feed: flights inserted/updated/deleted after ?since=<seq>.
+    Optional ?limit=<n> caps the number of change lines per response.
+    """
+    try:
+        since = int(request.GET.get("since") or 0)
+        limit = int(request.GET["limit"]) if request.GET.get("limit") else None
+    except ValueError:
+        return JsonResponse({"error": "since and limit must be integers."}, status=400)
+    if since < 0 or (limit is not None and limit < 1):
+        return JsonResponse({"error": "since and limit must be positive."}, status=400)
+
+    return StreamingHttpResponse(
+        changes.stream(since, limit), content_type="application/x-ndjson"
+    )
+
+
+@login_required
+@require_POST
+def flight_sync(request):
+    """
+    Offline-first field entry: apply a batch of client changes and return
+    the server-side delta since the client's last sync token.
+    See logbook.sync for the payload format.
+    """
+    try:
+        payload = json.loads(request.body)
+        if not isinstance(payload, dict):
+            raise sync.SyncError("Expected a JSON object.")
+        result = sync.apply_batch(
+            request.user, payload.get("token"), payload.get("changes", [])
+        )
+    except ValueError as exc:  # includes sync.SyncError and bad JSON
+        return JsonResponse({"error": str(exc)}, status=400)
+    return JsonResponse(result)
+
 @login_required
 def profile_view(request):
-    profile, _ = PilotProfile.objects.get_or_create(user=request.user)
+    profile = profiles.profile_for_edit(request)
 
     if request.method == "POST":
         form = PilotProfileForm(request.POST, request.FILES, instance=profile)
         if form.is_valid():
             form.save()
+            if {"medical_certificate_expires", "flight_crew_license_expires"} & set(form.changed_data):
+                currency.evaluate([request.user.pk])
             return redirect("profile")
     else:
         form = PilotProfileForm(instance=profile)
@@ -0,0 +1,15 @@
+// Audit view QR code: current URL, plus the logbook Merkle root when sealed.
+(function () {
+    const root = JSON.parse(document.getElementById("auditRoot").textContent);
+    const url = new URL(window.location.href);
+    if (root) {
+        url.hash = "root=" + root;
+    }
+    new QRious({
+        element: document.getElementById("auditQr"),
+        value: url.toString(),
+        size: 120,
+        background: "#0b1120",
+        foreground: "#e5e9f0",
+    });
+})();
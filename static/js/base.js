@@ -0,0 +1,12 @@
+// Header user menu: toggle on click, close when clicking elsewhere.
+document.addEventListener("click", function (e) {
+    const btn = document.getElementById("userMenuButton");
+    const dropdown = document.getElementById("userMenuDropdown");
+    if (!btn || !dropdown) return;
+
+    if (btn.contains(e.target)) {
+        dropdown.classList.toggle("open");
+    } else if (!dropdown.contains(e.target)) {
+        dropdown.classList.remove("open");
+    }
+});